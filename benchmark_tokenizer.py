@@ -0,0 +1,19 @@
+import sys
+import time
+from server.transpiler.test.test_tokenizer import LINES, walk_tokenize
+from server.transpiler.tokenizer import Token, Position
+
+# compares the regex scanner of the tokenizer with the character by character walker it replaced,
+# the timing depends on the machine, so it is not part of the tests
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    lines = LINES * repeat
+    for name, tokenize in [("walker", walk_tokenize), ("scanner", Token.tokenize)]:
+        runs = []
+        for _ in range(3):
+            start = time.perf_counter()
+            for i, line in enumerate(lines):
+                tokenize(line, Position(i, 0))
+            runs.append(time.perf_counter() - start)
+        print(f"{name}: {min(runs) * 1000:.1f} ms for {len(lines)} lines (best of {len(runs)})")
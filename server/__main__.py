@@ -1,7 +1,7 @@
 import argparse
 import logging
 
-from .server import pyduino_server
+from .server import pyduino_server, DEBOUNCE_IN_SECONDS
 
 logging.basicConfig(filename="pygls.log", level=logging.DEBUG, filemode="w")
 
@@ -25,12 +25,17 @@ def add_arguments(parser):
         "--port", type=int, default=2087,
         help="Bind to this port"
     )
+    parser.add_argument(
+        "--debounce", type=float, default=DEBOUNCE_IN_SECONDS,
+        help="Seconds to wait after the last change before the document is checked"
+    )
 
 
 def main():
     parser = argparse.ArgumentParser()
     add_arguments(parser)
     args = parser.parse_args()
+    pyduino_server.debounce = args.debounce
 
     if args.tcp:
         pyduino_server.start_tcp(args.host, args.port)
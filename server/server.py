@@ -1,15 +1,19 @@
 import json
+import logging
 import os.path
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from json import JSONDecodeError
-from lsprotocol.types import (TEXT_DOCUMENT_DID_CHANGE,
+from lsprotocol.types import (TEXT_DOCUMENT_DID_CHANGE, TEXT_DOCUMENT_DID_CLOSE,
                               TEXT_DOCUMENT_DID_OPEN)
-from lsprotocol.types import (Diagnostic, DidChangeTextDocumentParams,
+from lsprotocol.types import (Diagnostic, DidChangeTextDocumentParams, DidCloseTextDocumentParams,
                               DidOpenTextDocumentParams, Position, Range)
 from pygls.server import LanguageServer
-from server.transpiler.transpiler import Transpiler
+from server.transpiler.incremental import IncrementalDiagnostics
 
 COUNT_DOWN_START_IN_SECONDS = 10
 COUNT_DOWN_SLEEP_IN_SECONDS = 1
+DEBOUNCE_IN_SECONDS = 0.3
 
 CWD = os.getcwd().replace("\\","\\\\")
 SETTINGS_JSON = """
@@ -40,25 +44,90 @@ class PyduinoLanguageServer(LanguageServer):
 
     def __init__(self, *args):
         super().__init__(*args)
+        self.documents: dict[str, IncrementalDiagnostics] = {}  # uri -> cached state of the last check
+        self.debounce: float = DEBOUNCE_IN_SECONDS
+        self.validation_lock = threading.Lock()
+        self.pending: dict[str, tuple[int, str, list]] = {}  # uri -> (version, source, changes) not checked yet
+        self.timers: dict[str, threading.Timer] = {}
+        self.latest_versions: dict[str, int] = {}
+        # a single worker, so the cached documents are never checked concurrently
+        self.validation_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pyduino-validation")
+
+    def schedule_validation(self, uri: str, version: int, source: str, changes: list = None, delay: float = None):
+        """
+        Checks the document in the background after delay seconds, a newer version of the document
+        scheduled before that replaces this one
+        :param changes: The content changes since the last scheduled version, None to check the whole document again
+        :param delay: The debounce window, defaults to self.debounce
+        """
+        self.latest_versions[uri] = version
+        with self.validation_lock:
+            if uri in self.pending:
+                # the pending version was never checked, so its changes are still needed
+                pending_changes = self.pending[uri][2]
+                changes = None if pending_changes is None or changes is None else pending_changes + list(changes)
+            self.pending[uri] = (version, source, changes)
+
+            timer = self.timers.pop(uri, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.debounce if delay is None else delay,
+                                    self.validation_executor.submit, (self.validate_pending, uri))
+            timer.daemon = True
+            self.timers[uri] = timer
+            timer.start()
+
+    def validate_pending(self, uri: str):
+        """
+        Runs on the validation worker, checks the newest pending version of the document
+        """
+        with self.validation_lock:
+            if uri not in self.pending:
+                return
+            version, source, changes = self.pending.pop(uri)
+
+        try:
+            document = self.documents.setdefault(uri, IncrementalDiagnostics())
+            diagnostics = document.update(source.splitlines(), changes)
+        except Exception:
+            logging.exception("Validation of %s failed", uri)
+            self.documents.pop(uri, None)  # the cached state may be broken, check everything next time
+            return
+
+        with self.validation_lock:
+            if uri in self.pending:
+                return  # superseded while checking
+
+        self.loop.call_soon_threadsafe(self.publish_latest, uri, version, diagnostics)
+
+    def publish_latest(self, uri: str, version: int, diagnostics: list[Diagnostic]):
+        """
+        Publishes the diagnostics if they belong to the newest version of the document
+        """
+        if self.latest_versions.get(uri) != version:
+            return
+        self.publish_diagnostics(uri, diagnostics)
+
+    def forget_document(self, uri: str):
+        with self.validation_lock:
+            self.pending.pop(uri, None)
+            timer = self.timers.pop(uri, None)
+            if timer is not None:
+                timer.cancel()
+        self.latest_versions.pop(uri, None)
+        self.documents.pop(uri, None)
 
 
 pyduino_server = PyduinoLanguageServer('Pyduino', 'v0.1')
 
 
-def get_diagnostics(ls, params):
+def _validate(ls, params, changes=None, delay=None):
+    """
+    Schedules the check of the document, the diagnostics are published by the validation worker
+    :param changes: The content changes since the last version, None to check the whole document again
+    """
     text_doc = ls.workspace.get_document(params.text_document.uri)
-    source = text_doc.source
-    errors = Transpiler.get_diagnostics(source.splitlines())
-    return errors
-
-
-def _validate(ls, params):
-    text_doc = ls.workspace.get_document(params.text_document.uri)
-    print("enter valiudate")
-    diagnostics = get_diagnostics(ls, params)    
-    print("diagnostics", diagnostics)
-
-    ls.publish_diagnostics(text_doc.uri, diagnostics)
+    ls.schedule_validation(text_doc.uri, text_doc.version, text_doc.source, changes, delay)
 
 
 
@@ -82,7 +151,7 @@ def completions(params: Optional[CompletionParams] = None) -> CompletionList:
 @pyduino_server.feature(TEXT_DOCUMENT_DID_CHANGE)
 def did_change(ls, params: DidChangeTextDocumentParams):
     """Text document did change notification."""
-    _validate(ls, params)
+    _validate(ls, params, params.content_changes)
 
 
 @pyduino_server.feature(TEXT_DOCUMENT_DID_OPEN)
@@ -100,4 +169,10 @@ async def did_open(ls, params: DidOpenTextDocumentParams):
 
     ls.show_message('Pyduino Running')
 
-    _validate(ls, params)
\ No newline at end of file
+    _validate(ls, params, delay=0)
+
+
+@pyduino_server.feature(TEXT_DOCUMENT_DID_CLOSE)
+def did_close(ls, params: DidCloseTextDocumentParams):
+    """Text document did close notification."""
+    ls.forget_document(params.text_document.uri)
\ No newline at end of file
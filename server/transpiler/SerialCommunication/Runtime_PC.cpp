@@ -0,0 +1,11 @@
+#include "Runtime_PC.h"
+
+std::string String(int value) { return std::to_string(value); }
+
+std::string String(float value) { return std::to_string(value); }
+
+std::string String(std::string value) { return "\"" + value + "\""; }
+
+std::string String(char value) { return "'" + std::to_string(value) + "'"; }
+
+std::string String(bool value) { return std::to_string(value); }
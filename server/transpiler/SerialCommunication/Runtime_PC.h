@@ -0,0 +1,17 @@
+#ifndef RUNTIME_PC_H_INCLUDED
+#define RUNTIME_PC_H_INCLUDED
+
+#include <string>
+#include <stdlib.h>
+
+using namespace std;
+
+typedef int py_int;
+
+std::string String(int value);
+std::string String(float value);
+std::string String(std::string value);
+std::string String(char value);
+std::string String(bool value);
+
+#endif // RUNTIME_PC_H_INCLUDED
@@ -16,7 +16,7 @@ Serial::Serial(const char *portName)
                                0,
                                NULL,
                                OPEN_EXISTING,
-                               FILE_ATTRIBUTE_NORMAL,
+                               FILE_ATTRIBUTE_NORMAL | FILE_FLAG_OVERLAPPED,
                                NULL);
 
     //Check if the connection was successfull
@@ -65,6 +65,14 @@ Serial::Serial(const char *portName)
             {
                 //If everything went fine we're connected
                 this->connected = true;
+                //Reads return the available bytes at once, waiting is done by WaitData
+                COMMTIMEOUTS timeouts = {0};
+                timeouts.ReadIntervalTimeout = MAXDWORD;
+                SetCommTimeouts(this->hSerial, &timeouts);
+                //WaitData is woken up by incoming characters
+                SetCommMask(this->hSerial, EV_RXCHAR);
+                this->waitOverlapped = {0};
+                this->waitOverlapped.hEvent = CreateEvent(NULL, TRUE, FALSE, NULL);
                 //Flush any remaining characters in the buffers
                 PurgeComm(this->hSerial, PURGE_RXCLEAR | PURGE_TXCLEAR);
                 //We wait 2s as the arduino board will be reseting
@@ -84,40 +92,93 @@ Serial::~Serial()
         this->connected = false;
         //Close the serial handler
         CloseHandle(this->hSerial);
+        CloseHandle(this->waitOverlapped.hEvent);
     }
 }
 
-int Serial::ReadData(char *buffer, unsigned int nbChar)
+DWORD Serial::available()
+{
+    //Use the ClearCommError function to get status info on the Serial port
+    ClearCommError(this->hSerial, &this->errors, &this->status);
+    return this->status.cbInQue;
+}
+
+DWORD Serial::transfer(char *buffer, unsigned int nbChar, bool write)
+{
+    DWORD bytesTransferred = 0;
+    //Every operation has its own event, the listener reads while the program writes
+    OVERLAPPED overlapped = {0};
+    overlapped.hEvent = CreateEvent(NULL, TRUE, FALSE, NULL);
+
+    BOOL done = write ? WriteFile(this->hSerial, buffer, nbChar, &bytesTransferred, &overlapped)
+                      : ReadFile(this->hSerial, buffer, nbChar, &bytesTransferred, &overlapped);
+    if(!done)
+    {
+        if(GetLastError() != ERROR_IO_PENDING || !GetOverlappedResult(this->hSerial, &overlapped, &bytesTransferred, TRUE))
+        {
+            ClearCommError(this->hSerial, &this->errors, &this->status);
+            bytesTransferred = 0;
+        }
+    }
+    CloseHandle(overlapped.hEvent);
+    return bytesTransferred;
+}
+
+bool Serial::WaitData(unsigned int timeout)
+{
+    if(this->available() > 0)
+    {
+        return true;
+    }
+    DWORD event = 0;
+    ResetEvent(this->waitOverlapped.hEvent);
+    if(!WaitCommEvent(this->hSerial, &event, &this->waitOverlapped))
+    {
+        if(GetLastError() != ERROR_IO_PENDING)
+        {
+            return this->available() > 0;
+        }
+        //A character can arrive between the first check and the start of the wait
+        if(this->available() == 0)
+        {
+            WaitForSingleObject(this->waitOverlapped.hEvent, timeout);
+        }
+        //Setting the mask again completes a wait that is still pending
+        SetCommMask(this->hSerial, EV_RXCHAR);
+        DWORD unused;
+        GetOverlappedResult(this->hSerial, &this->waitOverlapped, &unused, TRUE);
+    }
+    return this->available() > 0;
+}
+
+int Serial::ReadData(char *buffer, unsigned int nbChar, unsigned int timeout)
 {
-    //Number of bytes we'll have read
-    DWORD bytesRead;
     //Number of bytes we'll really ask to read
     unsigned int toRead;
 
-    //Use the ClearCommError function to get status info on the Serial port
-    ClearCommError(this->hSerial, &this->errors, &this->status);
+    if(timeout > 0)
+    {
+        this->WaitData(timeout);
+    }
 
     //Check if there is something to read
-    if(this->status.cbInQue>0)
+    DWORD queued = this->available();
+    if(queued > 0)
     {
         //If there is we check if there is enough data to read the required number
         //of characters, if not we'll read only the available characters to prevent
         //locking of the application.
-        if(this->status.cbInQue>nbChar)
+        if(queued > nbChar)
         {
             toRead = nbChar;
         }
         else
         {
-            toRead = this->status.cbInQue;
-        }
-
-        //Try to read the require number of chars, and return the number of read bytes on success
-        if(ReadFile(this->hSerial, buffer, toRead, &bytesRead, NULL) )
-        {
-            return bytesRead;
+            toRead = queued;
         }
 
+        //Try to read the require number of chars, and return the number of read bytes
+        return this->transfer(buffer, toRead, false);
     }
 
     //If nothing has been read, or that an error was detected return 0
@@ -128,18 +189,8 @@ int Serial::ReadData(char *buffer, unsigned int nbChar)
 
 bool Serial::WriteData(const char *buffer, unsigned int nbChar)
 {
-    DWORD bytesSend;
-
     //Try to write the buffer on the Serial port
-    if(!WriteFile(this->hSerial, (void *)buffer, nbChar, &bytesSend, 0))
-    {
-        //In case it don't work get comm error and return false
-        ClearCommError(this->hSerial, &this->errors, &this->status);
-
-        return false;
-    }
-    else
-        return true;
+    return this->transfer(const_cast<char *>(buffer), nbChar, true) == nbChar;
 }
 
 bool Serial::IsConnected()
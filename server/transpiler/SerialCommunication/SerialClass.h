@@ -18,6 +18,13 @@ private:
     COMSTAT status;
     //Keep track of last error
     DWORD errors;
+    //Signaled when a character arrives (the handle is opened for overlapped io,
+    //so the listener can wait while the other threads write)
+    OVERLAPPED waitOverlapped;
+    //Number of bytes in the input queue
+    DWORD available();
+    //Read or write through the overlapped handle, waits until the operation is done
+    DWORD transfer(char *buffer, unsigned int nbChar, bool write);
 
 public:
     //Initialize Serial communication with the given COM port
@@ -26,9 +33,13 @@ public:
     ~Serial();
     //Read data in a buffer, if nbChar is greater than the
     //maximum number of bytes available, it will return only the
-    //bytes available. The function return -1 when nothing could
-    //be read, the number of bytes actually read.
-    int ReadData(char *buffer, unsigned int nbChar);
+    //bytes available. If nothing is available, it waits up to timeout
+    //milliseconds for the first byte. The function returns the number
+    //of bytes actually read (0 when nothing could be read).
+    int ReadData(char *buffer, unsigned int nbChar, unsigned int timeout = 0);
+    //Wait up to timeout milliseconds until there is data to read
+    //return true if there is data.
+    bool WaitData(unsigned int timeout);
     //Writes data from a buffer through the Serial connection
     //return true on success.
     bool WriteData(const char *buffer, unsigned int nbChar);
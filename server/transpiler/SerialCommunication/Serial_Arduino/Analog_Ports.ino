@@ -0,0 +1,2 @@
+const byte analogPorts[6] = { A0, A1, A2, A3, A4, A5 };
+
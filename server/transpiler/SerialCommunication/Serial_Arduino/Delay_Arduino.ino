@@ -0,0 +1,4 @@
+void better_delay(int time){
+  delay(time);
+}
+
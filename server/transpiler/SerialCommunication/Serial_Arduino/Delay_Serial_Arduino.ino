@@ -0,0 +1,7 @@
+void better_delay(int time){
+  int start = millis();
+  while (millis() - start < time){
+    checkSerial();
+  }
+}
+
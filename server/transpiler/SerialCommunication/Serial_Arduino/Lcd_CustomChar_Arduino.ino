@@ -0,0 +1,17 @@
+void createCustomChar(String input, int charIndex){
+  if(input.length() != 40){
+    // invalid Char
+    return;
+  }
+  byte customChar[8];
+
+  for(int i = 0; i < 8; i++){
+    String byteString = input.substring(i*5, i*5+5);
+    byteString.replace("0", " ");
+    byteString.replace("1", "0");
+    byteString.replace(" ", "1");
+    customChar[i] = strtol(byteString.c_str(), NULL, 2);
+  }
+  lcd.createChar(charIndex,customChar);
+}
+
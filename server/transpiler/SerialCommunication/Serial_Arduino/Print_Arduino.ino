@@ -0,0 +1,10 @@
+void print(const String data, bool newline) {
+  data += "\n";
+  int len = data.length();
+  char data_char[len];
+  for (int i = 0; i < len; i++) {
+    data_char[i] = data[i];
+  }
+  sendRequest('l', data_char, len);
+}
+
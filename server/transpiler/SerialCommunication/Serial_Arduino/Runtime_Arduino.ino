@@ -0,0 +1,7 @@
+#include <string.h>
+
+using namespace std;
+
+typedef int32_t py_int;
+typedef String string;
+
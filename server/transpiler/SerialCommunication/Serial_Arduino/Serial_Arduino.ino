@@ -1,9 +1,8 @@
-#include <string.h>
-
-using namespace std;
-
-typedef int32_t py_int;
-typedef String string;
+// The serial connection to the pc, the features are enabled by the transpiler:
+// PYDUINO_REMOTE_CALLS: the board calls functions of the pc and waits for the responses
+// PROXY_ANALOG_READ, PROXY_DIGITAL_READ, PROXY_PIN_WRITE: the pc uses the pins of the board
+// PYDUINO_SERIAL_TIMER: checkSerial is also called from a timer interrupt (Serial_Timer_Arduino.ino)
+// PROXY_SUBSCRIPTION: the board sends samples of analog pins to the pc (Subscription_Arduino.ino)
 
 const char StartCharacter = '<';
 const char EndCharacter = '>';
@@ -18,12 +17,22 @@ const int MessageCompleteTimeout = 10;
 const int MaxRequests = 5;
 const int MaxRequestsLength = 50;
 
-const byte analogPorts[6] = { A0, A1, A2, A3, A4, A5 };
-
 int requestID = 0;
+#ifdef PYDUINO_REMOTE_CALLS
 char Responses[MaxRequests][MaxRequestsLength];
+#endif
 char Requests[MaxRequests];
 
+#ifdef PROXY_SUBSCRIPTION
+void subscribe(const char *value, int size);
+void pollSubscription();
+#endif
+
+#ifdef PYDUINO_SERIAL_TIMER
+// set while the program uses the connection, the interrupt does not write between the bytes of a message
+volatile bool serialBusy = false;
+#endif
+
 bool Handshake() {
   long start = millis();
   while (millis() - start < HandshakeTimeout) {
@@ -53,11 +62,14 @@ bool Handshake() {
 
 
 
+// the ids of the requests of the board start at 1, a free id is used in turn
 char getNextRequestId() {
-  if (requestID >= MaxRequests) {
-    requestID = 0;
+  for (int i = 0; i < MaxRequests - 1; i++) {
+    requestID = requestID % (MaxRequests - 1) + 1;
+    if (Requests[requestID] == 0) {
+      break;
+    }
   }
-  requestID++;
   return requestID;
 }
 
@@ -82,7 +94,14 @@ void sendRequest(char instruction, const char *value, int valueSize, char reques
 
   outgoingData[4 + valueSize] = EndCharacter;
 
+#ifdef PYDUINO_SERIAL_TIMER
+  bool busy = serialBusy;
+  serialBusy = true;
   Serial.write(outgoingData, 5 + valueSize);
+  serialBusy = busy;
+#else
+  Serial.write(outgoingData, 5 + valueSize);
+#endif
 }
 
 void sendResponse(char requestID, const char *response, int responseSize) {
@@ -102,15 +121,37 @@ void sendResponse(char requestID, const char *response, int responseSize) {
   Serial.write(outgoingData, 4 + responseSize);
 }
 
+#ifdef PYDUINO_REMOTE_CALLS
+void checkSerial();
+
+// waits for the response of a request of the board and frees its id
+bool waitResponse(char requestId) {
+  long start = millis();
+  while (Responses[requestId][0] == 0) {
+    if (millis() - start > DataTimeout) {
+      Requests[requestId] = 0;
+      return false;
+    }
+    checkSerial();
+  }
+  Responses[requestId][0] = 0;
+  Requests[requestId] = 0;
+  return true;
+}
+
 void decodeResponse(const char *data, int size) {
-  char requestID = data[1];
+  uint8_t requestID = data[1];
   int responseSize = uint8_t (data[2]);
+  if (requestID >= MaxRequests || Requests[requestID] == 0 || responseSize >= MaxRequestsLength) {
+    return;
+  }
   Responses[requestID][0] = 1;
 
   for (int i = 0; i < responseSize; i++) {
     Responses[requestID][i + 1] = data[3 + i];
   }
 }
+#endif
 
 void decodeRequest(const byte *data, int size) {
   char requestID = data[1];
@@ -122,8 +163,6 @@ void decodeRequest(const byte *data, int size) {
     //cout << "Warning: value size is bigger than MaxDataLength" << endl;
 
   } else if (valueSize == 0) {
-    Requests[requestID] = 0;
-
     //cout << "Warning: value size is 0" << endl;
     return;
   }
@@ -132,65 +171,122 @@ void decodeRequest(const byte *data, int size) {
     value[i] = data[4 + i];
   }
   if (instruction == 'n'){
+#ifdef PROXY_ANALOG_READ
     if (value[0] == 0){
-      short read_result = analogRead(analogPorts[value[0]]);
+      short read_result = analogRead(analogPorts[value[1]]);
       const char* response = static_cast<char*>(static_cast<void*>(&read_result));
       sendResponse(requestID, response, 2);
     }
+#endif
+#ifdef PROXY_DIGITAL_READ
     if(value[0] == 2){
-      bool read_result = digitalRead(value[0]);
+      bool read_result = digitalRead(uint8_t(value[1]));
       const char* response = static_cast<char*>(static_cast<void*>(&read_result));
       sendResponse(requestID, response, 1);
 
     }
-
+#endif
+#ifdef PROXY_PIN_WRITE
     if(value[0] == 1){
       analogWrite(uint8_t(value[1]), uint8_t(value[2]));
-      sendResponse(requestID, new char[1] {' '}, 1);
+      const char ack = ' ';
+      sendResponse(requestID, &ack, 1);
     }
+    if(value[0] == 3){
+      pinMode(uint8_t(value[1]), OUTPUT);
+      digitalWrite(uint8_t(value[1]), value[2]);
+      const char ack = ' ';
+      sendResponse(requestID, &ack, 1);
+    }
+#endif
+  }
 
-
+#ifdef PROXY_SUBSCRIPTION
+  if (instruction == 's') {
+    subscribe(value, valueSize);
+    const char ack = ' ';
+    sendResponse(requestID, &ack, 1);
+  }
+#endif
+
+#if defined(PROXY_ANALOG_READ) || defined(PROXY_DIGITAL_READ) || defined(PROXY_PIN_WRITE)
+  // a batch of the 'n' operations (PinBatch in Serial_PC.h), the results of the reads are sent in one response
+  if (instruction == 'p') {
+    char response[MaxRequestsLength];
+    int responseSize = 0;
+    int i = 0;
+    while (i + 1 < valueSize) {
+      uint8_t operation = value[i];
+      uint8_t pin = value[i + 1];
+#ifdef PROXY_ANALOG_READ
+      if (operation == 0) {
+        short read = analogRead(analogPorts[pin]);
+        response[responseSize++] = (char)(read & 0xFF);
+        response[responseSize++] = (char)((read >> 8) & 0xFF);
+      }
+#endif
+#ifdef PROXY_DIGITAL_READ
+      if (operation == 2) {
+        response[responseSize++] = digitalRead(pin);
+      }
+#endif
+#ifdef PROXY_PIN_WRITE
+      if (operation == 1) {
+        analogWrite(pin, uint8_t(value[i + 2]));
+      }
+      if (operation == 3) {
+        pinMode(pin, OUTPUT);
+        digitalWrite(pin, value[i + 2]);
+      }
+#endif
+      i += (operation == 1 || operation == 3) ? 3 : 2;
+    }
+    if (responseSize == 0) {
+      response[responseSize++] = ' ';
+    }
+    sendResponse(requestID, response, responseSize);
   }
+#endif
 
+#ifdef PROXY_ANALOG_READ
   if (instruction == 'a') {
-
-
-
-
     if (valueSize == 1) {
-      
       short read = analogRead(analogPorts[value[0]]);
       const char response[2] = { (char)(read & 0xFF), (char)((read >> 8) & 0xFF) };
       sendResponse(requestID, response, 2);
     }
-  } else if (instruction == 'b') {
+  }
+#endif
+#ifdef PROXY_PIN_WRITE
+  if (instruction == 'b') {
     if (valueSize == 2) {
       analogWrite(value[0], int(uint8_t(value[1])));
-      sendResponse(requestID, new char[1]{ ' ' }, 1);
+      const char ack = ' ';
+      sendResponse(requestID, &ack, 1);
     }
   }
+#endif
 
 }
 
 void decodeSerial(const byte *data, int size, bool request) {
   if (request) {
     decodeRequest(data, size);
-  } else  {
+  }
+#ifdef PYDUINO_REMOTE_CALLS
+  else {
     decodeResponse(data, size);
-  } 
-}
-
-void print(const String data, bool newline) {
-  data += "\n";
-  int len = data.length();
-  char data_char[len];
-  for (int i = 0; i < len; i++) {
-    data_char[i] = data[i];
   }
-  sendRequest('l', data_char, len);
+#endif
 }
 
 void checkSerial() {
+#ifdef PYDUINO_SERIAL_TIMER
+  if (serialBusy) {
+    return;
+  }
+  serialBusy = true;
+#endif
   if (Serial.available()) {
     char data = Serial.read();
     int incomingDataSize = 0;
@@ -199,29 +295,34 @@ void checkSerial() {
       bool request = (data == StartCharacter);
       incomingDataSize = 1;
       incomingData[0] = data;
+      // a truncated frame is dropped, the timer interrupt would otherwise wait for its rest forever
+      unsigned long lastByte = millis();
       while (incomingDataSize < MaxRequestsLength) {
-        if (Serial.available()) {
+        if (!Serial.available()) {
+          if (millis() - lastByte > MessageCompleteTimeout) {
+            break;
+          }
+        } else {
+          lastByte = millis();
           data = Serial.read();
-
-          if (data == EndCharacter || data == ResponseEndCharacter) {
-            incomingData[incomingDataSize] = data;
-            decodeSerial(incomingData, incomingDataSize, request);
-            incomingDataSize = 0;
+          incomingData[incomingDataSize] = data;
+          incomingDataSize++;
+
+          // the frame ends after its size field, so the end character can also be a data byte
+          if (incomingDataSize >= 3 && incomingDataSize == uint8_t(incomingData[2]) + (request ? 5 : 4)) {
+            if (data == EndCharacter || data == ResponseEndCharacter) {
+              decodeSerial(incomingData, incomingDataSize - 1, request);
+            }
             break;
-          } else {
-            incomingData[incomingDataSize] = data;
-            incomingDataSize++;
           }
         }
       }
     }
   }
+#ifdef PROXY_SUBSCRIPTION
+  pollSubscription();
+#endif
+#ifdef PYDUINO_SERIAL_TIMER
+  serialBusy = false;
+#endif
 }
-
-void better_delay(int time){
-  int start = millis();
-  while (millis() - start < time){
-    checkSerial();
-  }
-}
-
@@ -0,0 +1,42 @@
+// Answers the requests of the pc about every millisecond, the program does not call checkSerial.
+// Timer 0 keeps its settings for millis() and the pwm, only its compare interrupt is added.
+// Interrupts stay enabled in the handler, the serial data is received by the serial interrupt.
+ISR(TIMER0_COMPA_vect, ISR_NOBLOCK) {
+  checkSerial();
+}
+
+void startSerialTimer() {
+  OCR0A = 0xAF;
+  TIMSK0 |= _BV(OCIE0A);
+}
+
+// The interrupt uses the pins for the pc (and the subscriptions), so it must not run while the program uses the
+// ADC or the pwm registers. The program's calls hold the connection like a message, the interrupt then returns
+// without answering and the requests wait for the next one. pinMode and digitalWrite disable the interrupts themselves.
+int timerAnalogRead(uint8_t pin) {
+  bool busy = serialBusy;
+  serialBusy = true;
+  int read = analogRead(pin);
+  serialBusy = busy;
+  return read;
+}
+
+int timerDigitalRead(uint8_t pin) {
+  bool busy = serialBusy;
+  serialBusy = true;
+  int read = digitalRead(pin);
+  serialBusy = busy;
+  return read;
+}
+
+void timerAnalogWrite(uint8_t pin, int value) {
+  bool busy = serialBusy;
+  serialBusy = true;
+  analogWrite(pin, value);
+  serialBusy = busy;
+}
+
+// the units and the program after this one use the guarded functions
+#define analogRead(pin) timerAnalogRead(pin)
+#define digitalRead(pin) timerDigitalRead(pin)
+#define analogWrite(pin, value) timerAnalogWrite(pin, value)
@@ -0,0 +1,78 @@
+// Samples the analog pins the pc subscribed to (analogSubscribe) at a fixed rate. The samples are sent in
+// 'v' requests that the pc does not answer, every frame has the samples of all pins for several points in time.
+// checkSerial takes the samples, so the rate is limited by how often it is called.
+const int MaxSubscribedPins = 6;
+const int SubscriptionFrameSize = 48;
+// a frame is sent when it is full or its first sample is this old (microseconds), so slow subscriptions are not delayed
+const unsigned long SubscriptionFrameDelay = 20000;
+
+uint8_t subscribedPins[MaxSubscribedPins];
+uint8_t subscribedPinCount = 0;
+unsigned long subscriptionInterval = 0;
+unsigned long lastSample = 0;
+unsigned long frameStart = 0;
+char samples[SubscriptionFrameSize];
+int samplesSize = 0;
+
+void sendSamples() {
+  char outgoingData[5 + SubscriptionFrameSize];
+  outgoingData[0] = StartCharacter;
+  outgoingData[1] = 0;
+  outgoingData[2] = (char)samplesSize;
+  outgoingData[3] = 'v';
+  for (int i = 0; i < samplesSize; i++) {
+    outgoingData[4 + i] = samples[i];
+  }
+  outgoingData[4 + samplesSize] = EndCharacter;
+  Serial.write(outgoingData, 5 + samplesSize);
+  samplesSize = 0;
+}
+
+// the interval in microseconds (4 bytes) and the analog pins, no pins stop the sampling
+void subscribe(const char *value, int size) {
+  if (size < 4) {
+    return;
+  }
+  if (samplesSize > 0) {
+    sendSamples();
+  }
+  subscriptionInterval = 0;
+  for (int i = 0; i < 4; i++) {
+    subscriptionInterval |= (unsigned long)uint8_t(value[i]) << (8 * i);
+  }
+  subscribedPinCount = min(size - 4, MaxSubscribedPins);
+  for (int i = 0; i < subscribedPinCount; i++) {
+    subscribedPins[i] = value[4 + i];
+  }
+  lastSample = micros();
+}
+
+void pollSubscription() {
+  if (subscribedPinCount == 0) {
+    return;
+  }
+  unsigned long now = micros();
+  if (samplesSize > 0 && now - frameStart >= SubscriptionFrameDelay) {
+    sendSamples();
+  }
+  if (now - lastSample < subscriptionInterval) {
+    return;
+  }
+  // the samples stay on the same schedule, unless the board is more than one interval behind
+  lastSample += subscriptionInterval;
+  if (now - lastSample >= subscriptionInterval) {
+    lastSample = now;
+  }
+  if (samplesSize == 0) {
+    frameStart = now;
+  }
+  for (int i = 0; i < subscribedPinCount; i++) {
+    short read = analogRead(analogPorts[subscribedPins[i]]);
+    samples[samplesSize++] = (char)(read & 0xFF);
+    samples[samplesSize++] = (char)((read >> 8) & 0xFF);
+  }
+  // a frame only has complete samples of all pins
+  if (samplesSize + 2 * subscribedPinCount > SubscriptionFrameSize) {
+    sendSamples();
+  }
+}
@@ -1,381 +1,503 @@
-# include <iostream>
-# include "Serial.cpp"
-# include <fstream>
-
-using namespace std;
-
-
-# include <chrono>
-# include <thread>
-
-using namespace std::chrono;
-using namespace std::this_thread;
-
-const char StartCharacter = '<';
-const char EndCharacter = '>';
-const char ResponseStartCharacter = '?';
-const char ResponseEndCharacter = '!';
-
-const int HandshakeTimeout = 10000;
-const int DataTimeout = 500;
-const int HandshakeResendTimeout = 10;
-const int MessageCompleteTimeout = 10;
-
-const int MaxRequests = 5;
-const int MaxRequestsLength = 50;
-
-
-template<typename T>
-class Promise {
-public:
-    typedef T(bytesToType)(char *bytes);
-
-    thread *t;
-
-    static void
-    resolve(int requestID, bytesToType bytesToType, T *targetVariable, char Responses[MaxRequests][MaxRequestsLength]) {
-        int microsecondsWaited = 0;
-        //cout << "start waiting" << endl;
-        while (Responses[requestID][0] == 0) {
-            sleep_for(microseconds(1));
-            microsecondsWaited++;
-            if (microsecondsWaited / 1000 > DataTimeout) {
-                cout << "Error: Timeout while waiting for response  request_id: " << requestID << endl;
-                return;
-            }
+# include "Serial_PC.h"
+# include <cstring>
+
+bool Arduino::readData(char *data, int length) const {
+    int bytesRead = 0;
+    int start = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
+    while (bytesRead < length) {
+        int now = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
+        if (now - start > MessageCompleteTimeout) {
+            return false;
         }
-        if (targetVariable == nullptr || bytesToType == nullptr) {
-            Responses[requestID][0] = 0;
-            return;
-        }
-        *targetVariable = bytesToType(Responses[requestID] + 1);
-        Responses[requestID][0] = 0;
-    }
+        int bytes = SP->ReadData(data + bytesRead, length - bytesRead, MessageCompleteTimeout - (now - start));
+        bytesRead += bytes;
 
-    Promise(T *targetVariable, bytesToType bytesToType, int requestID, char Responses[MaxRequests][MaxRequestsLength]) {
-        // start a thread with the resolving function
-        t = new thread(resolve, requestID, bytesToType, targetVariable, Responses);
     }
+    return true;
+}
 
-    // Destructor
-    ~Promise() {
-        // join the thread
-        t->join();
-    }
-};
+bool Arduino::Handshake() {
+    auto start = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
 
+    char random_x = rand() % 256;
+    char outgoingData[3] = {StartCharacter, random_x, EndCharacter};
+    char incomingData[3];
 
-class Arduino {
-    bool readData(char *data, int length) const {
-        int bytesRead = 0;
-        int start = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
-        while (bytesRead < length) {
-            int now = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
-            if (now - start > MessageCompleteTimeout) {
-                return false;
-            }
-            int bytes = SP->ReadData(data + bytesRead, length - bytesRead);
-            bytesRead += bytes;
+    SP->WriteData(outgoingData, 3);
+    auto lastResend = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
 
-        }
-        return true;
-    }
 
-    bool Handshake() {
-        auto start = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
-
-        char random_x = rand() % 256;
-        char outgoingData[3] = {StartCharacter, random_x, EndCharacter};
-        char incomingData[3];
-
-        SP->WriteData(outgoingData, 3);
-        auto lastResend = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
-
-
-        while (true) {
-            auto now = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
-            if (now - start > HandshakeTimeout) {
-                return false;
-            }
-            if (now - lastResend > HandshakeResendTimeout) {
-                SP->WriteData(outgoingData, 3);
-                lastResend = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
-            }
+    while (true) {
+        auto now = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
+        if (now - start > HandshakeTimeout) {
+            return false;
+        }
+        if (now - lastResend > HandshakeResendTimeout) {
+            SP->WriteData(outgoingData, 3);
+            lastResend = duration_cast<milliseconds>(system_clock::now().time_since_epoch()).count();
+        }
 
-            bool read = this->readData(incomingData, 3);
-            if (read && incomingData[0] == StartCharacter && incomingData[2] == EndCharacter) {
-                if (incomingData[1] == random_x) {
-                    // read syn
-                    this->readData(incomingData, 3);
-                    if (incomingData[0] == StartCharacter && incomingData[2] == EndCharacter) {
-                        // send syn
-                        outgoingData[1] = incomingData[1];
-                        SP->WriteData(outgoingData, 3);
-                        return true;
-                    }
+        bool read = this->readData(incomingData, 3);
+        if (read && incomingData[0] == StartCharacter && incomingData[2] == EndCharacter) {
+            if (incomingData[1] == random_x) {
+                // read syn
+                this->readData(incomingData, 3);
+                if (incomingData[0] == StartCharacter && incomingData[2] == EndCharacter) {
+                    // send syn
+                    outgoingData[1] = incomingData[1];
+                    SP->WriteData(outgoingData, 3);
+                    return true;
                 }
             }
         }
     }
+}
+
+void Arduino::decodeSerial(char *incomingData, int bytesRead, bool request) {
+    if (request) {
+        u_int requestID = incomingData[0];
+        if (requestID >= MaxRequests) {
+            //cout << "Error: Request ID out of bounds" << endl;
+            //return;
+        }
 
-    void decodeSerial(char *incomingData, int bytesRead, bool request) {
-        if (request) {
-            u_int requestID = incomingData[0];
-            if (requestID >= MaxRequests) {
-                //cout << "Error: Request ID out of bounds" << endl;
-                //return;
-            }
+        u_int size = incomingData[1];
+        if (size > MaxRequestsLength) {
+            cout << "Error: Request size out of bounds" << endl;
+            return;
+        }
 
-            u_int size = incomingData[1];
-            if (size > MaxRequestsLength) {
-                cout << "Error: Request size out of bounds" << endl;
-                return;
-            }
+        char instruction = incomingData[2];
+        char data[size];
+        for (int i = 0; i < size; i++) {
+            data[i] = incomingData[i + 3];
+        }
+        this->do_request(instruction, data, size, requestID);
 
-            char instruction = incomingData[2];
-            char data[size];
-            for (int i = 0; i < size; i++) {
-                data[i] = incomingData[i + 3];
-            }
-            this->do_request(instruction, data, size, requestID);
+    } else {
+        u_int requestID = incomingData[0];
+        if (requestID >= MaxRequests) {
+            cout << "Error: Request ID out of bounds" << endl;
+            return;
+        }
 
-        } else {
-            u_int requestID = incomingData[0];
-            if (requestID >= MaxRequests) {
-                cout << "Error: Request ID out of bounds" << endl;
+        u_int size = static_cast<u_char>(incomingData[1]);
+        if (size >= MaxRequestsLength) {
+            cout << "Error: Request size out of bounds" << endl;
+            return;
+        }
+        {
+            lock_guard<mutex> lock(this->responseMutex);
+            if (this->Requests[requestID] == 0) {
+                // the request timed out, the id can already belong to another request
                 return;
             }
-
-            u_int size = incomingData[1];
-            if (size > MaxRequestsLength) { cout << "Error: Request size out of bounds" << endl; }
-            this->Responses[requestID][0] = 1;
-            //cout << "hier" << endl;
             for (int i = 0; i < size; ++i) {
                 this->Responses[requestID][i + 1] = incomingData[i + 2];
             }
-
+            this->Responses[requestID][0] = 1;
         }
+        this->responseReceived.notify_all();
     }
+}
 
 
-    void do_request(char instruction, char data[], int size, int requestID) {
-        if (instruction == 'l') {
-            // print
-            cout << "[Arduino:] ";
-            for (int i = 0; i < size; ++i) {
-                cout << data[i];
-            }
-        } else if (instruction == 'm') {
-            char func_id = data[0];
-
-            do_function(*this, data + 1, func_id, requestID);
+void Arduino::do_request(char instruction, char data[], int size, int requestID) {
+    if (instruction == 'l') {
+        // print
+        cout << "[Arduino:] ";
+        for (int i = 0; i < size; ++i) {
+            cout << data[i];
         }
-    }
-
+    } else if (instruction == 'm') {
+        char func_id = data[0];
 
-    [[noreturn]]
-    static void listener(Arduino *arduino, Serial *SP) {
-        char incomingData[MaxRequestsLength];
-        char dataBuffer[1];
-        int readResult;
-        while (true) {
-            readResult = SP->ReadData(dataBuffer, 1);
-
-            if (readResult == 0) {
-                continue;
-            }
+        do_function(*this, data + 1, func_id, requestID);
+    } else if (instruction == 'v') {
+        this->decodeSamples(data, size);
+    }
+}
 
-            //cout << "read: " << dataBuffer[0] << " | " << (int)static_cast<u_char>(dataBuffer[0]) << endl;
-            if (dataBuffer[0] != StartCharacter && dataBuffer[0] != ResponseStartCharacter) {
-                continue;
-            }
-            int bytesRead = 0;
-            bool request = dataBuffer[0] == StartCharacter;
-            while (true) {
-                readResult = SP->ReadData(dataBuffer, 1);
-                //cout << "read: " << dataBuffer[0] << " | "<< (int)static_cast<u_char>(dataBuffer[0]) << "  request: " << request<< endl;
-                if (readResult == 0) {
-                    continue;
-                }
-                if (dataBuffer[0] == EndCharacter || dataBuffer[0] == ResponseEndCharacter) {
-                    break;
-                }
-                incomingData[bytesRead] = dataBuffer[0];
-                bytesRead++;
+void Arduino::decodeSamples(char data[], int size) {
+    {
+        lock_guard<mutex> lock(sampleMutex);
+        if (subscribedPins.empty()) {
+            return;
+        }
+        // the samples of all pins follow each other, 2 bytes each
+        for (int i = 0; i + 1 < size; i += 2) {
+            deque<int> &queue = samples[subscribedPins[(i / 2) % subscribedPins.size()]];
+            if (queue.size() >= MaxQueuedSamples) {
+                queue.pop_front();
             }
-
-            arduino->decodeSerial(incomingData, bytesRead, request);
+            queue.push_back(bytesToShort(data + i));
         }
     }
+    sampleReceived.notify_all();
+}
 
 
-public:
-    char Responses[MaxRequests][MaxRequestsLength]{};
-    char Requests[MaxRequests]{};
-    char request_id = 0;
-
-    Serial *SP;
-    thread *listenerThread;
-
-    void (*do_function)(Arduino, char *, char, char);
-
-    Arduino() {
-        // open "temp/port.txt" and read the port name
-        ifstream portFile("temp/port.txt");
-        string portNamef;
-        portFile >> portNamef;
-        portFile.close();
-        const char* portName = portNamef.c_str();
-        SP = new Serial(portName);
-        if (SP->IsConnected()) {
-            cout << "Connected to " << portName << endl;
-        } else {
-            cout << "Error: Could not connect to " << portName << endl;
+int Arduino::nextFrame(RingBuffer &buffer, char *frame, bool &request) {
+    while (buffer.size() > 0) {
+        char first = buffer.peek(0);
+        if (first != StartCharacter && first != ResponseStartCharacter) {
+            buffer.drop(1);
+            continue;
         }
-
-        if (Handshake()) {
-            cout << "Handshake successful" << endl;
-        } else {
-            cout << "Error: Handshake failed" << endl;
+        if (buffer.size() < 3) {
+            return 0;
         }
-        system("cls");
-        listenerThread = new thread(listener, this, SP);
-
+        // the frame has a size field, so the end character can also be a data byte
+        request = first == StartCharacter;
+        u_int size = static_cast<u_char>(buffer.peek(2));
+        int length = size + (request ? 5 : 4);
+        if (size > MaxRequestsLength) {
+            buffer.drop(1);
+            continue;
+        }
+        if (buffer.size() < length) {
+            return 0;
+        }
+        if (buffer.peek(length - 1) != (request ? EndCharacter : ResponseEndCharacter)) {
+            // not a frame, look for the next start character
+            buffer.drop(1);
+            continue;
+        }
+        for (int i = 1; i < length - 1; ++i) {
+            frame[i - 1] = buffer.peek(i);
+        }
+        buffer.drop(length);
+        return length - 2;
+    }
+    return 0;
+}
+
+[[noreturn]]
+void Arduino::listener(Arduino *arduino, Serial *SP) {
+    RingBuffer buffer;
+    char incomingData[ReadBufferSize];
+    char frame[MaxRequestsLength + 3];
+    bool request;
+    while (true) {
+        // waits until data arrives, the timeout only limits how long one read blocks
+        int bytesRead = SP->ReadData(incomingData, buffer.space(), ListenerWaitTimeout);
+        buffer.write(incomingData, bytesRead);
+
+        int frameSize;
+        while ((frameSize = nextFrame(buffer, frame, request)) > 0) {
+            arduino->decodeSerial(frame, frameSize, request);
+        }
+    }
+}
+
+
+Arduino::Arduino() {
+    // open "temp/port.txt" and read the port name
+    ifstream portFile("temp/port.txt");
+    string portNamef;
+    portFile >> portNamef;
+    portFile.close();
+    const char* portName = portNamef.c_str();
+    SP = new Serial(portName);
+    if (SP->IsConnected()) {
+        cout << "Connected to " << portName << endl;
+    } else {
+        cout << "Error: Could not connect to " << portName << endl;
     }
 
-    char next_request_id() {
-        while (true) {
-            for (int i = 0; i < MaxRequests; ++i) {
-                if (Requests[i] == 0) {
-                    Requests[i] = 1;
-                    return i;
+    if (Handshake()) {
+        cout << "Handshake successful" << endl;
+    } else {
+        cout << "Error: Handshake failed" << endl;
+    }
+    system("cls");
+    listenerThread = new thread(listener, this, SP);
+
+}
+
+char Arduino::next_request_id() {
+    unique_lock<mutex> lock(responseMutex);
+    while (true) {
+        if (inFlight < RequestWindow) {
+            // the ids are used in turn, so a late response does not find a new request with its id
+            for (int i = 1; i <= MaxRequests; ++i) {
+                int id = (request_id + i) % MaxRequests;
+                if (Requests[id] == 0) {
+                    Requests[id] = 1;
+                    request_id = id;
+                    inFlight++;
+                    return id;
                 }
-
             }
+        }
+        // a response frees a request id
+        if (responseReceived.wait_for(lock, milliseconds(DataTimeout)) == cv_status::timeout) {
             cout << "Error: No free request id" << endl;
         }
     }
-
-    static int bytesToInt(char *bytes) {
-        return (*static_cast<int *>(static_cast<void *>(bytes)));
+}
+
+bool Arduino::waitResponse(char requestID, char *data) {
+    unique_lock<mutex> lock(responseMutex);
+    bool received = responseReceived.wait_for(lock, milliseconds(DataTimeout),
+                                              [&] { return Responses[requestID][0] != 0; });
+    if (received) {
+        memcpy(data, Responses[requestID] + 1, MaxRequestsLength - 1);
+    } else {
+        cout << "Error: Timeout while waiting for response  request_id: " << (int) requestID << endl;
     }
-
-    static short bytesToShort(char *bytes) {
-        //cout << "bytesToShort: " << (int)static_cast<u_char>(bytes[0]) << " " << (int)static_cast<u_char>(bytes[1]) << endl;
-        return (*static_cast<short *>(static_cast<void *>(bytes)));
+    Responses[requestID][0] = 0;
+    Requests[requestID] = 0;
+    inFlight--;
+    responseReceived.notify_all();
+    return received;
+}
+
+int Arduino::bytesToInt(char *bytes) {
+    return (*static_cast<int *>(static_cast<void *>(bytes)));
+}
+
+short Arduino::bytesToShort(char *bytes) {
+    //cout << "bytesToShort: " << (int)static_cast<u_char>(bytes[0]) << " " << (int)static_cast<u_char>(bytes[1]) << endl;
+    return (*static_cast<short *>(static_cast<void *>(bytes)));
+}
+
+bool Arduino::bytesToBool(char *bytes) {
+    return (*static_cast<bool *>(static_cast<void *>(bytes)));
+}
+
+void Arduino::send_response(char data[], int size, int requestID) {
+    char outgoingData[size + 4];
+    outgoingData[0] = ResponseStartCharacter;
+    outgoingData[1] = requestID;
+    outgoingData[2] = size;
+    for (int i = 0; i < size; ++i) {
+        outgoingData[i + 3] = data[i];
     }
-
-    static bool bytesToBool(char *bytes) {
-        return (*static_cast<bool *>(static_cast<void *>(bytes)));
+    outgoingData[size + 3] = ResponseEndCharacter;
+
+    //cout << "send response: ";
+    //for (int i = 0; i < size+4; ++i) {
+    //    cout << " ( " << outgoingData[i] << " | " << (int)(static_cast<u_char>(outgoingData[i])) << " ) ";
+    //}
+    //cout << endl;
+
+    SP->WriteData(outgoingData, size + 4);
+}
+
+void Arduino::send_request(char instruction, char data[], u_char size, u_char requestID) {
+    char outgoingData[size + 5];
+    outgoingData[0] = StartCharacter;
+    outgoingData[1] = requestID;
+    outgoingData[2] = size;
+    outgoingData[3] = instruction;
+    for (int i = 0; i < size; ++i) {
+        outgoingData[i + 4] = data[i];
     }
-
-    void send_response(char data[], int size, int requestID) {
-        char outgoingData[size + 4];
-        outgoingData[0] = ResponseStartCharacter;
-        outgoingData[1] = requestID;
-        outgoingData[2] = size;
+    outgoingData[size + 4] = EndCharacter;
+    SP->WriteData(outgoingData, size + 5);
+}
+
+
+int Arduino::analogRead(int pin) {
+    return response(analogReadAsync(pin), bytesToShort);
+}
+
+int Arduino::digitalRead(int pin) {
+    return (int) response(digitalReadAsync(pin), bytesToBool);
+}
+
+void Arduino::analogWrite(int pin, int value) {
+    response(analogWriteAsync(pin, value));
+}
+
+void Arduino::digitalWrite(int pin, int value) {
+    response(digitalWriteAsync(pin, value));
+}
+
+char Arduino::analogReadAsync(int pin) {
+    char data[2] = {0, static_cast<char>(pin)};
+    char id = next_request_id();
+    send_request('n', data, 2, id);
+    return id;
+}
+
+char Arduino::digitalReadAsync(int pin) {
+    char data[2] = {2, static_cast<char>(pin)};
+    char id = next_request_id();
+    send_request('n', data, 2, id);
+    return id;
+}
+
+char Arduino::analogWriteAsync(int pin, int value) {
+    if (value > 255) {
+        value = 255;
+        cout << "Warning: analogWrite value to high, setting to 255" << endl;
+    }
+    char data[3] = {1, static_cast<char>(pin), static_cast<char>(value)};
+    char id = next_request_id();
+    send_request('n', data, 3, id);
+    return id;
+}
+
+char Arduino::digitalWriteAsync(int pin, int value) {
+    if (value > 1) {
+        value = 1;
+        cout << "Warning: digitalWrite value to high, setting to 1" << endl;
+    }
+    char data[3] = {3, static_cast<char>(pin), static_cast<char>(value)};
+    char id = next_request_id();
+    send_request('n', data, 3, id);
+    return id;
+}
+
+char Arduino::batchAsync(PinBatch &batch) {
+    char id = next_request_id();
+    send_request('p', batch.data, batch.size, id);
+    return id;
+}
+
+void Arduino::batchResponse(char requestID, PinBatch &batch) {
+    waitResponse(requestID, batch.results);
+}
+
+void Arduino::analogReadPins(const int pins[], int count, int results[]) {
+    // a batch has room for MaxBatchLength / 2 reads
+    for (int start = 0; start < count; start += MaxBatchLength / 2) {
+        int size = min(count - start, MaxBatchLength / 2);
+        PinBatch batch;
         for (int i = 0; i < size; ++i) {
-            outgoingData[i + 3] = data[i];
+            batch.analogRead(pins[start + i]);
         }
-        outgoingData[size + 3] = ResponseEndCharacter;
-
-        //cout << "send response: ";
-        //for (int i = 0; i < size+4; ++i) {
-        //    cout << " ( " << outgoingData[i] << " | " << (int)(static_cast<u_char>(outgoingData[i])) << " ) ";
-        //}
-        //cout << endl;
-
-        SP->WriteData(outgoingData, size + 4);
-    }
-
-    void send_request(char instruction, char data[], u_char size, u_char requestID) {
-        char outgoingData[size + 5];
-        outgoingData[0] = StartCharacter;
-        outgoingData[1] = requestID;
-        outgoingData[2] = size;
-        outgoingData[3] = instruction;
+        batchResponse(batchAsync(batch), batch);
         for (int i = 0; i < size; ++i) {
-            outgoingData[i + 4] = data[i];
+            results[start + i] = bytesToShort(batch.results + 2 * i);
         }
-        outgoingData[size + 4] = EndCharacter;
-        SP->WriteData(outgoingData, size + 5);
     }
+}
 
-
-    int analogRead(int pin) {
-        char data[2] = {0, static_cast<char>(pin)};
-        char id = next_request_id();
-        send_request('n', data, 2, id);
-        short result;
-        delete new Promise<short>(&result, bytesToShort, id, Responses);
-        Requests[id] = 0;
-        return result;
-    }
-
-    int digitalRead(int pin) {
-        char data[2] = {2, static_cast<char>(pin)};
-        char id = next_request_id();
-        send_request('n', data, 1, id);
-        bool result;
-        delete new Promise<bool>(&result, bytesToBool, id, Responses);
-        Requests[id] = 0;
-        return (int) result;
+void Arduino::digitalReadPins(const int pins[], int count, int results[]) {
+    for (int start = 0; start < count; start += MaxBatchLength / 2) {
+        int size = min(count - start, MaxBatchLength / 2);
+        PinBatch batch;
+        for (int i = 0; i < size; ++i) {
+            batch.digitalRead(pins[start + i]);
+        }
+        batchResponse(batchAsync(batch), batch);
+        for (int i = 0; i < size; ++i) {
+            results[start + i] = bytesToBool(batch.results + i);
+        }
     }
+}
 
-    void analogWrite(int pin, int value) {
-        if (value > 255) {
-            value = 255;
-            cout << "Warning: analogWrite value to high, setting to 255" << endl;
+void Arduino::analogWritePins(const int pins[], const int values[], int count) {
+    for (int start = 0; start < count; start += MaxBatchLength / 3) {
+        PinBatch batch;
+        for (int i = start; i < min(count, start + MaxBatchLength / 3); ++i) {
+            batch.analogWrite(pins[i], values[i]);
         }
-        char data[3] = {1, static_cast<char>(pin), static_cast<char>(value)};
-        char id = next_request_id();
-        send_request('n', data, 3, id);
-        delete new Promise<int>(nullptr, nullptr, id, Responses);
-        Requests[id] = 0;
+        batchResponse(batchAsync(batch), batch);
     }
+}
 
-    void digitalWrite(int pin, int value) {
-        if (value > 1) {
-            value = 1;
-            cout << "Warning: digitalWrite value to high, setting to 1" << endl;
+void Arduino::digitalWritePins(const int pins[], const int values[], int count) {
+    for (int start = 0; start < count; start += MaxBatchLength / 3) {
+        PinBatch batch;
+        for (int i = start; i < min(count, start + MaxBatchLength / 3); ++i) {
+            batch.digitalWrite(pins[i], values[i]);
         }
-        if (value == 1) {
-            value = 255;
-        }
-        analogWrite(pin, value);
+        batchResponse(batchAsync(batch), batch);
     }
-
-    void lcd_print(char *text) {
-        cout << "lcd_print: " << text << " (not implemented)" << endl;
-        char id = next_request_id();
-        int size = strlen(text) + 1;
-        char data[size];
-        data[0] = 2;
-        for (int i = 1; i < size; ++i) {
-            data[i] = text[i-1];
+}
+
+void Arduino::lcd_print(char *text) {
+    cout << "lcd_print: " << text << " (not implemented)" << endl;
+    char id = next_request_id();
+    int size = strlen(text) + 1;
+    char data[size];
+    data[0] = 2;
+    for (int i = 1; i < size; ++i) {
+        data[i] = text[i-1];
+    }
+    send_request('o',data , strlen(text) + 1, id);
+    response(id);
+}
+
+void Arduino::lcd_setCursor(int x, int y) {
+    cout << "lcd_setCursor: " << x << " " << y << " (not implemented)" << endl;
+    char id = next_request_id();
+    char data[3] = {1, static_cast<char>(x), static_cast<char>(y)};
+    send_request('o', data, 3, id);
+    response(id);
+}
+
+void Arduino::lcd_clear() {
+    cout << "lcd_clear: (not implemented)" << endl;
+    char id = next_request_id();
+    char data[1] = {3};
+    send_request('o', data, 1, id);
+    response(id);
+}
+
+void Arduino::analogSubscribe(int rate, initializer_list<int> pins) {
+    if (rate <= 0 || pins.size() == 0 || pins.size() > 6) {
+        cout << "Error: analogSubscribe needs a rate above 0 and 1 to 6 pins" << endl;
+        return;
+    }
+    analogUnsubscribe();
+    unsigned int interval = 1000000 / rate;
+    char data[4 + 6];
+    for (int i = 0; i < 4; ++i) {
+        data[i] = static_cast<char>((interval >> (8 * i)) & 0xFF);
+    }
+    int size = 4;
+    {
+        lock_guard<mutex> lock(sampleMutex);
+        for (int pin: pins) {
+            if (pin < 0 || pin > 5) {
+                cout << "Error: analogSubscribe pin out of range: " << pin << endl;
+                subscribedPins.clear();
+                return;
+            }
+            subscribedPins.push_back(pin);
+            data[size++] = static_cast<char>(pin);
         }
-        send_request('o',data , strlen(text) + 1, id);
-        delete new Promise<int>(nullptr, nullptr, id, Responses);
-        Requests[id] = 0;
+        subscriptionInterval = interval / 1000;
     }
-
-    void lcd_setCursor(int x, int y) {
-        cout << "lcd_setCursor: " << x << " " << y << " (not implemented)" << endl;
-        char id = next_request_id();
-        char data[3] = {1, static_cast<char>(x), static_cast<char>(y)};
-        send_request('o', data, 3, id);
-        delete new Promise<int>(nullptr, nullptr, id, Responses);
-        Requests[id] = 0;
+    response(send_subscription(data, size));
+}
+
+int Arduino::analogNext(int pin) {
+    unique_lock<mutex> lock(sampleMutex);
+    if (pin < 0 || pin > 5) {
+        cout << "Error: analogNext pin out of range: " << pin << endl;
+        return -1;
     }
-
-    void lcd_clear() {
-        cout << "lcd_clear: (not implemented)" << endl;
-        char id = next_request_id();
-        char data[1] = {3};
-        send_request('o', data, 1, id);
-        delete new Promise<int>(nullptr, nullptr, id, Responses);
-        Requests[id] = 0;
+    // the board sends a sample at most 20 ms after taking it (SubscriptionFrameDelay), so one arrives about every
+    // subscriptionInterval milliseconds
+    if (!sampleReceived.wait_for(lock, milliseconds(DataTimeout + 2 * subscriptionInterval),
+                                 [&] { return !samples[pin].empty(); })) {
+        cout << "Error: Timeout while waiting for a sample of pin " << pin << endl;
+        return -1;
     }
+    int sample = samples[pin].front();
+    samples[pin].pop_front();
+    return sample;
+}
+
+void Arduino::analogUnsubscribe() {
+    // a subscription without pins stops the sampling, the board sends the last samples first
+    char data[4] = {0, 0, 0, 0};
+    response(send_subscription(data, 4));
+    lock_guard<mutex> lock(sampleMutex);
+    subscribedPins.clear();
+    for (deque<int> &queue: samples) {
+        queue.clear();
+    }
+}
 
-};
-
+char Arduino::send_subscription(char data[], int size) {
+    char id = next_request_id();
+    send_request('s', data, size, id);
+    return id;
+}
@@ -0,0 +1,233 @@
+#ifndef SERIAL_PC_H_INCLUDED
+#define SERIAL_PC_H_INCLUDED
+
+# include <iostream>
+# include "SerialClass.h"
+# include <fstream>
+
+using namespace std;
+
+
+# include <chrono>
+# include <thread>
+# include <mutex>
+# include <condition_variable>
+# include <deque>
+# include <vector>
+# include <initializer_list>
+
+using namespace std::chrono;
+using namespace std::this_thread;
+
+const char StartCharacter = '<';
+const char EndCharacter = '>';
+const char ResponseStartCharacter = '?';
+const char ResponseEndCharacter = '!';
+
+const int HandshakeTimeout = 10000;
+const int DataTimeout = 500;
+const int HandshakeResendTimeout = 10;
+const int MessageCompleteTimeout = 10;
+
+// the ids of the requests of the pc, the board has its own ids for its requests
+const int MaxRequests = 64;
+const int MaxRequestsLength = 50;
+
+// the requests that are sent before their responses are read, the transpiler pipelines the requests within both limits
+// (emitter.py reads them from here). The board buffers 63 bytes of incoming requests, the frames must fit.
+const int RequestWindow = 8;
+const int RequestWindowBytes = 63;
+
+// the samples of a subscription that are kept until analogNext reads them, the oldest ones are dropped
+const int MaxQueuedSamples = 1 << 16;
+
+// the bytes of the pin operations of one batch, the board reads requests up to 50 bytes with the frame
+const int MaxBatchLength = 45;
+
+// Pin operations that are sent to the board in one request ('p'), the board runs them in order.
+// The results of the reads follow each other in results (2 bytes for analogRead, 1 byte for digitalRead)
+class PinBatch {
+public:
+    char data[MaxBatchLength]{};
+    int size = 0;
+    char results[MaxRequestsLength]{};
+
+    // the operations have the numbers of the 'n' requests
+    void analogRead(int pin) { add(0, pin); }
+
+    void digitalRead(int pin) { add(2, pin); }
+
+    void analogWrite(int pin, int value) { add(1, pin, value < 0 ? 0 : value > 255 ? 255 : value); }
+
+    void digitalWrite(int pin, int value) { add(3, pin, value != 0); }
+
+private:
+    bool reserve(int length) {
+        if (size + length > MaxBatchLength) {
+            cout << "Error: Too many pin operations in one batch" << endl;
+            return false;
+        }
+        return true;
+    }
+
+    void add(char operation, int pin) {
+        if (reserve(2)) {
+            data[size++] = operation;
+            data[size++] = static_cast<char>(pin);
+        }
+    }
+
+    void add(char operation, int pin, int value) {
+        if (reserve(3)) {
+            data[size++] = operation;
+            data[size++] = static_cast<char>(pin);
+            data[size++] = static_cast<char>(value);
+        }
+    }
+};
+
+const int ReadBufferSize = 512;
+const int ListenerWaitTimeout = 100;
+
+// The bytes the listener has read but not decoded yet
+class RingBuffer {
+    char data[ReadBufferSize]{};
+    int start = 0;
+    int count = 0;
+
+public:
+    int size() const { return count; }
+
+    int space() const { return ReadBufferSize - count; }
+
+    char peek(int i) const { return data[(start + i) % ReadBufferSize]; }
+
+    void write(const char *bytes, int length) {
+        for (int i = 0; i < length; ++i) {
+            data[(start + count + i) % ReadBufferSize] = bytes[i];
+        }
+        count += length;
+    }
+
+    void drop(int length) {
+        start = (start + length) % ReadBufferSize;
+        count -= length;
+    }
+};
+
+
+class Arduino {
+    bool readData(char *data, int length) const;
+
+    bool Handshake();
+
+    void decodeSerial(char *incomingData, int bytesRead, bool request);
+
+    void do_request(char instruction, char data[], int size, int requestID);
+
+    static int nextFrame(RingBuffer &buffer, char *frame, bool &request);
+
+    [[noreturn]]
+    static void listener(Arduino *arduino, Serial *SP);
+
+public:
+    // Responses[id][0] is set by the listener when the response is there, guarded by responseMutex
+    char Responses[MaxRequests][MaxRequestsLength]{};
+    char Requests[MaxRequests]{};
+    int request_id = 0;
+    int inFlight = 0;
+    mutex responseMutex;
+    condition_variable responseReceived;
+
+    Serial *SP;
+    thread *listenerThread;
+
+    void (*do_function)(Arduino &, char *, char, char);
+
+    Arduino();
+
+    char next_request_id();
+
+    static int bytesToInt(char *bytes);
+
+    static short bytesToShort(char *bytes);
+
+    static bool bytesToBool(char *bytes);
+
+    void send_response(char data[], int size, int requestID);
+
+    void send_request(char instruction, char data[], u_char size, u_char requestID);
+
+    bool waitResponse(char requestID, char *data);
+
+    // waits for the response of the request and frees the request id, the requests of the ...Async functions
+    // can be sent one after another before the first response is read
+    template<typename T>
+    T response(char requestID, T (*bytesToType)(char *bytes)) {
+        char data[MaxRequestsLength]{};
+        waitResponse(requestID, data);
+        return bytesToType(data);
+    }
+
+    void response(char requestID) {
+        char data[MaxRequestsLength];
+        waitResponse(requestID, data);
+    }
+
+    int analogRead(int pin);
+
+    int digitalRead(int pin);
+
+    void analogWrite(int pin, int value);
+
+    void digitalWrite(int pin, int value);
+
+    char analogReadAsync(int pin);
+
+    char digitalReadAsync(int pin);
+
+    char analogWriteAsync(int pin, int value);
+
+    char digitalWriteAsync(int pin, int value);
+
+    char batchAsync(PinBatch &batch);
+
+    void batchResponse(char requestID, PinBatch &batch);
+
+    // the pins of a list, in as few requests as possible
+    void analogReadPins(const int pins[], int count, int results[]);
+
+    void digitalReadPins(const int pins[], int count, int results[]);
+
+    void analogWritePins(const int pins[], const int values[], int count);
+
+    void digitalWritePins(const int pins[], const int values[], int count);
+
+    void lcd_print(char *text);
+
+    void lcd_setCursor(int x, int y);
+
+    void lcd_clear();
+
+    // the board samples the analog pins rate times per second and sends the samples without requests
+    void analogSubscribe(int rate, initializer_list<int> pins);
+
+    // the next sample of a subscribed pin, waits until the board sends it
+    int analogNext(int pin);
+
+    void analogUnsubscribe();
+
+private:
+    // the pins of the subscription in the order of the samples, guarded by sampleMutex
+    vector<int> subscribedPins;
+    deque<int> samples[6];
+    int subscriptionInterval = 0;
+    mutex sampleMutex;
+    condition_variable sampleReceived;
+
+    void decodeSamples(char data[], int size);
+
+    char send_subscription(char data[], int size);
+};
+
+#endif // SERIAL_PC_H_INCLUDED
@@ -2,6 +2,8 @@ import time
 
 from server.transpiler.pyduino_utils import *
 from server.transpiler.variable import *
+from server.transpiler.ir import *
+from server.transpiler.folding import ConstantFolding
 
 
 class Control:
@@ -24,7 +26,7 @@ class Control:
     @staticmethod
     def do_condition(condition: list[Token], transpiler: 'Transpiler', condition_type: str):
         """
-        returns the c code for the control statement
+        returns the condition of the control statement as a bool value
         :param condition: the condition of the control statement
         :param transpiler:
         :param condition_type: if, while or for...
@@ -33,14 +35,19 @@ class Control:
         instruction = Value.do_value(condition, transpiler)
 
         possible, instruction = instruction.type.to_bool()
+        location = Range.fromPositions(condition[0].location.start, condition[-1].location.end)
 
         if not possible:
-            transpiler.data.newError(f"Condition of {condition_type} statement must be a boolean",
-                                     Range.fromPositions(condition[0].location.start, condition[-1].location.end))
-        return instruction.name
+            transpiler.data.newError(f"Condition of {condition_type} statement must be a boolean", location)
+            transpiler.data.invalid_line_fallback.fallback(transpiler)
+        return Constant(instruction.name, instruction, location)
 
     @staticmethod
-    def check_indent(transpiler: 'Transpiler', condition_type: str):
+    def check_indent(transpiler: 'Transpiler', condition_type: str, body: list[Statement] = None):
+        """
+        Transpiles the indented block after the statement
+        :param body: The statements of the block are added to this list instead of code_done
+        """
         if transpiler.current_indent.index + 1 >= len(transpiler.current_indent.inside):
             transpiler.data.newError(f"Expected indent after {condition_type} statement",
                                      Range.fromPositions(transpiler.current_indent.inside[-1][-1].location.start,
@@ -50,10 +57,21 @@ class Control:
         next_line = transpiler.current_indent.inside[transpiler.current_indent.index + 1]
 
         if next_line[0].type != Indent.INDENT:
+            # the next line is not part of the statement, it is checked on its own
             transpiler.data.newError(f"Expected indent after {condition_type} statement",
                                      Range.fromPositions(next_line[0].location.start, next_line[0].location.end))
+            return
         next(transpiler.current_indent.enumerator)
-        transpiler.transpileRange(next_line[0])
+        if body is None:
+            transpiler.transpileRange(next_line[0])
+            return
+
+        code_done = transpiler.data.code_done
+        transpiler.data.code_done = body
+        try:
+            transpiler.transpileRange(next_line[0])
+        finally:
+            transpiler.data.code_done = code_done
 
     @staticmethod
     def do_if(instruction: list[Token], transpiler: 'Transpiler'):
@@ -64,14 +82,13 @@ class Control:
 
         condition = Control.do_condition(instruction[1:], transpiler, "if")
 
-
-        data.code_done.append(f"if ({condition}) {{")
-
+        body = []
+        statement = If([(condition, body)], location=Range.fromPositions(instruction[0].location.start,
+                                                                          instruction[-1].location.end))
+        data.code_done.append(statement)
 
         # Get the lentgh of the if-statement (identent part)
-        Control.check_indent(transpiler, "if")
-
-        data.code_done.append("}")
+        Control.check_indent(transpiler, "if", body)
 
         while True:
             transpiler.current_indent = transpiler.current_indent.parent
@@ -84,21 +101,18 @@ class Control:
 
                 condition = Control.do_condition(instruction[1:], transpiler, "elif")
 
-                data.code_done.append(f"else if ({condition}) {{")
-
-                Control.check_indent(transpiler, "elif")
+                body = []
+                statement.branches.append((condition, body))
 
-                data.code_done.append("}")
+                Control.check_indent(transpiler, "elif", body)
             else:
                 break
 
         if line[0].type == Keyword.ELSE:
             StringUtils.check_colon(line, transpiler)
-            data.code_done.append("else {")
+            statement.orelse = []
 
-            Control.check_indent(transpiler, "else")
-
-            data.code_done.append("}")
+            Control.check_indent(transpiler, "else", statement.orelse)
         else:
             transpiler.do_line(line)
 
@@ -110,14 +124,14 @@ class Control:
 
         condition = Control.do_condition(instruction[1:], transpiler, "while")
 
-        transpiler.data.code_done.append(f"while ({condition}) {{")
+        statement = While(condition, [], Range.fromPositions(instruction[0].location.start,
+                                                             instruction[-1].location.end))
+        transpiler.data.code_done.append(statement)
 
         transpiler.data.in_loop += 1
-        Control.check_indent(transpiler, "while")
+        Control.check_indent(transpiler, "while", statement.body)
         transpiler.data.in_loop -= 1
 
-        transpiler.data.code_done.append("}")
-
     @staticmethod
     def check_break_continue(instruction: list[Token], transpiler: 'Transpiler'):
         if instruction[0].type != Keyword.BREAK and instruction[0].type != Keyword.CONTINUE:
@@ -130,9 +144,9 @@ class Control:
             transpiler.data.newError(f"{instruction[0].type.code} statement must be in a loop", instruction[0].location)
 
         if instruction[0].type == Keyword.BREAK:
-            transpiler.data.code_done.append("break;")
+            transpiler.data.code_done.append(Break(instruction[0].location))
         else:
-            transpiler.data.code_done.append("continue;")
+            transpiler.data.code_done.append(Continue(instruction[0].location))
         return True
 
 
@@ -165,7 +179,7 @@ class Control:
             return
 
         counter_name = left[0].value
-        range_three = False
+        location = Range.fromPositions(instruction[0].location.start, instruction[-1].location.end)
 
         if right[0].type == Word.IDENTIFIER and right[0].value == "range":
             if len(right) > 2:
@@ -198,16 +212,13 @@ class Control:
             range_args = [Value.do_value(arg, transpiler) for arg in args]
 
             if len(range_args) == 1:
-                transpiler.data.code_done.append(
-                    f"for (int {counter_name} = 0; {counter_name} < {range_args[0].name}; {counter_name}++) {{")
+                statement = ForRange(counter_name, None, range_args[0], None, [], location)
             elif len(range_args) == 2:
-                transpiler.data.code_done.append(
-                    f"for (int {counter_name} = {range_args[0].name}; {counter_name} < {range_args[1].name}; {counter_name}++) {{")
+                statement = ForRange(counter_name, range_args[0], range_args[1], None, [], location)
             else:
-                transpiler.data.code_done.append(f"if({range_args[0].name} < {range_args[1].name}) {{")
-                transpiler.data.code_done.append(
-                    f"for (int {counter_name} = {range_args[0].name}; {counter_name} < {range_args[1].name}; {counter_name} += {range_args[2].name}) {{")
-                range_three = True
+                if range_args[2].type.is_type(PyduinoInt()) and ConstantFolding.literal(range_args[2]) == 0:
+                    transpiler.data.newError("Range step must not be zero", range_args[2].location)
+                statement = ForRange(counter_name, range_args[0], range_args[1], range_args[2], [], location)
             counter = Variable(counter_name, PyduinoInt(), left[0].location)
 
         else:
@@ -216,26 +227,18 @@ class Control:
                 transpiler.data.newError("For statement must have a iterable", instruction[0].location)
                 return
 
-            transpiler.data.code_done.append(f"for (auto {left[0].value} : {iterable.name}) {{")
+            statement = ForEach(counter_name, iterable, [], location)
             counter = Variable(counter_name, iterable.type.item, left[0].location)
 
         end_line = StringUtils.get_indentation_range(transpiler.location.position.line + 1, transpiler)
         transpiler.scope.add_Variable(counter)
 
+        transpiler.data.code_done.append(statement)
         transpiler.data.in_loop += 1
-        len_before = len(transpiler.data.code_done)
 
-        Control.check_indent(transpiler, "for")
+        Control.check_indent(transpiler, "for", statement.body)
 
         transpiler.data.in_loop -= 1
-        transpiler.data.code_done.append("}")
-
-        if range_three:
-            transpiler.data.code_done.append("}\nelse {")
-            transpiler.data.code_done.append(
-                f"for (int {counter_name} = {range_args[0].name}; {counter_name} > {range_args[1].name}; {counter_name} += {range_args[2].name}) {{")
-            transpiler.data.code_done.extend(transpiler.data.code_done[len_before:-2])
-            transpiler.data.code_done.append("}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,428 @@
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
+
+from server.transpiler.ir import *
+from server.transpiler.reachability import Reachability
+from server.transpiler.function import Builtin
+
+if TYPE_CHECKING:
+    from server.transpiler.transpiler import Transpiler
+
+
+# the standard headers the pc builtins need, the runtime header only declares the String(...) conversions
+PC_INCLUDES = {"print": ["<iostream>"], "millis": ["<chrono>"], "delay": ["<chrono>", "<thread>"]}
+LCD_FUNCTIONS = {"lcd_print", "lcd_setCursor", "lcd_clear", "lcd_createCustomChar", "lcd_writeCustomChar"}
+# the units of the board runtime in the order they are linked
+BOARD_RUNTIME = ["Runtime_Arduino", "Analog_Ports", "Serial_Arduino", "Subscription_Arduino",
+                 "Serial_Timer_Arduino", "Print_Arduino", "Delay_Arduino", "Delay_Serial_Arduino", "Lcd_Arduino",
+                 "Lcd_CustomChar_Arduino"]
+# the pin functions the pc sends together in one request (PinBatch in Serial_PC.h), with the size of their results
+PIN_BATCH = {"analogRead": 2, "digitalRead": 1, "analogWrite": 0, "digitalWrite": 0}
+# the bytes of the pin functions in a request, the operation, the pin and the value of the writes
+PIN_REQUEST = {"analogRead": 2, "digitalRead": 2, "analogWrite": 3, "digitalWrite": 3}
+# the start, id, size, instruction and end bytes of a request frame
+FRAME_BYTES = 5
+
+
+def runtime_constant(name: str) -> int:
+    """
+    The limits of the pc runtime are only set in Serial_PC.h, the pipelined code has to stay within them
+    """
+    with open(os.path.join(os.path.dirname(__file__), "SerialCommunication", "Serial_PC.h")) as f:
+        return int(re.search(rf"const int {name} = (\d+);", f.read()).group(1))
+
+
+# the requests and their bytes the pc sends before it reads the first response
+PIPELINE_DEPTH = runtime_constant("RequestWindow")
+PIPELINE_BYTES = runtime_constant("RequestWindowBytes")
+# the requests of the pc the board answers (Serial_Arduino.ino), by the builtins that send them
+PROXY_FEATURES = {"analogRead": "PROXY_ANALOG_READ", "digitalRead": "PROXY_DIGITAL_READ",
+                  "analogWrite": "PROXY_PIN_WRITE", "digitalWrite": "PROXY_PIN_WRITE",
+                  "analogSubscribe": "PROXY_SUBSCRIPTION", "analogUnsubscribe": "PROXY_SUBSCRIPTION"}
+
+
+class Emitter(ABC):
+    """
+    Turns the statements of a transpiled section into code, the statements are the same for both targets
+    """
+
+    def __init__(self, transpiler: 'Transpiler'):
+        self.transpiler = transpiler
+        self.data = transpiler.data
+        self.called = Reachability.functions(transpiler)
+        self.called_names = {f.name for f in self.called}
+        self.EMIT = {Code: self.code, Declaration: self.declaration, Assignment: self.assignment, Call: self.call,
+                     ExpressionStatement: self.expression_statement, Return: self.return_, Break: self.break_,
+                     Continue: self.continue_, If: self.if_, While: self.while_, ForRange: self.for_range,
+                     ForEach: self.for_each, FunctionDefinition: self.function_definition}
+
+    @abstractmethod
+    def emit(self) -> str:
+        """
+        :return: The complete code of the section
+        """
+        pass
+
+    def statements(self, statements: list[Statement]) -> list[str]:
+        code = []
+        for statement in statements:
+            code.extend(self.EMIT[type(statement)](statement))
+        return code
+
+    def functions(self) -> list[str]:
+        """
+        :return: The code of the functions that are reachable from the program
+        """
+        called = {id(f) for f in self.called}
+        code = []
+        for f in self.transpiler.scope.functions:
+            if id(f) in called:
+                code.extend(self.statements(f.code))
+        return code
+
+    def loop_body(self, statements: list[Statement]) -> list[str]:
+        """
+        The code of the body of a loop, the code is run on every iteration
+        """
+        return self.statements(statements)
+
+    def code(self, statement: Code) -> list[str]:
+        return [statement.code]
+
+    def declaration(self, statement: Declaration) -> list[str]:
+        value = statement.value
+        if value.type.is_iterable():
+            base_type = value.type.get_base_type()
+            return [f"{base_type.c_typename()} {statement.variable.name}"
+                    f"{''.join(f'[]' for i in value.type.dimensions())} = {value.type.name};"]
+        return [f"{statement.variable.type.c_typename()} {statement.variable.name} = {value.type.name};"]
+
+    def assignment(self, statement: Assignment) -> list[str]:
+        return [f"{statement.target.name}{''.join(f'[{i.type.name}]' for i in statement.indices)} = "
+                f"{statement.value.type.name};"]
+
+    def call(self, statement: Call) -> list[str]:
+        if statement.variable is None:
+            return [f"{statement.value.name};"]
+        return [f"{statement.variable.type.c_typename()} {statement.variable.name} = {statement.value.name};"]
+
+    def expression_statement(self, statement: ExpressionStatement) -> list[str]:
+        return [f"{statement.value.name};"]
+
+    def return_(self, statement: Return) -> list[str]:
+        if statement.value is None:
+            return ["return;"]
+        return [f"return {statement.value.name};"]
+
+    def break_(self, statement: Break) -> list[str]:
+        return ["break;"]
+
+    def continue_(self, statement: Continue) -> list[str]:
+        return ["continue;"]
+
+    def if_(self, statement: If) -> list[str]:
+        code = []
+        for i, (condition, body) in enumerate(statement.branches):
+            code.append(f"{'else if' if i else 'if'} ({condition.name}) {{")
+            code.extend(self.statements(body))
+            code.append("}")
+        if statement.orelse is not None:
+            # the block stays a block when the other branches are removed, it has its own variables
+            code.append("else {" if code else "{")
+            code.extend(self.statements(statement.orelse))
+            code.append("}")
+        return code
+
+    def while_(self, statement: While) -> list[str]:
+        return [f"while ({statement.condition.name}) {{", *self.loop_body(statement.body), "}"]
+
+    def for_range(self, statement: ForRange) -> list[str]:
+        counter = statement.counter
+        start = statement.start.name if statement.start is not None else 0
+        stop = statement.stop.name
+        if statement.step is None:
+            header = f"for (int {counter} = {start}; {counter} < {stop}; {counter}++) {{"
+        elif statement.ascending is not None:
+            compare = "<" if statement.ascending else ">"
+            header = f"for (int {counter} = {start}; {counter} {compare} {stop}; {counter} += {statement.step.name}) {{"
+        else:
+            # the direction of the loop is only known at runtime, the body is only emitted once
+            step = statement.step.name
+            header = (f"for (int {counter} = {start}; ({step} > 0) ? ({counter} < {stop}) : ({counter} > {stop}); "
+                      f"{counter} += {step}) {{")
+        return [header, *self.loop_body(statement.body), "}"]
+
+    def for_each(self, statement: ForEach) -> list[str]:
+        return [f"for (auto {statement.counter} : {statement.iterable.name}) {{", *self.loop_body(statement.body),
+                "}"]
+
+    def function_definition(self, statement: FunctionDefinition) -> list[str]:
+        function = statement.function
+        return [f"{function.return_type.c_typename()} {function.name}"
+                f"({', '.join([f'{arg.type.c_typename()} {arg.name}' for arg in function.args])}) {{",
+                *self.statements(statement.body), "}"]
+
+
+class CppEmitter(Emitter):
+    """
+    The main program for the pc
+    """
+
+    def statements(self, statements: list[Statement]) -> list[str]:
+        """
+        Consecutive calls that the board answers are pipelined, all requests are sent before the responses are read
+        """
+        code = []
+        run = []  # the pipelined calls with the declarations and assignments between them
+        for statement in statements:
+            if isinstance(statement, Call) and statement.request is not None:
+                calls = [s for s in run if isinstance(s, Call)] + [statement]
+                if len(calls) > PIPELINE_DEPTH or CppEmitter.request_bytes(calls) > PIPELINE_BYTES \
+                        or CppEmitter.uses_results(statement, run):
+                    code.extend(self.pipeline(run))
+                    run = []
+                run.append(statement)
+            elif run and isinstance(statement, (Declaration, Assignment)):
+                # they only use the results of the calls before them, so they can wait for the responses
+                run.append(statement)
+            else:
+                code.extend(self.pipeline(run))
+                run = []
+                code.extend(self.EMIT[type(statement)](statement))
+        code.extend(self.pipeline(run))
+        return code
+
+    def pipeline(self, run: list[Statement]) -> list[str]:
+        requests = CppEmitter.batches([s for s in run if isinstance(s, Call)])
+        if len(requests) < 2 and all(len(calls) < 2 for calls in requests):
+            return [line for statement in run for line in self.EMIT[type(statement)](statement)]
+
+        code = []
+        request_ids = []
+        for calls in requests:
+            if len(calls) == 1:
+                request_id = self.transpiler.utils.next_sysvar()
+                code.append(f"char {request_id} = {calls[0].request};")
+            else:
+                batch = self.transpiler.utils.next_sysvar()
+                code.append(f"PinBatch {batch};")
+                code.extend(f"{batch}.{call.function.name}({', '.join([a.name for a in call.arguments])});"
+                            for call in calls)
+                request_id = self.transpiler.utils.next_sysvar()
+                code.append(f"char {request_id} = arduino.batchAsync({batch});")
+                request_id = (request_id, batch)
+            request_ids.append(request_id)
+
+        for request_id, calls in zip(request_ids, requests):
+            if len(calls) == 1:
+                call = calls[0]
+                if call.variable is None:
+                    code.append(f"arduino.response({request_id});")
+                else:
+                    code.append(f"{call.variable.type.c_typename()} {call.variable.name} = "
+                                f"arduino.response({request_id}, Arduino::{call.function.response_conversion});")
+                continue
+            request_id, batch = request_id
+            code.append(f"arduino.batchResponse({request_id}, {batch});")
+            offset = 0  # the results of the reads follow each other in the response
+            for call in calls:
+                if call.variable is not None:
+                    code.append(f"{call.variable.type.c_typename()} {call.variable.name} = "
+                                f"Arduino::{call.function.response_conversion}({batch}.results + {offset});")
+                offset += PIN_BATCH[call.function.name]
+
+        for statement in run:
+            if not isinstance(statement, Call):
+                code.extend(self.EMIT[type(statement)](statement))
+        return code
+
+    @staticmethod
+    def batches(calls: list[Call]) -> list[list[Call]]:
+        """
+        Consecutive pin functions are sent in one request, the board runs them in the same order
+        :return: The calls of every request
+        """
+        requests = []
+        for call in calls:
+            pin = isinstance(call.function, Builtin) and call.function.name in PIN_BATCH
+            if pin and requests and requests[-1][-1].function.name in PIN_BATCH \
+                    and isinstance(requests[-1][-1].function, Builtin):
+                requests[-1].append(call)
+            else:
+                requests.append([call])
+        return requests
+
+    @staticmethod
+    def request_bytes(calls: list[Call]) -> int:
+        """
+        :return: The bytes of the request frames of the calls, the board has to buffer them until it answers
+        """
+        size = 0
+        for calls in CppEmitter.batches(calls):
+            size += FRAME_BYTES
+            for call in calls:
+                if isinstance(call.function, Builtin):
+                    size += PIN_REQUEST[call.function.name]
+                else:
+                    # the id of the function and its arguments
+                    size += 1 + sum(arg.type.SIZE_BYTES for arg in call.function.args)
+        return size
+
+    @staticmethod
+    def uses_results(call: Call, run: list[Statement]) -> bool:
+        """
+        :return: If the arguments of the call use a result of the calls or a variable that is set in the run
+        """
+        names = [s.variable.name for s in run if isinstance(s, (Call, Declaration)) and s.variable is not None]
+        names.extend(s.target.name for s in run if isinstance(s, Assignment))
+        return any(re.search(rf"\b{name}\b", call.request) for name in names)
+
+    def emit(self) -> str:
+        """
+        The String(...) conversions of the pc version are in SerialCommunication/Runtime_PC.cpp
+        """
+        # TODO DEFINE A VARIABLE '__tempstr__' TO STORE THE STRING CONVERSIONS
+        code = []
+        connection_needed = self.transpiler.connection_needed
+
+        # the runtime is compiled once and linked by the runner, the program only includes the headers
+        code.append('#include "../server/transpiler/SerialCommunication/Runtime_PC.h"')
+        if connection_needed:
+            code.append('#include "../server/transpiler/SerialCommunication/Serial_PC.h"')
+        includes = [i for name, headers in PC_INCLUDES.items() if name in self.called_names for i in headers]
+        code.extend(f"#include {i}" for i in dict.fromkeys(includes))
+
+        code.extend(self.functions())
+
+        if connection_needed and self.data.remote_functions:
+            code.append("void do_functions(Arduino &arduino, char* data, char id, char request_id) {")
+            temp_var = self.transpiler.utils.next_sysvar()
+            code.append(f"char {temp_var}[{max([i.return_type.SIZE_BYTES for i in self.data.remote_functions])}];")
+            for f in self.data.remote_functions:
+                code.append(f"if (id == {f.remote_id}) {{")
+                code.append(f"remote_{f.name}(data,{temp_var});")
+                code.append(f"arduino.send_response({temp_var}, {f.return_type.SIZE_BYTES}, request_id);}}")
+            code.append("}")
+
+        code.append("int main() {")
+
+        if connection_needed:
+
+            code.append("Arduino arduino;")
+            if self.data.remote_functions:
+                code.append("arduino.do_function = do_functions;")
+
+        if "millis" in self.called_names:
+            code.append("auto start_time = std::chrono::steady_clock::now();")
+
+        code.extend(self.statements(self.data.code_done))
+
+        if connection_needed:
+            code.append("arduino.listenerThread->join();")
+        code.append("return 0;")
+        code.append("}")
+        return "\n".join(code)
+
+
+class ArduinoEmitter(Emitter):
+    """
+    The sketch for the board
+    """
+    units: dict[str, str] = {}  # the code of the runtime units, every file is read once
+
+    def emit(self) -> str:
+        code = []
+        connection_needed = self.transpiler.connection_needed
+
+        # the remote functions of the pc wait for their responses
+        remote_calls = any(f.decorator for f in self.called)
+        code.extend(ArduinoEmitter.runtime(self.called_names, self.transpiler.proxy_calls, connection_needed,
+                                           remote_calls, self.transpiler.serial_mode))
+
+        code.extend(self.functions())
+
+        lcd_needed = not LCD_FUNCTIONS.isdisjoint(self.called_names)
+        setup = self.statements(self.data.code_done)
+        if connection_needed:
+            code.append("void setup() {\n Serial.begin(256000); \nHandshake();\ndelay(10);")
+
+            if lcd_needed:
+                code.append("lcd.init();lcd.backlight();")
+
+            if self.transpiler.serial_mode == "statements":
+                # the serial connection is checked between the lines of the program
+                for i, line in enumerate(setup):
+                    code.append(line)
+                    if i + 1 < len(setup):
+                        if not setup[i + 1].startswith("else"):
+                            code.append("checkSerial();")
+            else:
+                if self.transpiler.serial_mode == "timer":
+                    code.append("startSerialTimer();")
+                code.extend(setup)
+            code.append("} \n void loop() { checkSerial(); }")
+
+        else:
+            code.append("void setup() {")
+            if lcd_needed:
+                code.append("lcd.init();lcd.backlight();")
+            code.extend(setup)
+            code.append("} \nvoid loop() { }")
+        return "\n".join(code)
+
+    def loop_body(self, statements: list[Statement]) -> list[str]:
+        if self.transpiler.connection_needed and self.transpiler.serial_mode == "loops":
+            return ["checkSerial();", *self.statements(statements)]
+        return self.statements(statements)
+
+    @staticmethod
+    def runtime(called: set[str], proxy_calls: set[str], connection_needed: bool, remote_calls: bool,
+                serial_mode: str = "statements") -> list[str]:
+        """
+        Links the units of the board runtime (SerialCommunication/Serial_Arduino) that the sketch uses
+        :param called: The names of the reachable functions of the sketch
+        :param proxy_calls: The builtins the pc calls on the board
+        :param remote_calls: If the sketch calls functions of the pc
+        :param serial_mode: When the requests of the pc are answered, see transpiler.SERIAL_MODES
+        """
+        features = []
+        if connection_needed:
+            if remote_calls:
+                features.append("PYDUINO_REMOTE_CALLS")
+            if serial_mode == "timer":
+                features.append("PYDUINO_SERIAL_TIMER")
+            features.extend(dict.fromkeys(PROXY_FEATURES[name] for name in PROXY_FEATURES if name in proxy_calls))
+
+        units = {"Runtime_Arduino"}
+        if "analogRead" in called or "PROXY_ANALOG_READ" in features or "PROXY_SUBSCRIPTION" in features:
+            units.add("Analog_Ports")
+        if connection_needed:
+            units.add("Serial_Arduino")
+            if serial_mode == "timer":
+                units.add("Serial_Timer_Arduino")
+            if "PROXY_SUBSCRIPTION" in features:
+                units.add("Subscription_Arduino")
+        if "print" in called:
+            units.add("Print_Arduino")
+        if "delay" in called:
+            # the timer answers the requests while the board waits
+            units.add("Delay_Serial_Arduino" if connection_needed and serial_mode != "timer" else "Delay_Arduino")
+        if not LCD_FUNCTIONS.isdisjoint(called):
+            units.add("Lcd_Arduino")
+        if "lcd_createCustomChar" in called:
+            units.add("Lcd_CustomChar_Arduino")
+
+        code = [f"#define {feature}" for feature in features]
+        for unit in BOARD_RUNTIME:
+            if unit in units:
+                code.append(ArduinoEmitter.read_unit(unit))
+        return code
+
+    @staticmethod
+    def read_unit(unit: str) -> str:
+        if unit not in ArduinoEmitter.units:
+            with open(f"server/transpiler/SerialCommunication/Serial_Arduino/{unit}.ino") as f:
+                ArduinoEmitter.units[unit] = f.read()
+        return ArduinoEmitter.units[unit]
@@ -0,0 +1,135 @@
+from server.transpiler.variable import *
+from server.transpiler.folding import ConstantFolding
+
+
+class Expression:
+    """
+    A node of the typed expression tree built by Value.do_value, type.name is the c code of the node
+    """
+
+    def __init__(self, type: PyduinoType, location: Range):
+        self.type = type
+        self.location = location
+        self.constant = ConstantFolding.literal(self.to_value())  # the value if it is known at compile time
+
+    def to_value(self) -> 'Constant | Variable':
+        return Constant(self.type.name, self.type, self.location)
+
+
+class Operand(Expression):
+    def __init__(self, value: 'Constant | Variable'):
+        self.value = value
+        super().__init__(value.type, value.location)
+
+    def to_value(self) -> 'Constant | Variable':
+        return self.value
+
+
+class UnaryOperation(Expression):
+    def __init__(self, operator: TokenType, operand: Expression, type: PyduinoType, location: Range):
+        super().__init__(type, location)
+        self.operator = operator
+        self.operand = operand
+
+
+class BinaryOperation(Expression):
+    def __init__(self, operator: TokenType, left: Expression, right: Expression, type: PyduinoType,
+                 location: Range):
+        super().__init__(type, location)
+        self.operator = operator
+        self.left = left
+        self.right = right
+
+
+# the binding strength of the binary operators, like in python
+BINARY_PRECEDENCE = {Bool_Operator.OR: 1, Bool_Operator.AND: 2,
+                     Compare_Operator.EQUAL: 4, Compare_Operator.NOT_EQUAL: 4, Compare_Operator.LESS: 4,
+                     Compare_Operator.GREATER: 4, Compare_Operator.GREATER_EQUAL: 4, Compare_Operator.LESS_EQUAL: 4,
+                     Math_Operator.PLUS: 5, Math_Operator.MINUS: 5,
+                     Math_Operator.MULTIPLY: 6, Math_Operator.DIVIDE: 6, Math_Operator.MODULO: 6}
+NOT_PRECEDENCE = 3  # between 'and' and the comparisons, the unary minus binds stronger than every binary operator
+
+OPERAND_END = set(BINARY_PRECEDENCE) | {Bool_Operator.NOT}
+
+
+class ExpressionParser:
+    """
+    Precedence climbing parser, every token of the expression is looked at once
+    """
+
+    def __init__(self, tokens: list[Token], transpiler: 'Transpiler'):
+        self.tokens = tokens
+        self.transpiler = transpiler
+        self.pos = 0
+
+    @staticmethod
+    def parse(tokens: list[Token], transpiler: 'Transpiler') -> Expression:
+        if not tokens:
+            raise InvalidLineError()
+        parser = ExpressionParser(tokens, transpiler)
+        expression = parser.parse_binary(1)
+        if parser.pos < len(tokens):
+            parser.error(f"Unexpected '{tokens[parser.pos].type.code}'", tokens[parser.pos].location)
+        return expression
+
+    def error(self, message: str, location: Range):
+        self.transpiler.data.newError(message, location)
+        self.transpiler.data.invalid_line_fallback.fallback(self.transpiler)
+
+    def parse_binary(self, min_precedence: int) -> Expression:
+        left = self.parse_unary()
+        while self.pos < len(self.tokens):
+            operator = self.tokens[self.pos]
+            precedence = BINARY_PRECEDENCE.get(operator.type, 0)
+            if precedence < min_precedence:
+                break
+            self.pos += 1
+            # the right side only takes stronger operators, so the operators are left associative
+            right = self.parse_binary(precedence + 1)
+
+            possible, t = left.type.operator(operator.type.code, right.type)
+            if not possible:
+                self.error(t, right.location)
+            t = ConstantFolding.binary(operator.type, left.constant, right.constant, t)
+            left = BinaryOperation(operator.type, left, right, t,
+                                   Range.fromPositions(left.location.start, right.location.end))
+        return left
+
+    def parse_unary(self) -> Expression:
+        if self.pos >= len(self.tokens):
+            operator = self.tokens[self.pos - 1]
+            self.error(f"Expected a value after '{operator.type.code}'", operator.location)
+
+        token = self.tokens[self.pos]
+        if token.type == Bool_Operator.NOT:
+            self.pos += 1
+            operand = self.parse_binary(NOT_PRECEDENCE + 1)
+            possible, t = operand.type.not_()
+        elif token.type == Math_Operator.MINUS:
+            self.pos += 1
+            operand = self.parse_unary()
+            possible, t = operand.type.neg()
+        else:
+            return self.parse_operand()
+
+        if not possible:
+            self.error(t, operand.location)
+        t = ConstantFolding.unary(token.type, operand.constant, t)
+        return UnaryOperation(token.type, operand, t, Range.fromPositions(token.location.start, operand.location.end))
+
+    def parse_operand(self) -> Expression:
+        start = self.pos
+        while self.pos < len(self.tokens) and self.tokens[self.pos].type not in OPERAND_END:
+            self.pos += 1
+
+        if start == self.pos:
+            token = self.tokens[self.pos]
+            if start == 0:
+                self.error(f"Expected a value before '{token.type.code}'", token.location)
+            operator = self.tokens[self.pos - 1]
+            self.error(f"Expected a value after '{operator.type.code}'", operator.location)
+
+        value = self.tokens[start:self.pos]
+        if len(value) == 1 and isinstance(value[0], Value):
+            return Operand(value[0])
+        return Operand(Value.do_value_single(value, self.transpiler))
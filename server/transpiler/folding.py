@@ -0,0 +1,137 @@
+import math
+
+from server.transpiler.variable import *
+from server.transpiler.ir import *
+
+# py_int is 32 bit on both targets, results outside of this range are left to the compiler
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+
+class ConstantFolding:
+    """
+    Computes the values that are known at compile time. The folded values are literals again (value.name),
+    so they are folded further by the expressions and statements that use them
+    """
+    BINARY = {Math_Operator.PLUS: lambda a, b: a + b,
+              Math_Operator.MINUS: lambda a, b: a - b,
+              Math_Operator.MULTIPLY: lambda a, b: a * b,
+              # the remainder has the sign of the dividend in c
+              Math_Operator.MODULO: lambda a, b: int(math.fmod(a, b)) if b != 0 else None,
+              Compare_Operator.EQUAL: lambda a, b: a == b,
+              Compare_Operator.NOT_EQUAL: lambda a, b: a != b,
+              Compare_Operator.GREATER: lambda a, b: a > b,
+              Compare_Operator.GREATER_EQUAL: lambda a, b: a >= b,
+              Compare_Operator.LESS: lambda a, b: a < b,
+              Compare_Operator.LESS_EQUAL: lambda a, b: a <= b,
+              Bool_Operator.AND: lambda a, b: a and b,
+              Bool_Operator.OR: lambda a, b: a or b}
+
+    @staticmethod
+    def literal(value: 'Value | None') -> 'int | bool | None':
+        """
+        :return: The value of an int or bool literal, None if the value is not known at compile time
+        """
+        if value is None or isinstance(value, Variable):
+            return None
+        name = value.name
+        if str(value.type) == "bool":
+            return {"true": True, "false": False}.get(name)
+        if str(value.type) == "int":
+            if name.startswith("(-") and name.endswith(")"):
+                name = name[1:-1]
+            if name.lstrip("-").isdigit():
+                return int(name)
+        return None
+
+    @staticmethod
+    def to_literal(value: 'int | bool', type: PyduinoType) -> 'PyduinoType | None':
+        """
+        :param type: The type of the result, the type of the folded literal is the same
+        :return: None if the value cannot be represented by the type
+        """
+        if value is None:
+            return None
+        if str(type) == "bool" and isinstance(value, bool):
+            return PyduinoBool("true" if value else "false")
+        if str(type) == "int" and not isinstance(value, bool) and INT_MIN <= value <= INT_MAX:
+            return PyduinoInt(str(value) if value >= 0 else f"({value})")
+        return None
+
+    @staticmethod
+    def binary(operator: TokenType, a: 'int | bool | None', b: 'int | bool | None', type: PyduinoType) -> PyduinoType:
+        """
+        :param a: The value of the left side, None if it is not known at compile time
+        :param type: The type of the operation (with the c code of the operation)
+        :return: The folded literal or the type of the operation if it is not known at compile time
+        """
+        if a is None or b is None or operator not in ConstantFolding.BINARY:
+            return type
+        folded = ConstantFolding.to_literal(ConstantFolding.BINARY[operator](a, b), type)
+        return folded if folded is not None else type
+
+    @staticmethod
+    def unary(operator: TokenType, a: 'int | bool | None', type: PyduinoType) -> PyduinoType:
+        if a is None:
+            return type
+        if operator == Bool_Operator.NOT:
+            folded = ConstantFolding.to_literal(not a, type)
+        else:
+            folded = ConstantFolding.to_literal(-a, type)
+        return folded if folded is not None else type
+
+    @staticmethod
+    def fold(statements: list[Statement]) -> list[Statement]:
+        """
+        Removes the branches and loops of the statements that are never executed
+        :return: The folded statements
+        """
+        folded = []
+        for statement in statements:
+            if isinstance(statement, If):
+                statement = ConstantFolding.fold_if(statement)
+            elif isinstance(statement, While):
+                if ConstantFolding.literal(statement.condition) is False:
+                    continue
+                statement.body = ConstantFolding.fold(statement.body)
+            elif isinstance(statement, ForRange):
+                statement = ConstantFolding.fold_range(statement)
+            elif isinstance(statement, (ForEach, FunctionDefinition)):
+                statement.body = ConstantFolding.fold(statement.body)
+
+            if statement is not None:
+                folded.append(statement)
+        return folded
+
+    @staticmethod
+    def fold_if(statement: If) -> 'If | None':
+        branches = []
+        orelse = statement.orelse
+        for condition, body in statement.branches:
+            value = ConstantFolding.literal(condition)
+            if value is False:
+                continue
+            if value is True:
+                # the following branches are never reached
+                orelse = body
+                break
+            branches.append((condition, body))
+
+        if not branches and orelse is None:
+            return None
+        statement.branches = [(condition, ConstantFolding.fold(body)) for condition, body in branches]
+        statement.orelse = ConstantFolding.fold(orelse) if orelse is not None else None
+        return statement
+
+    @staticmethod
+    def fold_range(statement: ForRange) -> 'ForRange | None':
+        start = ConstantFolding.literal(statement.start) if statement.start is not None else 0
+        stop = ConstantFolding.literal(statement.stop)
+        step = ConstantFolding.literal(statement.step) if statement.step is not None else 1
+        if step is not None:
+            # like in python, the direction of the loop is the sign of the step
+            statement.ascending = step > 0
+            if start is not None and stop is not None and (start >= stop if step > 0 else start <= stop):
+                return None
+        statement.body = ConstantFolding.fold(statement.body)
+        return statement
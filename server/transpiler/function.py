@@ -1,3 +1,5 @@
+from types import MappingProxyType
+
 from server.transpiler.variable import *
 from server.transpiler.control import Control
 
@@ -6,6 +8,20 @@ class Function:
     def standard_call(args: list[Variable], name: str, transpiler: 'Transpiler'):
         return f"{name}({', '.join([i.name for i in args])})"
 
+    @staticmethod
+    def remote_call(args: list[Variable], name: str, transpiler: 'Transpiler'):
+        """
+        The pc side of a board function sends the request through the connection of the program
+        """
+        return f"{name}({', '.join(['arduino'] + [i.name for i in args])})"
+
+    @staticmethod
+    def remote_request(args: list[Variable], name: str, transpiler: 'Transpiler'):
+        """
+        Only sends the request of a board function, the result is read with arduino.response(request_id, ...)
+        """
+        return f"request_{name}({', '.join(['arduino'] + [i.name for i in args])})"
+
     def __init__(self, name: str, return_type: PyduinoType, args: list[Variable], on_call=standard_call,
                  pythonic_overload=False, position: Position = None, decorator: Decorator = None):
         self.name = name
@@ -15,10 +31,22 @@ class Function:
         self.kwargs = None
         self.on_call = on_call
         self.code = []
-        self.called = False
         self.pythonic_overload = pythonic_overload  # if true, the function can be called with a variable number of arguments
         self.decorator = decorator
         self.remote_id = None
+        # calls that are answered by the other side: the call that only sends the request (like on_call, None if
+        # the call waits for the response) and the Arduino:: conversion of the response
+        self.on_request = None
+        self.response_conversion: str | None = None
+
+    def __getstate__(self):
+        """
+        The call code is already generated when a function is sent back from the process pool
+        """
+        state = self.__dict__.copy()
+        state["on_call"] = None
+        state["on_request"] = None
+        return state
 
     def resolve_decorator(self, transpiler: 'Transpiler'):
 
@@ -66,8 +94,7 @@ class Function:
             else:
                 code.append(f"{self.on_call(self.args, self.name, transpiler)};")
             code.append("}")
-            self.code.extend(code)
-            self.called = True
+            self.code.extend(Code(line) for line in code)
             transpiler.connection_needed = True
             transpiler.data.remote_functions.append(self)
 
@@ -77,8 +104,13 @@ class Function:
         elif (self.decorator == Decorator.MAIN and transpiler.mode == "board") or (
                 self.decorator == Decorator.BOARD and transpiler.mode == "main"):
             if transpiler.mode == "main":
-                code = [
-                    f"{self.return_type.c_typename()} {self.name}(Arduino arduino, {', '.join([f'{arg.type.c_typename()} {arg.name}' for arg in self.args])}) {{"]
+                # request_<name> only sends the request, so the emitter can send several before reading the responses
+                code = [f"char request_{self.name}"
+                        f"({', '.join(['Arduino &arduino'] + [f'{arg.type.c_typename()} {arg.name}' for arg in self.args])}) {{"]
+                self.on_call = Function.remote_call
+                self.on_request = Function.remote_request
+                if not self.return_type.is_type(PyduinoVoid()):
+                    self.response_conversion = self.return_type.ARDUINO_BYTE_CONVERSION
             else:
                 code = [
                     f"{self.return_type.c_typename()} {self.name}({', '.join([f'{arg.type.c_typename()} {arg.name}' for arg in self.args])}) {{"]
@@ -103,20 +135,20 @@ class Function:
             if transpiler.mode == "main":
                 code.append(f"char request_id = arduino.next_request_id();")
                 code.append(f"arduino.send_request('m', outgoing_buffer, {sum_size + 1},request_id);")
+                code.append(f"return request_id;}}")
 
-                if not self.return_type.is_type(PyduinoVoid()):
-                    code.append(f"{self.return_type.c_typename()} result;")
-                    code.append(
-                        f"delete new Promise<{self.return_type.c_typename()}>(&result, Arduino::{self.return_type.ARDUINO_BYTE_CONVERSION}, request_id, arduino.Responses);")
-                    code.append(f"return result;}}")
+                code.append(f"{self.return_type.c_typename()} {self.name}"
+                            f"({', '.join(['Arduino &arduino'] + [f'{arg.type.c_typename()} {arg.name}' for arg in self.args])}) {{")
+                request = self.on_request(self.args, self.name, transpiler)
+                if self.response_conversion is not None:
+                    code.append(f"return arduino.response({request}, Arduino::{self.response_conversion});}}")
                 else:
-                    code.append(f"delete new Promise<void>(nullptr, nullptr, request_id, arduino.Responses);}}")
+                    code.append(f"arduino.response({request});}}")
 
             else:
                 code.append(f"char request_id = getNextRequestId();")
                 code.append(f"sendRequest('m', outgoing_buffer, {sum_size + 1}, request_id);")
-                code.append(f"while ((Responses[request_id][0]) == 0) {{\ncheckSerial();\n}}")
-                code.append(f"Responses[request_id][0] = 0;")
+                code.append(f"waitResponse(request_id);")
 
                 if not self.return_type.is_type(PyduinoVoid()):
                     code.append(f"char temp_buffer2[{self.return_type.SIZE_BYTES}];")
@@ -126,7 +158,7 @@ class Function:
                 else:
                     code.append(f"}}")
             transpiler.connection_needed = True
-            self.code = code
+            self.code = [Code(line) for line in code]
 
     @staticmethod
     def check_definition(instruction: list[Token], transpiler: 'Transpiler'):
@@ -197,17 +229,15 @@ class Function:
         func = Function(name.value, return_type, arguments, decorator=decorator)
         transpiler.scope.add_Function(func, transpiler.location.position)
 
-        code_done_start_index = len(transpiler.data.code_done)
-
-        transpiler.data.code_done.append(
-            f"{return_type.c_typename()} {name.value}({', '.join([f'{arg.type.c_typename()} {arg.name}' for arg in arguments])}) {{")
+        statement = FunctionDefinition(func, [], Range.fromPositions(instruction[0].location.start,
+                                                                     instruction[-1].location.end))
+        transpiler.data.code_done.append(statement)
 
         prev = transpiler.data.in_function
         transpiler.data.in_function = func
-        Control.check_indent(transpiler,"Function")
+        Control.check_indent(transpiler,"Function", statement.body)
         transpiler.data.in_function = prev
-        transpiler.data.code_done.append("}")
-        func.code = transpiler.data.code_done[code_done_start_index:]
+        func.code = [statement]
         func.resolve_decorator(transpiler)
         return True
 
@@ -234,10 +264,11 @@ class Function:
                 Range.fromPositions(instruction[0].location.start, instruction[-1].location.end))
             return True
 
+        location = Range.fromPositions(instruction[0].location.start, instruction[-1].location.end)
         if type.is_type(PyduinoVoid()):
-            transpiler.data.code_done.append("return;")
+            transpiler.data.code_done.append(Return(None, location))
         else:
-            transpiler.data.code_done.append(f"return {var.name};")
+            transpiler.data.code_done.append(Return(var, location))
         return True
 
     @staticmethod
@@ -291,7 +322,8 @@ class Function:
                 arg_count += 1
                 args_c.append(arg)
 
-        if arg_count < len(func.args) and not func.pythonic_overload:
+        # the args of a pythonic overload are the ones it needs at least
+        if arg_count < len(func.args):
             if arg_count == 0:
                 transpiler.data.newError(f"Not enough arguments passed to function '{func.name}'",
                                          instruction[1].location)
@@ -300,15 +332,24 @@ class Function:
                                          Range.fromPositions(args[0].location.start, args[-1].location.end))
             return True
 
-        func.called = True
+        location = Range.fromPositions(instruction[0].location.start, instruction[-1].location.end)
+        if transpiler.mode == "board" and isinstance(func, Builtin) and func.main_only:
+            transpiler.data.newError(f"{func.name}() can only be used in the #main part", location)
+            raise InvalidLineError()  # the line is skipped, also if the call is part of a value
+
+        request = func.on_request(args_c, func.name, transpiler) if func.on_request is not None else None
         if func.return_type.is_type(PyduinoVoid()):
-            transpiler.data.code_done.append(func.on_call(args_c, func.name, transpiler) + ";")
+            call = func.on_call(args_c, func.name, transpiler)
+            transpiler.data.code_done.append(Call(func, Constant(call, PyduinoVoid(), location), location=location,
+                                                  request=request, arguments=args_c))
             return True
         else:
             var = transpiler.utils.next_sysvar()
-            transpiler.data.code_done.append(
-                f"{func.return_type.c_typename()} {var} = {func.on_call(args_c, func.name, transpiler)};")
-            return Variable(var, func.return_type, instruction[0].location)
+            call = func.on_call(args_c, func.name, transpiler)
+            variable = Variable(var, func.return_type, instruction[0].location)
+            transpiler.data.code_done.append(Call(func, Constant(call, func.return_type, location), variable,
+                                                  location, request, args_c))
+            return variable
 
 
     @staticmethod
@@ -334,24 +375,48 @@ class Function:
 
 
 class Builtin(Function):
+    registry: MappingProxyType = None  # name -> Builtin
+
     def __init__(self, name: str, return_type: PyduinoType, args: list[Variable], on_call,
-                 pythonic_overload: bool = False):
+                 pythonic_overload: bool = False, on_request=None, response_conversion: str = None,
+                 main_only: bool = False):
         super().__init__(name, return_type, args, pythonic_overload=pythonic_overload, position=Position(0, 0))
         self.on_call = on_call
+        self.main_only = main_only  # the pc uses the function, it is an error in the #board part
+        self.on_request = on_request
+        self.response_conversion = response_conversion
+
+    @staticmethod
+    def get_builtin(name: str) -> 'Builtin':
+        """
+        The builtins are created on the first lookup and shared by all transpilers, they must not be changed
+        """
+        if Builtin.registry is None:
+            Builtin.registry = MappingProxyType({f.name: f for f in Builtin.create_builtins()})
+        return Builtin.registry.get(name)
 
     @staticmethod
-    def add_builtins(transpiler: 'Transpiler'):
-        transpiler.scope.functions.extend([
+    def create_builtins() -> list['Builtin']:
+        return [
             Builtin("print", PyduinoVoid(), [], Builtin.print, pythonic_overload=True),
             Builtin("len", PyduinoInt(), [Variable("args", PyduinoArray(PyduinoAny()), Range(0, 0))], Builtin.len),
             Builtin("millis", PyduinoInt(), [], Builtin.millis),
             Builtin("delay", PyduinoVoid(), [Variable("args", PyduinoInt(), Range(0, 0))], Builtin.delay),
-            Builtin("analogRead", PyduinoInt(), [Variable("args", PyduinoInt(), Range(0, 0))], Builtin.analogRead),
+            Builtin("analogRead", PyduinoInt(), [Variable("args", PyduinoInt(), Range(0, 0))], Builtin.analogRead,
+                    on_request=Builtin.proxy_request, response_conversion="bytesToShort"),
+            Builtin("analogSubscribe", PyduinoVoid(), [Variable("args", PyduinoInt(), Range(0, 0))],
+                    Builtin.analogSubscribe, pythonic_overload=True, main_only=True),
+            Builtin("analogNext", PyduinoInt(), [Variable("args", PyduinoInt(), Range(0, 0))], Builtin.analogNext,
+                    main_only=True),
+            Builtin("analogUnsubscribe", PyduinoVoid(), [], Builtin.analogUnsubscribe, main_only=True),
             Builtin("analogWrite", PyduinoVoid(), [Variable("args", PyduinoInt(), Range(0, 0)),
-                                                   Variable("args", PyduinoInt(), Range(0, 0))], Builtin.analogWrite),
-            Builtin("digitalRead", PyduinoInt(), [Variable("args", PyduinoInt(), Range(0, 0))], Builtin.digitalRead),
+                                                   Variable("args", PyduinoInt(), Range(0, 0))], Builtin.analogWrite,
+                    on_request=Builtin.proxy_request),
+            Builtin("digitalRead", PyduinoInt(), [Variable("args", PyduinoInt(), Range(0, 0))], Builtin.digitalRead,
+                    on_request=Builtin.proxy_request, response_conversion="bytesToBool"),
             Builtin("digitalWrite", PyduinoVoid(), [Variable("args", PyduinoInt(), Range(0, 0)),
-                                                    Variable("args", PyduinoInt(), Range(0, 0))], Builtin.digitalWrite),
+                                                    Variable("args", PyduinoInt(), Range(0, 0))], Builtin.digitalWrite,
+                    on_request=Builtin.proxy_request),
             Builtin("random", PyduinoInt(), [], Builtin.random, pythonic_overload=True),
             Builtin("int", PyduinoInt(), [Variable("args", PyduinoAny(), Range(0, 0))], Builtin.int),
             Builtin("str", PyduinoString(), [Variable("args", PyduinoAny(), Range(0, 0))], Builtin.str),
@@ -362,15 +427,15 @@ class Builtin(Function):
             Builtin("lcd_createCustomChar", PyduinoVoid(), [Variable("args", PyduinoString(), Range(0, 0)), Variable("args",PyduinoInt(), Range(0,0))], Builtin.lcd_createCustomChar),
             Builtin("lcd_writeCustomChar", PyduinoVoid(), [Variable("args", PyduinoInt(), Range(0, 0))], Builtin.lcd_writeCustomChar),
 
-        ])
+        ]
 
     @staticmethod
     def print(args: list[Variable], name: str, transpiler: 'Transpiler'):
         var = transpiler.utils.next_sysvar()
         if transpiler.mode == "main":
-            transpiler.data.code_done.append(f"string {var} = \"\";")
+            transpiler.data.code_done.append(Code(f"string {var} = \"\";"))
         else:
-            transpiler.data.code_done.append(f"String {var} = \"\";")
+            transpiler.data.code_done.append(Code(f"String {var} = \"\";"))
 
         for arg in args:
 
@@ -378,12 +443,12 @@ class Builtin(Function):
             if not possible:
                 transpiler.data.newError(f"Cannot print {arg.type}, {s}", arg.location)
                 return False
-            transpiler.data.code_done.append(f'{var} += {s.name}; {var} += " ";')
+            transpiler.data.code_done.append(Code(f'{var} += {s.name}; {var} += " ";'))
 
         if transpiler.mode == "main":
-            transpiler.data.code_done.append(f"cout << {var} << endl;")
+            transpiler.data.code_done.append(Code(f"cout << {var} << endl;"))
         else:
-            transpiler.data.code_done.append(f"print({var},{len(args)});")
+            transpiler.data.code_done.append(Code(f"print({var},{len(args)});"))
             transpiler.connection_needed = True
 
         return ""
@@ -406,6 +471,15 @@ class Builtin(Function):
         else:
             return f"std::this_thread::sleep_for(std::chrono::milliseconds({args[0].name}))"
 
+    @staticmethod
+    def proxy_request(args: list[Variable], name: str, transpiler: 'Transpiler'):
+        """
+        The pc sends the request of a pin function without waiting for the response (Serial_PC.h)
+        """
+        if transpiler.mode == "board":
+            return None
+        return f"arduino.{name}Async({', '.join([i.name for i in args])})"
+
     @staticmethod
     def analogRead(args: list[Variable], name: str, transpiler: 'Transpiler'):
         if transpiler.mode == "board":
@@ -414,6 +488,34 @@ class Builtin(Function):
             transpiler.connection_needed = True
             return f"arduino.analogRead({args[0].name})"
 
+    @staticmethod
+    def analogSubscribe(args: list[Variable], name: str, transpiler: 'Transpiler'):
+        """
+        analogSubscribe(rate, pin, ...): the board samples the pins rate times per second and sends the samples to the
+        pc, analogNext(pin) reads them
+        """
+        if not 2 <= len(args) <= 7:
+            transpiler.data.newError("analogSubscribe() takes a rate and 1 to 6 pins",
+                                     Range.fromPositions(args[0].location.start, args[-1].location.end))
+            return False
+        for arg in args:
+            if not PyduinoInt().is_type(arg.type):
+                transpiler.data.newError(f"Cannot pass '{arg.type}' to function 'analogSubscribe' expecting 'int'",
+                                         arg.location)
+                return False
+        transpiler.connection_needed = True
+        return f"arduino.analogSubscribe({args[0].name}, {{{', '.join([i.name for i in args[1:]])}}})"
+
+    @staticmethod
+    def analogNext(args: list[Variable], name: str, transpiler: 'Transpiler'):
+        transpiler.connection_needed = True
+        return f"arduino.analogNext({args[0].name})"
+
+    @staticmethod
+    def analogUnsubscribe(args: list[Variable], name: str, transpiler: 'Transpiler'):
+        transpiler.connection_needed = True
+        return "arduino.analogUnsubscribe()"
+
     @staticmethod
     def analogWrite(args: list[Variable], name: str, transpiler: 'Transpiler'):
         if transpiler.mode == "board":
@@ -475,7 +577,6 @@ class Builtin(Function):
 
     @staticmethod
     def lcd_print(args: list[Variable], name: str, transpiler: 'Transpiler'):
-        transpiler.data.lcd_needed = True
         if transpiler.mode == "board":
             return f"lcd.print({args[0].name})"
         else:
@@ -484,7 +585,6 @@ class Builtin(Function):
 
     @staticmethod
     def lcd_setCursor(args: list[Variable], name: str, transpiler: 'Transpiler'):
-        transpiler.data.lcd_needed = True
         if transpiler.mode == "board":
             return f"lcd.setCursor({args[0].name}, {args[1].name})"
         else:
@@ -493,7 +593,6 @@ class Builtin(Function):
 
     @staticmethod
     def lcd_clear(args: list[Variable], name: str, transpiler: 'Transpiler'):
-        transpiler.data.lcd_needed = True
         if transpiler.mode == "board":
             return f"lcd.clear()"
         else:
@@ -502,7 +601,6 @@ class Builtin(Function):
 
     @staticmethod
     def lcd_createCustomChar(args: list[Variable], name: str, transpiler: 'Transpiler'):
-        transpiler.data.lcd_needed = True
         if transpiler.mode == "board":
             return f"createCustomChar({args[0].name}, {args[1].name})"
         else:
@@ -513,7 +611,6 @@ class Builtin(Function):
 
     @staticmethod
     def lcd_writeCustomChar(args: list[Variable], name: str, transpiler: 'Transpiler'):
-        transpiler.data.lcd_needed = True
         if transpiler.mode == "board":
             return f"lcd.write({args[0].name})"
         else:
@@ -0,0 +1,256 @@
+import re
+
+import lsprotocol.types as lsp
+
+from server.transpiler.transpiler import Transpiler
+from server.transpiler.tokenizer import *
+
+BLOCK_CONTINUATION = re.compile(r"(elif|else)\b")
+# the statements that are followed by an indented block (also without their colon): control statements,
+# function definitions and anything else that ends with a colon
+BLOCK_HEADER = re.compile(r"(if|elif|else|while|for)\b|\w+(\[\])*\s+\w+\s*\(|.*:\s*(#.*)?$")
+
+
+class Block:
+    """
+    A top-level statement of a section together with everything that belongs to it
+    (indented lines, elif/else branches, the function after a decorator)
+    """
+
+    def __init__(self, start: int, end: int, tokens: Indent):
+        """
+        :param start: The first line of the block (absolute)
+        :param end: The line after the last line of the block (absolute)
+        :param tokens: The tokenized lines of the block
+        """
+        self.start = start
+        self.end = end
+        self.tokens = tokens
+        self.errors: list[Error] = []
+        self.variables: list['Variable'] = []  # the top-level variables defined in this block
+        self.functions: list['Function'] = []  # the functions defined in this block
+        self.scope_key: int = 0  # identifies the scope the block was checked in
+        self.external_errors = False  # True if an error points to a location outside of the block
+        self.exports_key: int = 0  # identifies the variables and functions the block adds to the scope
+
+    def check(self, transpiler: Transpiler, variables: list['Variable'], scope_key: int):
+        """
+        Transpiles the block with the given top-level variables in scope
+        """
+        self.tokens.reset()
+        self.tokens.variables = {v.name: v for v in variables}
+        transpiler.data.current_decorator = None
+        transpiler.data.in_function = None
+        transpiler.data.in_loop = 0
+
+        errors_before = len(transpiler.data.errors)
+        functions_before = len(transpiler.scope.functions)
+
+        transpiler.current_indent = self.tokens
+        transpiler.transpileRange(self.tokens)
+
+        # errors and variables can point to locations of other blocks, they get their own copy,
+        # so shifting this block does not move anything outside of it
+        self.errors = [Error(e.message, IncrementalDiagnostics.copy_range(e.range))
+                       for e in transpiler.data.errors[errors_before:]]
+        self.external_errors = any(not self.start <= e.range.start.line < self.end for e in self.errors)
+        self.variables = list(self.tokens.variables.values())[len(variables):]
+        for v in self.variables:
+            v.location = IncrementalDiagnostics.copy_range(v.location)
+        self.functions = transpiler.scope.functions[functions_before:]
+        self.scope_key = scope_key
+        self.exports_key = hash((tuple((v.name, str(v.type)) for v in self.variables),
+                                 tuple(IncrementalDiagnostics.function_signature(f) for f in self.functions)))
+
+    def shift_lines(self, offset: int):
+        """
+        Moves the block (tokens, errors and scope contents) by offset lines
+        """
+        self.start += offset
+        self.end += offset
+        seen = set()
+        IncrementalDiagnostics.shift_locations([self.tokens], offset, seen)
+        IncrementalDiagnostics.shift_locations(self.variables, offset, seen)
+        for e in self.errors:
+            IncrementalDiagnostics.shift_range(e.range, offset, seen)
+        for f in self.functions:
+            IncrementalDiagnostics.shift_locations(f.args, offset, seen)
+
+
+class IncrementalDiagnostics:
+    """
+    Caches the tokens, scope contents and errors of every top-level block of a document,
+    so that after an edit only the blocks touched by the edit are tokenized and checked again.
+    Blocks after an edit are only checked again if the variables or functions they can see have changed.
+    """
+
+    def __init__(self):
+        self.code: list[str] = []
+        self.sections: dict[tuple[str, str], list[Block]] = {}
+
+    def update(self, code: list[str], changes: list = None) -> list[lsp.Diagnostic]:
+        """
+        :param code: The complete document after the changes
+        :param changes: The content changes of the DidChangeTextDocumentParams that lead from the last
+        version to this one, None if everything has to be checked again
+        :return: The diagnostics for the complete document
+        """
+        prefix, suffix = IncrementalDiagnostics.unchanged_lines(changes, len(self.code), len(code))
+        offset = len(code) - len(self.code)
+
+        # the blocks that are not touched by the changes, by (section, new start, new end)
+        reusable = {}
+        for key, blocks in self.sections.items():
+            for block in blocks:
+                if block.end <= prefix:
+                    reusable[key, block.start, block.end] = (block, 0)
+                elif block.start >= len(self.code) - suffix:
+                    reusable[key, block.start + offset, block.end + offset] = (block, offset)
+
+        definition_code, main_code, line_offset_main, board_code, line_offset_board, error = \
+            Transpiler.split_sections(code)
+
+        sections = {}
+        diagnostics = []
+
+        definition_functions = {}
+        definition_keys = {}
+        for mode in ["main", "board"]:
+            transpiler, blocks, scope_key = self.update_section(("definition", mode), definition_code, 0, mode, True,
+                                                                reusable, [], 0)
+            sections["definition", mode] = blocks
+            definition_functions[mode] = [f for b in blocks for f in b.functions]
+            definition_keys[mode] = scope_key
+            if mode == "main":
+                diagnostics.extend(e.get_Diagnostic(transpiler) for b in blocks for e in b.errors)
+                if error and definition_code:
+                    transpiler.data.newError("Missing #main or #board part in the code",
+                                             Range(0, 0, complete_line=True, data=transpiler.data))
+                    diagnostics.append(transpiler.data.errors[-1].get_Diagnostic(transpiler))
+
+        for mode, section_code, line_offset in [("main", main_code, line_offset_main),
+                                                ("board", board_code, line_offset_board)]:
+            transpiler, blocks, _ = self.update_section((mode, mode), section_code, line_offset, mode, False, reusable,
+                                                        definition_functions[mode], definition_keys[mode])
+            sections[mode, mode] = blocks
+            diagnostics.extend(e.get_Diagnostic(transpiler) for b in blocks for e in b.errors)
+
+        self.code = code
+        self.sections = sections
+        return diagnostics
+
+    def update_section(self, key: tuple[str, str], code: list[str], line_offset: int, mode: str, definition: bool,
+                       reusable: dict, functions: list['Function'], scope_key: int) \
+            -> tuple[Transpiler, list[Block], int]:
+        """
+        Checks all blocks of one section, blocks from the last version are reused if possible
+        :param functions: The functions from the definition part that can be used in this section
+        :param scope_key: identifies the functions from the definition part
+        :return: the transpiler, the blocks of the section, the scope key after the last block
+        """
+        transpiler = Transpiler(code, mode, definition, line_offset,
+                                tokens=Indent(Range.fromPosition(Position(line_offset, 0)), [], None, 0))
+        transpiler.scope.add_functions(functions)
+
+        variables = []
+        blocks = []
+        for start, end in IncrementalDiagnostics.get_blocks(code):
+            start, end = start + line_offset, end + line_offset
+            block, offset = reusable.get((key, start, end), (None, 0))
+
+            if block is None:
+                block = Block(start, end, Token.tokenize_range(code[start - line_offset:end - line_offset],
+                                                               Position(start, 0)))
+                block.check(transpiler, variables, scope_key)
+            else:
+                if offset:
+                    block.shift_lines(offset)
+                if block.scope_key == scope_key and not block.external_errors:
+                    transpiler.scope.register_functions(block.functions)
+                else:
+                    block.check(transpiler, variables, scope_key)
+
+            variables.extend(block.variables)
+            scope_key = hash((scope_key, block.exports_key))
+            blocks.append(block)
+
+        return transpiler, blocks, scope_key
+
+    @staticmethod
+    def get_blocks(code: list[str]) -> list[tuple[int, int]]:
+        """
+        Splits a section into top-level blocks
+        :return: (first line, line after the last line) for every block
+        """
+        starts = []
+        decorator = False
+        header = False  # the last line expects an indented block
+        for i, line in enumerate(code):
+            if line.strip() == "":
+                continue
+            if line[0] in " \t":
+                header = False
+                continue
+            # the line after a statement without its indented block is where the error is reported
+            if not decorator and not header and not BLOCK_CONTINUATION.match(line):
+                starts.append(i)
+            decorator = line.startswith("@")
+            header = BLOCK_HEADER.match(line) is not None
+
+        if not starts:
+            # only indented lines are one block
+            return [(0, len(code))] if any(line.strip() for line in code) else []
+        starts[0] = 0
+        return list(zip(starts, starts[1:] + [len(code)]))
+
+    @staticmethod
+    def unchanged_lines(changes: list, old_length: int, new_length: int) -> tuple[int, int]:
+        """
+        :return: The number of lines at the start and at the end of the document that were not changed
+        """
+        if changes is None:
+            return 0, 0
+
+        prefix = suffix = length = old_length
+        for change in changes:
+            if getattr(change, "range", None) is None:
+                return 0, 0
+            start, end = change.range.start.line, change.range.end.line
+            prefix = min(prefix, start)
+            suffix = min(suffix, length - end - 1)
+            length += change.text.count("\n") - (end - start)
+
+        prefix = max(prefix, 0)
+        suffix = max(min(suffix, old_length - prefix, new_length - prefix), 0)
+        return prefix, suffix
+
+    @staticmethod
+    def function_signature(function: 'Function') -> tuple:
+        return function.name, str(function.return_type), tuple(str(a.type) for a in function.args)
+
+    @staticmethod
+    def copy_range(range: Range) -> Range:
+        return Range(range.start.line, range.start.col, range.end.line, range.end.col)
+
+    @staticmethod
+    def shift_range(range: Range, offset: int, seen: set):
+        for position in (range.start, range.end):
+            if id(position) not in seen:
+                seen.add(id(position))
+                position.line += offset
+
+    @staticmethod
+    def shift_locations(items: list, offset: int, seen: set):
+        """
+        Moves the locations of tokens (including nested tokens) and values by offset lines
+        """
+        for item in items:
+            if isinstance(item, list):
+                IncrementalDiagnostics.shift_locations(item, offset, seen)
+                continue
+            location = getattr(item, "location", None)
+            if isinstance(location, Range):
+                IncrementalDiagnostics.shift_range(location, offset, seen)
+            inside = getattr(item, "inside", None)
+            if inside:
+                IncrementalDiagnostics.shift_locations(inside, offset, seen)
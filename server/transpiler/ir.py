@@ -0,0 +1,135 @@
+from typing import TYPE_CHECKING
+
+from server.transpiler.pyduino_utils import *
+
+if TYPE_CHECKING:
+    from server.transpiler.variable import Value, Variable
+    from server.transpiler.function import Function
+
+
+# The checks produce these statements (Data.code_done, Function.code), the emitters (emitter.py) turn them into the
+# code of the target. The values are typed, the c code of a value is in value.name
+
+
+class Statement:
+    def __init__(self, location: Range = None):
+        self.location = location
+
+
+class Code(Statement):
+    """
+    Code that is already written for one target (builtins and the serial communication)
+    """
+
+    def __init__(self, code: str, location: Range = None):
+        super().__init__(location)
+        self.code = code
+
+
+class Declaration(Statement):
+    def __init__(self, variable: 'Variable', value: 'Value', location: Range = None):
+        super().__init__(location)
+        self.variable = variable
+        self.value = value
+
+
+class Assignment(Statement):
+    def __init__(self, target: 'Variable', indices: list['Value'], value: 'Value', location: Range = None):
+        """
+        :param indices: The indices of the item that is assigned (target[i][j] = value)
+        """
+        super().__init__(location)
+        self.target = target
+        self.indices = indices
+        self.value = value
+
+
+class ExpressionStatement(Statement):
+    """
+    A value that is not used (function call, x++)
+    """
+
+    def __init__(self, value: 'Value', location: Range = None):
+        super().__init__(location)
+        self.value = value
+
+
+class Call(Statement):
+    def __init__(self, function: 'Function', value: 'Value', variable: 'Variable' = None, location: Range = None,
+                 request: str = None, arguments: list['Value'] = None):
+        """
+        :param value: The call, value.name is the c code of the call
+        :param variable: The variable that stores the result, None if the result is not used
+        :param request: The c code that only sends the request of a call the board answers (returns the request id),
+        None if the call cannot be split
+        :param arguments: The values that are passed to the function
+        """
+        super().__init__(location)
+        self.function = function
+        self.value = value
+        self.variable = variable
+        self.request = request
+        self.arguments = arguments if arguments is not None else []
+
+
+class Return(Statement):
+    def __init__(self, value: 'Value | None', location: Range = None):
+        super().__init__(location)
+        self.value = value
+
+
+class Break(Statement):
+    pass
+
+
+class Continue(Statement):
+    pass
+
+
+class If(Statement):
+    def __init__(self, branches: list[tuple['Value', list[Statement]]], orelse: list[Statement] = None,
+                 location: Range = None):
+        """
+        :param branches: The conditions with their bodies (if and elif)
+        :param orelse: The body of the else part, None if there is no else
+        """
+        super().__init__(location)
+        self.branches = branches
+        self.orelse = orelse
+
+
+class While(Statement):
+    def __init__(self, condition: 'Value', body: list[Statement], location: Range = None):
+        super().__init__(location)
+        self.condition = condition
+        self.body = body
+
+
+class ForRange(Statement):
+    def __init__(self, counter: str, start: 'Value | None', stop: 'Value', step: 'Value | None',
+                 body: list[Statement], location: Range = None):
+        """
+        for counter in range(start, stop, step), start and step are None if they are not given
+        """
+        super().__init__(location)
+        self.counter = counter
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.body = body
+        self.ascending: bool | None = None  # the direction of the loop, None if it is only known at runtime
+
+
+class ForEach(Statement):
+    def __init__(self, counter: str, iterable: 'Value', body: list[Statement], location: Range = None):
+        super().__init__(location)
+        self.counter = counter
+        self.iterable = iterable
+        self.body = body
+
+
+class FunctionDefinition(Statement):
+    def __init__(self, function: 'Function', body: list[Statement], location: Range = None):
+        super().__init__(location)
+        self.function = function
+        self.body = body
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+import re
 from typing import TYPE_CHECKING
 import lsprotocol.types as lsp
 
@@ -6,9 +7,12 @@ if TYPE_CHECKING:
     from server.transpiler.transpiler import Transpiler
     from server.transpiler.function import Function
     from server.transpiler.tokenizer import *
+    from server.transpiler.ir import Statement
 
 
 class Position:
+    __slots__ = ("line", "col")
+
     def __init__(self, line, col):
         self.line = line
         self.col = col
@@ -68,6 +72,8 @@ class Position:
 
 
 class Range:
+    __slots__ = ("start", "end")
+
     def __init__(self, start_line, start_col, end_line=None, end_col=None, complete_line=False,
                  data: 'Data' = None):
         """
@@ -81,7 +87,7 @@ class Range:
         if complete_line:
             if data is None:
                 raise ValueError("Data is required to complete line")
-            end_col = len(data.code[end_line if end_line is not None else start_line])
+            end_col = len(data.get_line(end_line if end_line is not None else start_line))
         self.start = Position(start_line, start_col)
         self.end = Position(end_line if end_line is not None else start_line,
                             end_col if end_col is not None else start_col)
@@ -118,8 +124,9 @@ class Error:
         return lsp.Diagnostic(
             range=lsp.Range(
                 start=lsp.Position(line=self.range.start.line + transpiler.data.line_offset,
-                                   character=self.range.start.col),
-                end=lsp.Position(line=self.range.end.line + transpiler.data.line_offset, character=self.range.end.col),
+                                   character=max(self.range.start.col, 0)),
+                end=lsp.Position(line=self.range.end.line + transpiler.data.line_offset,
+                                 character=max(self.range.end.col, 0)),
             ),
             message=self.message,
             severity=lsp.DiagnosticSeverity.Error,
@@ -409,6 +416,9 @@ class CurrentLocation:
         self.position.col = self.range.start.col
 
 
+BRACKETS_AND_QUOTES = re.compile(r'[()\[\]{}"]')
+
+
 class StringUtils:
     def __init__(self, location: CurrentLocation, data: 'Data', transpiler: 'Transpiler'):
         self.transpiler = transpiler
@@ -537,6 +547,45 @@ class StringUtils:
                           string=value)
         return False
 
+    @staticmethod
+    def get_bracket_pairs(string: str) -> dict[int, int]:
+        """
+        Matches the brackets and quotation marks of a line in one pass. The brackets are counted like in the
+        tokenizer: a bracket is closed by the first closing bracket after which all bracket types are back at the
+        levels before the opening bracket. Mismatched brackets that can't be skipped as a whole have no pair.
+        :return: The index of every closed opening bracket or quotation mark -> the index of the closing one
+        """
+        pairs = {}
+        levels = (0, 0, 0)
+        waiting = {}  # levels -> the opening brackets that are closed when the levels are reached again
+        pos = 0
+        while True:
+            match = BRACKETS_AND_QUOTES.search(string, pos)
+            if match is None:
+                return pairs
+            i = pos = match.start()
+            char = string[i]
+            pos += 1
+
+            if char == '"':
+                closing = string.find('"', pos)
+                if closing == -1:
+                    return pairs  # the rest of the line is a string
+                pairs[i] = closing
+                pos = closing + 1
+            elif char in "([{":
+                waiting.setdefault(levels, []).append(i)
+                index = "([{".index(char)
+                levels = levels[:index] + (levels[index] + 1,) + levels[index + 1:]
+                # reached again by an opening bracket, the text after it is outside of these brackets
+                # (only possible with mismatched brackets), so they don't get a pair
+                waiting.pop(levels, None)
+            else:
+                index = ")]}".index(char)
+                levels = levels[:index] + (levels[index] - 1,) + levels[index + 1:]
+                for opening in waiting.pop(levels, ()):
+                    pairs[opening] = i
+
     @staticmethod
     def is_identifier(value: str) -> bool:
         """
@@ -676,10 +725,11 @@ class Data:
         self.code: list[str] = code
         self.code_tokens: 'list[list[Token]]' = []
         self.line_offset: int = line_offset
+        self.first_line: int = 0  # the line number of the first line of code in the document
         self.indentations: list[int] = []
         self.errors: list[Error] = []
         self.enumerator: enumerate = None
-        self.code_done: list[str] = []
+        self.code_done: list['Statement'] = []
         self.invalid_line_fallback: type[InvalidLine_Fallback] = InvalidLine_Skip
         self.strict_mode: bool = strict_mode  # If true, the transpiler will stop on the first error
         self.in_function: Function = None
@@ -687,7 +737,6 @@ class Data:
         self.current_decorator: str = None
         self.remote_function_count: int = 0  # the number of functions that can be called from the other platform
         self.remote_functions: list[Function] = []  # the functions that can be called from the other platform
-        self.lcd_needed = False
 
         self.OPERATORS = [t.Math_Operator.PLUS, t.Math_Operator.MINUS, t.Math_Operator.MULTIPLY,
                           t.Math_Operator.DIVIDE, t.Math_Operator.MODULO, t.Compare_Operator.EQUAL,
@@ -702,6 +751,15 @@ class Data:
                                 [t.Bool_Operator.AND], [t.Bool_Operator.OR]]
         self.VALID_NAME_END_CHARACTERS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_"
 
+    def get_line(self, line: int) -> str:
+        """
+        :param line: The line number in the document (the tokens use these numbers)
+        :return: The line or an empty string if the line is not in this part of the code
+        """
+        if 0 <= line - self.first_line < len(self.code):
+            return self.code[line - self.first_line]
+        return ""
+
     def newError(self, message: str, range: Range | Position):
         if type(range) is Position:
             range = Range.fromPosition(range)
@@ -0,0 +1,47 @@
+from typing import TYPE_CHECKING, Iterator
+
+from server.transpiler.ir import *
+
+if TYPE_CHECKING:
+    from server.transpiler.transpiler import Transpiler
+    from server.transpiler.function import Function
+
+
+class Reachability:
+    """
+    Finds the functions that can be called from the program (main on the pc, setup on the board). Calls in code
+    that is never executed (removed by the constant folding) do not count, so this runs after ConstantFolding.fold
+    """
+
+    @staticmethod
+    def calls(statements: list[Statement]) -> Iterator['Function']:
+        """
+        :return: The functions that are called by the statements and the blocks inside of them
+        """
+        for statement in statements:
+            if isinstance(statement, Call):
+                yield statement.function
+            elif isinstance(statement, If):
+                for _, body in statement.branches:
+                    yield from Reachability.calls(body)
+                if statement.orelse is not None:
+                    yield from Reachability.calls(statement.orelse)
+            elif isinstance(statement, (While, ForRange, ForEach, FunctionDefinition)):
+                yield from Reachability.calls(statement.body)
+
+    @staticmethod
+    def functions(transpiler: 'Transpiler') -> list['Function']:
+        """
+        :return: The reachable functions (user functions and builtins), every function once
+        """
+        # the remote functions are called by the other side
+        roots = transpiler.data.remote_functions if transpiler.connection_needed else []
+        stack = [*roots, *Reachability.calls(transpiler.data.code_done)]
+        reached = {}
+        while stack:
+            function = stack.pop()
+            if id(function) in reached:
+                continue
+            reached[id(function)] = function
+            stack.extend(Reachability.calls(function.code))
+        return list(reached.values())
@@ -1,3 +1,7 @@
+import glob
+import hashlib
+import json
+import shutil
 import subprocess
 
 from server.transpiler.transpiler import Transpiler
@@ -6,7 +10,26 @@ import os
 import sys
 
 TEMP_FOLDER = "temp"
+TRANSPILER_FOLDER = os.path.dirname(os.path.abspath(__file__))
+# everything that can change the generated code for the same source
+TRANSPILER_FILES = ["*.py", "SerialCommunication/Serial_Arduino/*.ino"]
+# the runtime the generated pc code includes
+PC_RUNTIME_FILES = ["SerialCommunication/*.cpp", "SerialCommunication/*.h"]
+# compiled once into object files, the pc programs are linked with them
+PC_RUNTIME_SOURCES = ["SerialCommunication/Runtime_PC.cpp", "SerialCommunication/Serial_PC.cpp",
+                      "SerialCommunication/Serial.cpp"]
+BOARD_FQBN = "arduino:avr:uno"
+# the transpiled sources kept in temp/cache, the least recently used ones are removed
+CACHE_ENTRIES = 64
+# the builds of the pc and the board programs and of the pc runtime kept in temp/build
+BUILD_ENTRIES = 8
+RUNTIME_ENTRIES = 2
+
+
 class Runner:
+    transpiler_version: str = None
+    pc_runtime_version: str = None
+
     def __init__(self, code: str):
         self.code = code
         self.runner_id = 0
@@ -14,14 +37,19 @@ class Runner:
         self.pc: bool = False
         self.compiled = False
         self.port = None
+        self.pc_executable: str = None
+        self.board_build: str = None
 
 
     def run(self):
         if not self.compiled:
             self.compile()
+            if not self.compiled:
+                return
         #subprocess.call("cls", shell=True)
-        PC_COMMAND = f'cmd /c "set PATH=%PATH%;{os.getcwd()}/mingw/MinGW/bin&temp_{self.runner_id}.exe"'
-        BOARD_COMMAND = f"server\\transpiler\\arduino-cli.exe upload -p {self.get_port()} -b arduino:avr:uno {TEMP_FOLDER}/temp_board"
+        PC_COMMAND = f'cmd /c "set PATH=%PATH%;{os.getcwd()}/mingw/MinGW/bin&{self.pc_executable}"'
+        BOARD_COMMAND = f"server\\transpiler\\arduino-cli.exe upload -p {self.get_port()} -b {BOARD_FQBN} " \
+                        f"--input-dir {self.board_build} {TEMP_FOLDER}/temp_board"
 
         if self.board:
             subprocess.run(BOARD_COMMAND, shell=True)
@@ -29,46 +57,209 @@ class Runner:
             subprocess.run(PC_COMMAND, shell=True)
 
 
-    def compile(self):
-        code_pc, code_board = Transpiler.get_code(self.code.splitlines())
+    @staticmethod
+    def hash_files(patterns: list[str]) -> str:
+        """
+        :param patterns: glob patterns relative to the transpiler folder
+        """
+        version = hashlib.sha256()
+        for pattern in patterns:
+            for filename in sorted(glob.glob(os.path.join(TRANSPILER_FOLDER, pattern))):
+                with open(filename, "rb") as f:
+                    version.update(f.read())
+        return version.hexdigest()
+
+    @staticmethod
+    def get_transpiler_version() -> str:
+        """
+        :return: A hash of the transpiler sources and the runtime code that is copied into the generated code
+        """
+        if Runner.transpiler_version is None:
+            Runner.transpiler_version = Runner.hash_files(TRANSPILER_FILES)
+        return Runner.transpiler_version
+
+    @staticmethod
+    def get_pc_runtime_version() -> str:
+        if Runner.pc_runtime_version is None:
+            Runner.pc_runtime_version = Runner.hash_files(PC_RUNTIME_FILES)
+        return Runner.pc_runtime_version
+
+    @staticmethod
+    def build_key(*parts: str) -> str:
+        """
+        :param parts: The generated code, the compiler command and everything else the build depends on
+        """
+        return hashlib.sha256("\0".join(parts).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def write_if_changed(filename: str, content: str):
+        """
+        Keeps the file (and its timestamp) if it already has the content
+        """
+        if os.path.isfile(filename):
+            with open(filename, "r") as f:
+                if f.read() == content:
+                    return
+        with open(filename, "w") as f:
+            f.write(content)
+
+    @staticmethod
+    def write_atomic(filename: str, content: str):
+        """
+        Writes a temporary file and replaces the file with it, so an interrupted write never leaves a truncated file
+        """
+        temp_file = f"{filename}.{os.getpid()}.tmp"
+        with open(temp_file, "w") as f:
+            f.write(content)
+        os.replace(temp_file, filename)
+
+    @staticmethod
+    def remove_least_recent(pattern: str, keep: int):
+        """
+        Removes the files and folders matching the pattern except for the keep most recently used ones
+        """
+        entries = sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)
+        for entry in entries[keep:]:
+            Runner.remove(entry)
+
+    @staticmethod
+    def remove(path: str):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.isfile(path):
+            os.remove(path)
+
+    @staticmethod
+    def wait(processes: list[tuple[subprocess.Popen, str]]) -> bool:
+        """
+        Waits for the compilers, the outputs of the failed ones are removed so they are not reused
+        :param processes: The compiler processes with their output file or folder
+        :return: If all compilers succeeded
+        """
+        success = True
+        for process, output in processes:
+            if process.wait() != 0:
+                Runner.remove(output)
+                success = False
+        return success
+
+    def transpile(self) -> tuple[str, str]:
+        """
+        Transpiles the code and writes the generated files, the result is cached by the hash of the source code
+        and the transpiler version, so unchanged code is not transpiled again
+        :return: The pc code and the board code
+        """
+        cache_folder = f"{TEMP_FOLDER}/cache"
+        for folder in [TEMP_FOLDER, f"{TEMP_FOLDER}/temp_board", cache_folder]:
+            if not os.path.isdir(folder):
+                os.mkdir(folder)
+
+        key = hashlib.sha256((Runner.get_transpiler_version() + self.code).encode("utf-8")).hexdigest()
+        cache_file = f"{cache_folder}/{key}.json"
 
-        if not os.path.isdir(TEMP_FOLDER):
-            os.mkdir(TEMP_FOLDER)
+        cached = None
+        if os.path.isfile(cache_file):
+            try:
+                with open(cache_file, "r") as f:
+                    cached = json.load(f)
+                os.utime(cache_file)  # used now, it is removed last
+            except json.JSONDecodeError:
+                pass  # an interrupted write of an older version, the file is replaced
 
-        if not os.path.isdir(f"{TEMP_FOLDER}/temp_board"):
-            os.mkdir(f"{TEMP_FOLDER}/temp_board")
+        if cached is not None:
+            code_pc, code_board = cached
+        else:
+            code_pc, code_board = Transpiler.get_code(self.code.splitlines())
+            Runner.write_atomic(cache_file, json.dumps([code_pc, code_board]))
+            Runner.remove_least_recent(f"{cache_folder}/*.json", CACHE_ENTRIES)
 
         if code_pc:
-            with open(f"{TEMP_FOLDER}/temp_pc.cpp", "w") as f:
-                f.write(code_pc)
+            Runner.write_if_changed(f"{TEMP_FOLDER}/temp_pc.cpp", code_pc)
 
         if code_board:
-            with open(f"{TEMP_FOLDER}/temp_board/temp_board.ino", "w") as f:
-                f.write(code_board)
+            Runner.write_if_changed(f"{TEMP_FOLDER}/temp_board/temp_board.ino", code_board)
 
+        return code_pc, code_board
 
-        # TODO use multiprocessing, compile_oc and compile_board in parallel
-        PC_COMMAND =f'cmd /c "set PATH=%PATH%;{os.getcwd()}/mingw/MinGW/bin&g++ {TEMP_FOLDER}/temp_pc.cpp -o temp_{self.runner_id}.exe'
-        BOARD_COMMAND = f"server\\transpiler\\arduino-cli.exe compile -b arduino:avr:uno {TEMP_FOLDER}/temp_board"
+    def compile_pc_runtime(self, build_folder: str) -> list[str] | None:
+        """
+        Compiles the pc runtime into object files, once for every version of the runtime
+        :return: The object files the pc programs are linked with, None if the runtime could not be compiled
+        """
+        runtime_folder = os.path.join(build_folder, f"runtime_{Runner.get_pc_runtime_version()}")
+        if not os.path.isdir(runtime_folder):
+            os.mkdir(runtime_folder)
+        os.utime(runtime_folder)
+        Runner.remove_least_recent(os.path.join(build_folder, "runtime_*"), RUNTIME_ENTRIES)
 
-        if code_board and code_pc:
-            p1 = subprocess.Popen(PC_COMMAND, shell=True)
-            self.check_mingw()
-            p2 = subprocess.Popen(BOARD_COMMAND, shell=True)
-            p1.wait()
-            p2.wait()
-            self.pc = True
+        RUNTIME_COMMAND = 'cmd /c "set PATH=%PATH%;{mingw}/mingw/MinGW/bin&g++ -c {source} -o {output}"'
+
+        objects = []
+        processes = []
+        for source in PC_RUNTIME_SOURCES:
+            output = os.path.join(runtime_folder, os.path.basename(source).replace(".cpp", ".o"))
+            if not os.path.isfile(output):
+                processes.append((subprocess.Popen(RUNTIME_COMMAND.format(mingw=os.getcwd(), output=output,
+                                                                          source=f"server/transpiler/{source}"),
+                                                   shell=True), output))
+            objects.append(output)
+
+        if not Runner.wait(processes):
+            return None
+        return objects
+
+    def compile(self):
+        """
+        Compiles the pc and the board code in parallel, builds of identical code with the same command are
+        reused from temp/build (the least recently used ones are removed). If a compiler fails, the code is not
+        compiled and not run
+        """
+        code_pc, code_board = self.transpile()
+
+        build_folder = os.path.join(TEMP_FOLDER, "build")
+        if not os.path.isdir(build_folder):
+            os.mkdir(build_folder)
+
+        # {output} and {runtime} are left out of the build key, they depend on the key and the runtime version
+        PC_COMMAND = 'cmd /c "set PATH=%PATH%;{mingw}/mingw/MinGW/bin&g++ ' + TEMP_FOLDER + \
+                     '/temp_pc.cpp {runtime} -o {output}"'
+        BOARD_COMMAND = "server\\transpiler\\arduino-cli.exe compile -b " + BOARD_FQBN + \
+                        " --build-path {output} " + TEMP_FOLDER + "/temp_board"
+
+        processes = []
+        if code_board:
+            key = Runner.build_key(code_board, BOARD_COMMAND)
+            self.board_build = os.path.join(build_folder, f"board_{key}")
+            if not os.path.isfile(os.path.join(self.board_build, "temp_board.ino.hex")):
+                processes.append((subprocess.Popen(BOARD_COMMAND.format(output=self.board_build), shell=True),
+                                  self.board_build))
+            else:
+                os.utime(self.board_build)
             self.board = True
 
-        elif code_pc:
-            self.check_mingw()
-            subprocess.run(PC_COMMAND, shell=True)
+        if code_pc:
+            key = Runner.build_key(code_pc, PC_COMMAND, Runner.get_pc_runtime_version())
+            self.pc_executable = os.path.join(build_folder, f"pc_{key}.exe")
+            if not os.path.isfile(self.pc_executable):
+                self.check_mingw()
+                runtime = self.compile_pc_runtime(build_folder)
+                if runtime is None:
+                    Runner.wait(processes)
+                    print("Compiling the pc runtime failed")
+                    return
+                processes.append((subprocess.Popen(PC_COMMAND.format(mingw=os.getcwd(), runtime=" ".join(runtime),
+                                                                     output=self.pc_executable), shell=True),
+                                  self.pc_executable))
+            else:
+                os.utime(self.pc_executable)
             self.pc = True
 
-        elif code_board:
-            subprocess.run(BOARD_COMMAND, shell=True)
-            self.board = True
+        if not Runner.wait(processes):
+            print("Compilation failed")
+            return
 
+        Runner.remove_least_recent(os.path.join(build_folder, "board_*"), BUILD_ENTRIES)
+        Runner.remove_least_recent(os.path.join(build_folder, "pc_*.exe"), BUILD_ENTRIES)
         self.compiled = True
 
     def get_port(self):
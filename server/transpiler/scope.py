@@ -5,38 +5,50 @@ if TYPE_CHECKING:
     from server.transpiler.function import Function
 
 from server.transpiler.pyduino_utils import *
+from server.transpiler.function import Builtin
 
 
 class Scope:
     def __init__(self, transpiler: 'Transpiler'):
         self.transpiler = transpiler
-        self.functions = []
+        self.functions = []  # in the order of definition
+        self.function_table: dict[str, list['Function']] = {}  # name -> all functions with the name
 
 
     def get_Variable(self, name: str) -> 'Variable':
         indent = self.transpiler.current_indent
         while indent:
-            for i in indent.variables:
-                if i.name == name:
-                    return i
+            if name in indent.variables:
+                return indent.variables[name]
             indent = indent.parent
         return False
 
     def get_Function(self, name: str, position: Position) -> 'Function':
-        for i in self.functions:
-            if i.name == name:
-                if position.is_bigger(i.position):
-                    return i
+        builtin = Builtin.get_builtin(name)
+        if builtin:
+            return builtin
+        for i in self.function_table.get(name, ()):
+            if position.is_bigger(i.position):
+                return i
         return False
 
     def add_Variable(self, variable: 'Variable'):
-        self.transpiler.current_indent.variables.append(variable)
+        # the first variable with a name stays visible
+        self.transpiler.current_indent.variables.setdefault(variable.name, variable)
 
     def add_Function(self, function: 'Function', position: 'Position'):
         function.position = position
-        self.functions.append(function)
+        self.register_functions([function])
 
     def add_functions(self, functions: list['Function']):
         for f in functions:
             f.position = Position(0, 0)
+        self.register_functions(functions)
+
+    def register_functions(self, functions: list['Function']):
+        """
+        Adds the functions without changing their position
+        """
         self.functions.extend(functions)
+        for f in functions:
+            self.function_table.setdefault(f.name, []).append(f)
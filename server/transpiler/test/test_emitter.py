@@ -0,0 +1,306 @@
+import unittest
+
+from server.transpiler.transpiler import Transpiler
+from server.transpiler.emitter import CppEmitter
+from server.transpiler.folding import ConstantFolding
+from server.transpiler.ir import *
+
+CODE = """int x = 0
+if x < 2:
+    x = 1
+elif x < 3:
+    x++
+else:
+    x = 3
+for i in range(0, 10, 2):
+    while x > 0:
+        break
+""".splitlines()
+
+
+def transpile(code: list[str]) -> Transpiler:
+    transpiler = Transpiler(code, "main")
+    transpiler.analyze()
+    return transpiler
+
+
+class TestStatements(unittest.TestCase):
+    def test_tree(self):
+        transpiler = transpile(CODE)
+        self.assertEqual(transpiler.data.errors, [])
+        declaration, condition, loop = transpiler.data.code_done
+        self.assertIsInstance(declaration, Declaration)
+        self.assertEqual(declaration.variable.name, "x")
+
+        self.assertIsInstance(condition, If)
+        self.assertEqual(len(condition.branches), 2)
+        self.assertIsInstance(condition.branches[0][1][0], Assignment)
+        self.assertIsInstance(condition.branches[1][1][0], ExpressionStatement)
+        self.assertIsInstance(condition.orelse[0], Assignment)
+
+        self.assertIsInstance(loop, ForRange)
+        self.assertEqual(loop.step.name, "2")
+        self.assertIsInstance(loop.body[0], While)
+        self.assertIsInstance(loop.body[0].body[0], Break)
+
+    def test_emit(self):
+        transpiler = transpile(CODE)
+        self.assertEqual(CppEmitter(transpiler).statements(transpiler.data.code_done), [
+            "py_int x = 0;",
+            "if ((x < 2)) {", "x = 1;", "}",
+            "else if ((x < 3)) {", "x++;", "}",
+            "else {", "x = 3;", "}",
+            "for (int i = 0; (2 > 0) ? (i < 10) : (i > 10); i += 2) {", "while ((x > 0)) {", "break;", "}", "}"])
+
+    def test_function(self):
+        transpiler = Transpiler(["int add(int a, int b):", "    return a + b", "add(1, 2)"], "main")
+        transpiler.definition = True
+        transpiler.analyze()
+        function = transpiler.scope.get_Function("add", Position(2, 0))
+        self.assertIsInstance(function.code[0], FunctionDefinition)
+        self.assertIsInstance(function.code[0].body[0], Return)
+        self.assertEqual(CppEmitter(transpiler).statements(function.code),
+                         ["py_int add(py_int a, py_int b) {", "return (a + b);", "}"])
+
+
+class TestFolding(unittest.TestCase):
+    def emit(self, code: list[str]) -> list[str]:
+        transpiler = transpile(code)
+        self.assertEqual(transpiler.data.errors, [])
+        return CppEmitter(transpiler).statements(ConstantFolding.fold(transpiler.data.code_done))
+
+    def test_if(self):
+        self.assertEqual(self.emit(["int x = 0", "if 1 > 2:", "    x = 1", "elif x < 2:", "    x = 2", "elif True:",
+                                    "    x = 3", "else:", "    x = 4"]),
+                         ["py_int x = 0;", "if ((x < 2)) {", "x = 2;", "}", "else {", "x = 3;", "}"])
+        self.assertEqual(self.emit(["int x = 0", "if 2 > 1:", "    x = 1", "else:", "    x = 2"]),
+                         ["py_int x = 0;", "{", "x = 1;", "}"])
+        self.assertEqual(self.emit(["int x = 0", "if False:", "    x = 1"]), ["py_int x = 0;"])
+
+    def test_while(self):
+        self.assertEqual(self.emit(["int x = 0", "while 1 == 2:", "    x = 1"]), ["py_int x = 0;"])
+
+    def test_range(self):
+        self.assertEqual(self.emit(["int x = 0", "for i in range(10, 0, -2):", "    x = i"]),
+                         ["py_int x = 0;", "for (int i = 10; i > 0; i += (-2)) {", "x = i;", "}"])
+        self.assertEqual(self.emit(["int x = 0", "for i in range(5 - 5):", "    x = i"]), ["py_int x = 0;"])
+        self.assertEqual(self.emit(["int x = 0", "for i in range(0, 10, -1):", "    x = i"]), ["py_int x = 0;"])
+        # the bounds are only known at runtime, the direction is known from the step
+        self.assertEqual(self.emit(["int x = 0", "for i in range(x, 10, 2):", "    x = i"]),
+                         ["py_int x = 0;", "for (int i = x; i < 10; i += 2) {", "x = i;", "}"])
+        self.assertEqual(self.emit(["int x = 0", "for i in range(0, 10, x):", "    x = i"]),
+                         ["py_int x = 0;", "for (int i = 0; (x > 0) ? (i < 10) : (i > 10); i += x) {", "x = i;", "}"])
+
+    def test_zero_step(self):
+        transpiler = transpile(["for i in range(0, 10, 1 - 1):", "    print(i)"])
+        self.assertEqual([e.message for e in transpiler.data.errors], ["Range step must not be zero"])
+
+
+class TestFlashSize(unittest.TestCase):
+    BODY = [f"    delay({i})" for i in range(20)]
+
+    def board(self, loop: str) -> str:
+        return Transpiler.get_code(["#board", "int x = analogRead(0)", loop] + self.BODY)[1]
+
+    def test_stepped_range(self):
+        # there is no avr toolchain in the tests, the size of the sketch is a stand in for the flash usage
+        plain = self.board("for i in range(x):")
+        for loop in ["for i in range(x, 0, -1):", "for i in range(0, x, x):", "for i in range(10, 0, -2):"]:
+            code = self.board(loop)
+            self.assertEqual(code.count("delay(19)"), 1)
+            self.assertLess(len(code) - len(plain), 60)
+
+
+class TestReachability(unittest.TestCase):
+    DEFINITIONS = ["void a():", "    delay(1)", "void b():", "    a()", "void c():", "    delay(2)", ""]
+
+    def test_functions(self):
+        main, _ = Transpiler.get_code(self.DEFINITIONS + ["#main", "b()", "if 1 > 2:", "    c()"])
+        self.assertIn("void a() {", main)
+        self.assertIn("void b() {", main)
+        self.assertNotIn("void c() {", main)
+
+    def test_includes(self):
+        main, _ = Transpiler.get_code(["#main", "int x = 1", "if False:", "    print(millis())"])
+        self.assertNotIn("#include <", main)
+        self.assertNotIn("start_time", main)
+        main, _ = Transpiler.get_code(["#main", "print(millis())"])
+        self.assertIn("#include <iostream>\n#include <chrono>", main)
+        self.assertIn("start_time", main)
+
+    def test_lcd(self):
+        _, board = Transpiler.get_code(["#board", "lcd_print(\"a\")"])
+        self.assertIn("LiquidCrystal_I2C lcd", board)
+        self.assertNotIn("createCustomChar", board)
+        _, board = Transpiler.get_code(["#board", "while False:", "    lcd_clear()"])
+        self.assertNotIn("lcd", board)
+
+
+class TestBoardRuntime(unittest.TestCase):
+    def test_no_connection(self):
+        _, board = Transpiler.get_code(["#board", "int x = 1"])
+        self.assertNotIn("Handshake", board)
+        self.assertNotIn("analogPorts", board)
+        self.assertNotIn("better_delay", board)
+        _, board = Transpiler.get_code(["#board", "delay(analogRead(1))"])
+        self.assertIn("analogPorts", board)
+        self.assertIn("void better_delay(int time){\n  delay(time);", board)
+
+    def test_proxy(self):
+        main, board = Transpiler.get_code(["#main", "int x = analogRead(0)", "#board", "print(1)"])
+        self.assertIn("#define PROXY_ANALOG_READ", board)
+        self.assertNotIn("#define PROXY_PIN_WRITE", board)
+        self.assertNotIn("#define PYDUINO_REMOTE_CALLS", board)
+        self.assertIn("void print(", board)
+        self.assertIn("analogPorts", board)
+        self.assertNotIn("better_delay", board)
+
+        _, board = Transpiler.get_code(["#main", "digitalWrite(1, 1)"])
+        self.assertIn("#define PROXY_PIN_WRITE", board)
+        self.assertIn("void checkSerial()", board)
+        self.assertNotIn("void print(", board)
+
+    def test_remote_calls(self):
+        _, board = Transpiler.get_code(["@main", "int f():", "    return 1", "", "#main", "int x = 1", "#board",
+                                        "int y = f()"])
+        self.assertIn("#define PYDUINO_REMOTE_CALLS", board)
+
+    def test_board_functions(self):
+        main, _ = Transpiler.get_code(["@board", "int f(int a):", "    return a", "@board", "void g():", "    delay(1)",
+                                       "", "#main", "int x = f(1)", "g()", "#board", "int y = 1"])
+        self.assertIn("void g(Arduino &arduino) {", main)
+        self.assertIn("return arduino.response(request_f(arduino, a), Arduino::bytesToInt);}", main)
+        self.assertIn("f(arduino, 1);", main)
+        self.assertIn("g(arduino);", main)
+        # Arduino has a mutex, it can neither be copied nor moved (c++14 has no guaranteed copy elision)
+        self.assertIn("Arduino arduino;", main)
+
+
+class TestPipelining(unittest.TestCase):
+    FUNCTION = ["@board", "int f(int a):", "    return a", ""]
+
+    def main(self, code: list[str], definitions: list[str] = ()) -> list[str]:
+        main, _ = Transpiler.get_code([*definitions, "#main", *code, "#board", "int z = 1"])
+        return main[main.index("int main() {"):].splitlines()
+
+    def test_requests(self):
+        main = self.main(["int x = f(1) + analogRead(0)", "int y = f(2)", "analogWrite(2, x)"], self.FUNCTION)
+        requests = [i for i, line in enumerate(main) if "Async(" in line or "request_f(" in line]
+        responses = [i for i, line in enumerate(main) if "arduino.response(" in line]
+        # the requests are sent before the first response is read, the write uses x and waits for it
+        self.assertEqual(len(requests), 3)
+        self.assertLess(requests[2], responses[0])
+        self.assertIn("Arduino::bytesToShort", main[responses[1]])
+        self.assertLess(main.index("py_int x = (_sysvar_1 + _sysvar_2);"), main.index("arduino.analogWrite(2, x);"))
+
+    def test_batches(self):
+        main = self.main(["int x = analogRead(0) + digitalRead(1)", "digitalWrite(2, 1)", "int y = analogRead(3)"])
+        self.assertEqual(sum("PinBatch " in line for line in main), 1)
+        self.assertEqual(sum("arduino.batchAsync(" in line for line in main), 1)
+        self.assertFalse(any("ReadAsync(" in line or "WriteAsync(" in line for line in main))
+        self.assertIn("_sysvar_4.digitalWrite(2, 1);", main)
+        self.assertIn("py_int _sysvar_2 = Arduino::bytesToBool(_sysvar_4.results + 2);", main)
+        self.assertIn("py_int _sysvar_3 = Arduino::bytesToShort(_sysvar_4.results + 3);", main)
+        # the board function can use the pins, the batches before and after it are sent on their own
+        main = self.main(["int x = analogRead(0) + analogRead(1) + f(2) + analogRead(3)"], self.FUNCTION)
+        self.assertEqual(sum("PinBatch " in line for line in main), 1)
+        self.assertEqual(sum("analogReadAsync(" in line for line in main), 1)
+
+    def test_dependencies(self):
+        main = self.main(["int x = analogRead(analogRead(0))"])
+        self.assertFalse(any("PinBatch " in line for line in main))
+        main = self.main(["int x = 0", "x = analogRead(0)", "analogWrite(1, x)"])
+        self.assertFalse(any("PinBatch " in line for line in main))
+        main = self.main([f"int x{i} = analogRead({i})" for i in range(10)])
+        # the calls after PIPELINE_DEPTH wait for the responses of the first ones
+        self.assertEqual(sum("PinBatch " in line for line in main), 2)
+        self.assertLess(main.index("py_int x7 = _sysvar_8;"), main.index("_sysvar_13.analogRead(8);"))
+
+    def test_request_bytes(self):
+        # a request of add has 14 bytes, four of them fit into the 63 bytes the board buffers
+        main = self.main([f"int x{i} = add({i}, {i})" for i in range(6)],
+                         ["@board", "int add(int a, int b):", "    return a + b", ""])
+        requests = [i for i, line in enumerate(main) if "request_add(" in line]
+        responses = [i for i, line in enumerate(main) if "arduino.response(" in line]
+        self.assertEqual(len(requests), 6)
+        self.assertLess(requests[3], responses[0])
+        self.assertLess(responses[3], requests[4])
+
+class TestSubscription(unittest.TestCase):
+    def test_subscribe(self):
+        main, board = Transpiler.get_code(["#main", "analogSubscribe(1000, 0, 1)", "int x = analogNext(1)",
+                                           "analogUnsubscribe()"])
+        self.assertIn("arduino.analogSubscribe(1000, {0, 1});", main)
+        self.assertIn("arduino.analogNext(1)", main)
+        self.assertIn("#define PROXY_SUBSCRIPTION", board)
+        self.assertIn("void pollSubscription() {", board)
+        self.assertIn("now - frameStart >= SubscriptionFrameDelay", board)  # slow subscriptions send every sample
+        self.assertIn("analogPorts", board)
+        _, board = Transpiler.get_code(["#main", "int x = analogRead(0)"])
+        self.assertNotIn("void pollSubscription() {", board)
+
+    def test_errors(self):
+        # the diagnostics point at the call or its arguments
+        for line, error, start, end in [
+            ("analogSubscribe(10)", "analogSubscribe() takes a rate and 1 to 6 pins", 16, 18),
+            ('analogSubscribe(10, "a")', "Cannot pass 'str' to function 'analogSubscribe' expecting 'int'", 20, 23),
+            ("analogSubscribe()", "Not enough arguments passed to function 'analogSubscribe'", 15, 17)]:
+            diagnostics = Transpiler.get_diagnostics(["#main", line])
+            self.assertEqual([(d.message, d.range.start.line, d.range.start.character, d.range.end.character)
+                              for d in diagnostics], [(error, 1, start, end)], line)
+        for line in ["analogSubscribe(10, 0)", "int x = analogNext(0)", "analogUnsubscribe()"]:
+            diagnostics = Transpiler.get_diagnostics(["#board", "int y = 0", line])
+            name = line[line.index("analog"):line.index("(")]
+            self.assertEqual([(d.message, d.range.start.line, d.range.start.character, d.range.end.character)
+                              for d in diagnostics],
+                             [(f"{name}() can only be used in the #main part", 2, line.index("analog"), len(line))])
+
+
+class TestSerialMode(unittest.TestCase):
+    CODE = ["#board", "int x = 0", "while x < 10:", "    x = x + 1", "    delay(1)", "print(x)"]
+
+    def setup(self, board: str) -> list[str]:
+        return board[board.index("void setup() {"):].splitlines()
+
+    def test_statements(self):
+        _, board = Transpiler.get_code(self.CODE)
+        self.assertEqual(self.setup(board).count("checkSerial();"), 8)
+
+    def test_loops(self):
+        _, board = Transpiler.get_code(self.CODE[:1] + ["#serial loops"] + self.CODE[1:])
+        setup = self.setup(board)
+        self.assertEqual(setup[setup.index("while ((x < 10)) {") + 1], "checkSerial();")
+        self.assertEqual(setup.count("checkSerial();"), 1)
+        self.assertIn("checkSerial();\n  }\n}", board)  # better_delay still answers while waiting
+
+    def test_timer(self):
+        _, board = Transpiler.get_code(self.CODE[:1] + ["#serial timer"] + self.CODE[1:])
+        setup = self.setup(board)
+        self.assertNotIn("checkSerial();", setup)
+        self.assertIn("startSerialTimer();", setup)
+        self.assertIn("#define PYDUINO_SERIAL_TIMER", board)
+        self.assertIn("ISR(TIMER0_COMPA_vect, ISR_NOBLOCK)", board)
+        self.assertIn("void better_delay(int time){\n  delay(time);", board)
+
+    def test_timer_guards_pins(self):
+        _, board = Transpiler.get_code(["#board", "#serial timer", "analogWrite(3, analogRead(0))", "print(1)"])
+        guard = board.index("#define analogRead(pin) timerAnalogRead(pin)")
+        # the interrupt uses the pins directly, the program only while the interrupt does not answer
+        self.assertLess(board.index("void checkSerial() {"), guard)
+        self.assertLess(guard, board.index("analogRead(analogPorts[0]);"))
+        self.assertIn("#define analogWrite(pin, value) timerAnalogWrite(pin, value)", board)
+
+    def test_errors(self):
+        transpiler = Transpiler(["#serial fast", "#serial loops"], "board")
+        transpiler.analyze()
+        self.assertEqual([e.message for e in transpiler.data.errors],
+                         ["Expected one serial mode: statements, loops, timer"])
+        self.assertEqual(transpiler.serial_mode, "loops")
+        transpiler = Transpiler(["#serial loops"], "main")
+        transpiler.analyze()
+        self.assertEqual([e.message for e in transpiler.data.errors],
+                         ["The serial mode can only be set in the #board part"])
+
+
+if __name__ == '__main__':
+    unittest.main()
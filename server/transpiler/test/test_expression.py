@@ -0,0 +1,81 @@
+import unittest
+from server.transpiler.transpiler import Transpiler
+from server.transpiler.expression import *
+from server.transpiler.emitter import CppEmitter
+
+
+def transpile(expression: str) -> Transpiler:
+    transpiler = Transpiler(["int x = 5", f"bool y = True", f"print({expression})"], "main")
+    transpiler.analyze()
+    return transpiler
+
+
+def value(expression: str) -> str:
+    transpiler = transpile(expression)
+    code = [line for line in CppEmitter(transpiler).statements(transpiler.data.code_done) if "+=" in line]
+    return code[0].split("+= ")[1].split(";")[0]
+
+
+class TestExpression(unittest.TestCase):
+    def test_precedence(self):
+        self.assertEqual(value("1 + x * 3"), "String((1 + (x * 3)))")
+        self.assertEqual(value("x - 1 - 1"), "String(((x - 1) - 1))")
+        self.assertEqual(value("(x + 2) * 3"), "String(((x + 2) * 3))")
+        self.assertEqual(value("x < 2 and 3 > x or y"), "String((((x < 2) && (3 > x)) || y))")
+
+    def test_not(self):
+        self.assertEqual(value("not y"), "String(!y)")
+        self.assertEqual(value("not x < 2"), "String(!(x < 2))")
+        self.assertEqual(value("y and not y or True"), "String(((y && !y) || true))")
+
+    def test_unary_minus(self):
+        self.assertEqual(value("-x + 2"), "String(((-x) + 2))")
+        self.assertEqual(value("x * -x"), "String((x * (-x)))")
+        self.assertEqual(value("-(x + 1)"), "String((-(x + 1)))")
+
+    def test_errors(self):
+        self.assertEqual([e.message for e in transpile("1 +").data.errors], ["Expected a value after '+'"])
+        self.assertEqual([e.message for e in transpile("and y").data.errors], ["Expected a value before 'and'"])
+        self.assertEqual([e.message for e in transpile("-y").data.errors], ["Cannot use '-' on y"])
+        self.assertEqual([str(e) for e in transpile("y + 1").data.errors], ["Cannot add y and 1 at line 2:10 - 2:11"])
+
+    def test_tree(self):
+        transpiler = transpile("1")
+        expression = ExpressionParser.parse(Token.tokenize("x * 2 + 1", Position(2, 0)), transpiler)
+        self.assertIsInstance(expression, BinaryOperation)
+        self.assertIs(expression.operator, Math_Operator.PLUS)
+        self.assertIs(expression.left.operator, Math_Operator.MULTIPLY)
+        self.assertEqual(expression.left.left.value.name, "x")
+        self.assertEqual(str(expression.location), "2:0 - 2:9")
+
+    def test_long_expression(self):
+        expression = " + ".join(["x * 2"] * 3000)
+        self.assertEqual(value(expression).count("+"), 2999)
+
+
+class TestFolding(unittest.TestCase):
+    def test_int(self):
+        self.assertEqual(value("(42 + 2) * 3"), "String(132)")
+        self.assertEqual(value("1 - 4"), "String((-3))")
+        self.assertEqual(value("-7 % 3"), "String((-1))")
+        self.assertEqual(value("x * (2 + 3)"), "String((x * 5))")
+        self.assertEqual(value("-(-3)"), "String(3)")
+
+    def test_bool(self):
+        self.assertEqual(value("1 < 2 and not False"), "String(true)")
+        self.assertEqual(value("2 * 3 == 7 or y"), "String((false || y))")
+
+    def test_not_folded(self):
+        # the division is a float, the other results do not fit into py_int or are undefined
+        self.assertEqual(value("1 / 2"), "String(((float)1 / (float)2))")
+        self.assertEqual(value("2147483647 + 1"), "String((2147483647 + 1))")
+        self.assertEqual(value("1 % 0"), "String((1 % 0))")
+
+    def test_array(self):
+        transpiler = Transpiler(["int[] a = [1 + 1, 2 * 3, -4]"], "main")
+        transpiler.analyze()
+        self.assertEqual(CppEmitter(transpiler).statements(transpiler.data.code_done), ["py_int a[] = {2,6,(-4)};"])
+
+
+if __name__ == '__main__':
+    unittest.main()
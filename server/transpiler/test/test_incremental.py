@@ -0,0 +1,143 @@
+import random
+import unittest
+from lsprotocol import types as lsp
+from server.transpiler.incremental import IncrementalDiagnostics
+from server.transpiler.transpiler import Transpiler
+
+CODE = """int add(int a, int b):
+    return a + b
+
+#main
+int x = add(1, 2)
+if x > 2:
+    print(x)
+else:
+    print(0)
+
+int y = x * 2
+print(y)
+
+#board
+int z = add(3, 4)
+while z > 0:
+    z = z - 1
+""".splitlines()
+
+
+def replace_lines(code: list[str], start: int, end: int, text: str):
+    """
+    Replaces the lines start to end (exclusive) with text
+    :return: the new code and the matching content change
+    """
+    change = lsp.TextDocumentContentChangeEvent_Type1(
+        range=lsp.Range(start=lsp.Position(line=start, character=0), end=lsp.Position(line=end, character=0)),
+        text=text)
+    return code[:start] + text.splitlines() + code[end:], change
+
+
+def random_edit(code: list[str], rng: random.Random) -> list[str]:
+    """
+    Breaks the code in a random place: removes or inserts a character, removes, inserts or (un)indents a line
+    """
+    code = list(code)
+    i = rng.randrange(len(code))
+    line = code[i]
+    operation = rng.randrange(5)
+    if operation == 0 and line:
+        j = rng.randrange(len(line))
+        code[i] = line[:j] + line[j + 1:]
+    elif operation == 1:
+        j = rng.randint(0, len(line))
+        code[i] = line[:j] + rng.choice(["    ", ":", "(", ")", "x", " ", '"', "["]) + line[j:]
+    elif operation == 2:
+        del code[i]
+    elif operation == 3:
+        code.insert(i, rng.choice(["", "else:", "if x > 1:", "print(x)", "int q = 2", "    print(1)"]))
+    else:
+        code[i] = line[4:] if line.startswith("    ") else "    " + line
+    return code
+
+
+def diagnostic_key(diagnostics: list[lsp.Diagnostic]):
+    return sorted((d.range.start.line, d.range.start.character, d.range.end.line, d.range.end.character, d.message)
+                  for d in diagnostics)
+
+
+class TestIncremental(unittest.TestCase):
+    def assertSameAsFresh(self, incremental: IncrementalDiagnostics, code: list[str], change):
+        got = incremental.update(list(code), [change])
+        fresh = IncrementalDiagnostics().update(list(code))
+        self.assertEqual(diagnostic_key(got), diagnostic_key(fresh))
+        return got
+
+    def test_get_blocks(self):
+        self.assertEqual(IncrementalDiagnostics.get_blocks(CODE[4:12]), [(0, 1), (1, 6), (6, 7), (7, 8)])
+
+    def test_unchanged_lines(self):
+        _, change = replace_lines(CODE, 5, 7, "")
+        self.assertEqual(IncrementalDiagnostics.unchanged_lines([change], len(CODE), len(CODE) - 2), (5, len(CODE) - 8))
+        self.assertEqual(IncrementalDiagnostics.unchanged_lines(None, len(CODE), len(CODE)), (0, 0))
+
+    def test_edits(self):
+        incremental = IncrementalDiagnostics()
+        self.assertEqual(incremental.update(list(CODE)), [])
+
+        # new error in the main part
+        code, change = replace_lines(CODE, 11, 12, "print(w)\n")
+        self.assertEqual(len(self.assertSameAsFresh(incremental, code, change)), 1)
+
+        # lines inserted above, every following block is moved
+        code, change = replace_lines(code, 5, 5, "int w = 5\n\n")
+        self.assertEqual(self.assertSameAsFresh(incremental, code, change), [])
+
+        # changed function signature, the blocks using it have to be checked again
+        code, change = replace_lines(code, 0, 1, "int add(int a):\n")
+        self.assertNotEqual(self.assertSameAsFresh(incremental, code, change), [])
+
+        # lines removed again
+        code, change = replace_lines(code, 0, 1, "int add(int a, int b):\n")
+        code, second_change = replace_lines(code, 5, 7, "")
+        got = incremental.update(list(code), [change, second_change])
+        self.assertEqual(diagnostic_key(got), diagnostic_key(IncrementalDiagnostics().update(list(code))))
+
+    def test_blocks_are_reused(self):
+        incremental = IncrementalDiagnostics()
+        incremental.update(list(CODE))
+        blocks = list(incremental.sections["main", "main"])
+
+        code, change = replace_lines(CODE, 11, 12, "print(y + 1)\n")
+        incremental.update(list(code), [change])
+        self.assertEqual(incremental.sections["main", "main"][:3], blocks[:3])
+        self.assertIsNot(incremental.sections["main", "main"][3], blocks[3])
+
+    def test_same_as_transpiler(self):
+        # the blocks are checked on their own, the errors have to be the same as if the document is checked at once
+        for code in [["int add(int a, int b):", "print(w)", "int q = 1", "#board", "int z = 0"],
+                     ["#main", "int y = 0", "for i in range(0, 3):", "", "y = 2"],
+                     ["#main", "int x = 1", "if x > 2", "int q = 2", "    print(x)"],
+                     ["    int add(int a, int b):", "    return a + b", "#main", "int x = add(1, 2)"]]:
+            self.assertEqual(diagnostic_key(IncrementalDiagnostics().update(list(code))),
+                             diagnostic_key(Transpiler.get_diagnostics(code)), code)
+
+        rng = random.Random(0)
+        incremental = IncrementalDiagnostics()
+        code = list(CODE)
+        incremental.update(list(code))
+        for _ in range(300):
+            new_code = random_edit(CODE if rng.random() < 0.3 else code, rng)
+            # the change replaces the lines between the unchanged lines at the start and the end
+            prefix = 0
+            while prefix < min(len(code), len(new_code)) and code[prefix] == new_code[prefix]:
+                prefix += 1
+            suffix = 0
+            while suffix < min(len(code), len(new_code)) - prefix and code[-suffix - 1] == new_code[-suffix - 1]:
+                suffix += 1
+            text = "".join(line + "\n" for line in new_code[prefix:len(new_code) - suffix])
+            _, change = replace_lines(code, prefix, len(code) - suffix, text)
+            code = new_code
+            self.assertEqual(diagnostic_key(incremental.update(list(code), [change])),
+                             diagnostic_key(Transpiler.get_diagnostics(code)), code)
+
+
+if __name__ == '__main__':
+    unittest.main()
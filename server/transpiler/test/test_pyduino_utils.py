@@ -0,0 +1,16 @@
+import unittest
+from server.transpiler.pyduino_utils import *
+
+
+class TestBracketPairs(unittest.TestCase):
+    def test_pairs(self):
+        self.assertEqual(StringUtils.get_bracket_pairs('f(a[1], "(", {2})'), {1: 16, 3: 5, 8: 10, 13: 15})
+        self.assertEqual(StringUtils.get_bracket_pairs("([)]"), {0: 3})
+        # not closed
+        self.assertEqual(StringUtils.get_bracket_pairs('(a, "b)'), {})
+        # mismatched, the text after '{' is outside of '['
+        self.assertEqual(StringUtils.get_bracket_pairs("[}]{ a"), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
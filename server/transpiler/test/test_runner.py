@@ -0,0 +1,171 @@
+import glob
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import server.transpiler.runner as runner_module
+from server.transpiler.runner import Runner
+from server.transpiler.transpiler import Transpiler
+
+CODE = """#main
+int x = 3
+print(x)
+
+#board
+int k = 0
+delay(10)
+"""
+
+
+class TestTranspileCache(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.patch = mock.patch.object(runner_module, "TEMP_FOLDER", self.temp.name)
+        self.patch.start()
+
+    def tearDown(self):
+        self.patch.stop()
+        self.temp.cleanup()
+
+    def test_unchanged_code_is_not_transpiled(self):
+        first = Runner(CODE).transpile()
+        pc_file = os.path.join(self.temp.name, "temp_pc.cpp")
+        modified = os.stat(pc_file).st_mtime_ns
+
+        with mock.patch.object(Transpiler, "get_code", side_effect=AssertionError("transpiled again")), \
+                mock.patch("builtins.open", wraps=open) as opened:
+            second = Runner(CODE).transpile()
+
+        self.assertEqual(first, second)
+        self.assertEqual(os.stat(pc_file).st_mtime_ns, modified)
+        self.assertNotIn("w", [call.args[1] for call in opened.call_args_list if len(call.args) > 1])
+
+    def test_changed_code_is_transpiled(self):
+        Runner(CODE).transpile()
+        code_pc, _ = Runner(CODE.replace("int x = 3", "int x = 4")).transpile()
+        self.assertIn("py_int x = 4;", code_pc)
+        with open(os.path.join(self.temp.name, "temp_pc.cpp")) as f:
+            self.assertEqual(f.read(), code_pc)
+
+    def test_broken_cache_file(self):
+        first = Runner(CODE).transpile()
+        cache_file, = glob.glob(os.path.join(self.temp.name, "cache", "*.json"))
+        with open(cache_file, "w") as f:
+            f.write('["#include')
+        self.assertEqual(Runner(CODE).transpile(), first)
+        with open(cache_file) as f:
+            self.assertEqual(json.load(f), list(first))
+
+    def test_cache_is_limited(self):
+        with mock.patch.object(runner_module, "CACHE_ENTRIES", 2):
+            for x in range(4):
+                Runner(CODE.replace("int x = 3", f"int x = {x}")).transpile()
+                time.sleep(0.01)
+        self.assertEqual(len(os.listdir(os.path.join(self.temp.name, "cache"))), 2)
+        # the last one is still cached (x = 3), the first one is transpiled again
+        with mock.patch.object(Transpiler, "get_code", side_effect=AssertionError("transpiled again")):
+            Runner(CODE).transpile()
+            self.assertRaises(AssertionError, Runner(CODE.replace("int x = 3", "int x = 0")).transpile)
+
+
+class TestBuildCache(unittest.TestCase):
+    def setUp(self):
+        self.temp = tempfile.TemporaryDirectory()
+        self.patches = [mock.patch.object(runner_module, "TEMP_FOLDER", self.temp.name),
+                        mock.patch.object(Runner, "check_mingw")]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.temp.cleanup()
+
+    def compile(self, code: str, failing: str = None) -> tuple[Runner, list[str]]:
+        """
+        Compiles with fake compilers that only create the output files
+        :param failing: The compilers with this in their command exit with 1 after creating the output
+        :return: the runner and the commands that were run
+        """
+        commands = []
+
+        def compiler(command, shell):
+            commands.append(command)
+            if "g++" in command:
+                open(command.split("-o ")[1].rstrip('"'), "w").close()
+            else:
+                output = command.split("--build-path ")[1].split(" ")[0]
+                os.mkdir(output)
+                open(os.path.join(output, "temp_board.ino.hex"), "w").close()
+            return mock.Mock(**{"wait.return_value": 1 if failing and failing in command else 0})
+
+        runner = Runner(code)
+        with mock.patch("subprocess.Popen", side_effect=compiler):
+            runner.compile()
+            time.sleep(0.01)  # the builds are ordered by their timestamps
+        return runner, commands
+
+    def test_unchanged_code_is_not_compiled(self):
+        first, commands = self.compile(CODE)
+        # the runtime objects, the pc program and the board
+        self.assertEqual(len(commands), 5)
+        self.assertEqual(len([c for c in commands if "g++ -c" in c]), 3)
+
+        second, commands = self.compile(CODE)
+        self.assertEqual(commands, [])
+        self.assertEqual(first.pc_executable, second.pc_executable)
+        self.assertEqual(first.board_build, second.board_build)
+        self.assertTrue(second.pc and second.board)
+
+    def test_runtime_is_compiled_once(self):
+        self.compile(CODE)
+        _, commands = self.compile(CODE.replace("int x = 3", "int x = 4"))
+        self.assertEqual(len(commands), 1)
+        self.assertIn("Runtime_PC.o", commands[0])
+        self.assertIn("Serial_PC.o", commands[0])
+
+    def test_changed_code_is_compiled(self):
+        first, _ = self.compile(CODE)
+        second, commands = self.compile(CODE.replace("int k = 0", "int k = 1"))
+        self.assertEqual(len(commands), 1)
+        self.assertIn("--build-path", commands[0])
+        self.assertEqual(first.pc_executable, second.pc_executable)
+        self.assertNotEqual(first.board_build, second.board_build)
+
+    def test_failed_compiler(self):
+        runner, commands = self.compile(CODE, failing="Serial.cpp")
+        self.assertFalse(runner.compiled)
+        self.assertFalse(any("temp_pc.cpp" in c for c in commands))
+
+        # the outputs of the failed compilers are not reused
+        runner, commands = self.compile(CODE, failing="temp_pc.cpp")
+        self.assertEqual(len(commands), 2)
+        self.assertIn("Serial.cpp", commands[0])
+        self.assertFalse(runner.compiled)
+        self.assertFalse(os.path.exists(runner.pc_executable))
+        with mock.patch.object(Runner, "compile"), mock.patch("subprocess.run", side_effect=AssertionError("run")):
+            runner.run()
+
+        runner, commands = self.compile(CODE)
+        self.assertTrue(runner.compiled)
+        self.assertEqual(len(commands), 1)
+        self.assertIn("temp_pc.cpp", commands[0])
+
+    def test_builds_are_limited(self):
+        def code(x: int) -> str:
+            return CODE.replace("int x = 3", f"int x = {x}").replace("int k = 0", f"int k = {x}")
+
+        with mock.patch.object(runner_module, "BUILD_ENTRIES", 2):
+            runners = [self.compile(code(x))[0] for x in range(3)]
+            self.compile(code(1))  # a reused build is used most recently
+            runners.append(self.compile(code(3))[0])
+        kept = [os.path.basename(path) for runner in [runners[1], runners[3]]
+                for path in [runner.pc_executable, runner.board_build]]
+        build = os.path.join(self.temp.name, "build")
+        self.assertEqual(sorted(f for f in os.listdir(build) if not f.startswith("runtime_")), sorted(kept))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+from server.transpiler.transpiler import Transpiler
+from server.transpiler.function import Function
+from server.transpiler.pyduino_utils import *
+
+
+class TestScope(unittest.TestCase):
+    def test_function_lookup(self):
+        transpiler = Transpiler(["int a = 1"], "main")
+        first = Function("f", None, [])
+        second = Function("f", None, [])
+        transpiler.scope.add_Function(first, Position(5, 0))
+        transpiler.scope.add_Function(second, Position(2, 0))
+
+        self.assertIs(transpiler.scope.get_Function("f", Position(6, 0)), first)
+        self.assertIs(transpiler.scope.get_Function("f", Position(3, 0)), second)
+        self.assertFalse(transpiler.scope.get_Function("f", Position(1, 0)))
+        self.assertFalse(transpiler.scope.get_Function("g", Position(6, 0)))
+        self.assertEqual(transpiler.scope.functions[-2:], [first, second])
+
+    def test_shared_builtins(self):
+        first = Transpiler(["int a = 1"], "main")
+        second = Transpiler(["int a = 1"], "main")
+        builtin = first.scope.get_Function("print", Position(1, 0))
+        self.assertIs(second.scope.get_Function("print", Position(1, 0)), builtin)
+        self.assertNotIn(builtin, first.scope.functions)
+
+    def test_variable_lookup(self):
+        code = ["#main", "int x = 1", "if x > 0:", "    int y = x", "    print(y)", "print(y)", "float x = 2.0"]
+        self.assertEqual([d.message for d in Transpiler.get_diagnostics(code)],
+                         ["Invalid value y", "Variable 'x' is already defined"])
+
+
+if __name__ == '__main__':
+    unittest.main()
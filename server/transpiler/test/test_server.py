@@ -0,0 +1,108 @@
+import threading
+import unittest
+from lsprotocol import types as lsp
+from server.server import PyduinoLanguageServer, did_close
+
+URI = "file:///test.pino"
+TIMEOUT = 2
+
+
+class DirectLoop:
+    """
+    Runs the callbacks of the validation worker at once instead of on the event loop of the server
+    """
+
+    def call_soon_threadsafe(self, callback, *args):
+        callback(*args)
+
+
+class Document:
+    """
+    Records the checked sources instead of transpiling them, update waits for release if blocking is set
+    """
+
+    def __init__(self, blocking: bool = False):
+        self.sources = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not blocking:
+            self.release.set()
+
+    def update(self, lines: list[str], changes: list = None):
+        self.sources.append("\n".join(lines))
+        self.started.set()
+        self.release.wait(TIMEOUT)
+        return [self.sources[-1]]
+
+
+class TestValidation(unittest.TestCase):
+    def setUp(self):
+        self.server = PyduinoLanguageServer("Pyduino", "test")
+        self.server.loop.close()
+        self.server.loop = DirectLoop()
+        self.published = []
+        self.done = threading.Event()
+
+        def publish(uri, diagnostics):
+            self.published.append((uri, diagnostics))
+            self.done.set()
+
+        self.server.publish_diagnostics = publish
+
+    def tearDown(self):
+        self.server.validation_executor.shutdown(wait=True)
+
+    def wait_idle(self):
+        # the timers submit to the worker, a task submitted after them runs once they are all checked
+        for timer in list(self.server.timers.values()):
+            timer.join(TIMEOUT)
+        self.server.validation_executor.submit(lambda: None).result(TIMEOUT)
+
+    def test_debounce(self):
+        document = self.server.documents[URI] = Document()
+        self.server.debounce = 0.05
+        for version in range(1, 4):
+            self.server.schedule_validation(URI, version, f"version {version}")
+        self.assertTrue(self.done.wait(TIMEOUT))
+        self.wait_idle()
+        self.assertEqual(document.sources, ["version 3"])
+        self.assertEqual(self.published, [(URI, ["version 3"])])
+
+    def test_superseded(self):
+        document = self.server.documents[URI] = Document(blocking=True)
+        self.server.schedule_validation(URI, 1, "version 1", delay=0)
+        self.assertTrue(document.started.wait(TIMEOUT))
+        # version 2 arrives while version 1 is checked, the result of version 1 is dropped
+        self.server.schedule_validation(URI, 2, "version 2", delay=0.05)
+        document.release.set()
+        self.assertTrue(self.done.wait(TIMEOUT))
+        self.wait_idle()
+        self.assertEqual(document.sources, ["version 1", "version 2"])
+        self.assertEqual(self.published, [(URI, ["version 2"])])
+
+    def test_publish_latest(self):
+        self.server.latest_versions[URI] = 2
+        self.server.publish_latest(URI, 1, ["version 1"])
+        self.assertEqual(self.published, [])
+        self.server.publish_latest(URI, 2, ["version 2"])
+        self.assertEqual(self.published, [(URI, ["version 2"])])
+
+    def test_did_close(self):
+        document = self.server.documents[URI] = Document()
+        validated = []
+        self.server.validate_pending = validated.append  # the timer submits this unless it is canceled
+        self.server.schedule_validation(URI, 1, "version 1", delay=0.05)
+        timer = self.server.timers[URI]
+        did_close(self.server, lsp.DidCloseTextDocumentParams(text_document=lsp.TextDocumentIdentifier(uri=URI)))
+        timer.join(TIMEOUT)
+        self.wait_idle()
+        self.assertEqual(validated, [])
+        self.assertEqual(self.server.timers, {})
+        self.assertEqual(self.server.pending, {})
+        self.assertNotIn(URI, self.server.documents)
+        self.assertEqual(document.sources, [])
+        self.assertEqual(self.published, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
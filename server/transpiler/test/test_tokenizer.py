@@ -0,0 +1,138 @@
+import random
+import unittest
+
+from server.transpiler.tokenizer import *
+
+
+# The character by character tokenizer that was used before the regex scanner, the output has to stay the same
+
+def walk_tokenize(string: str, start: 'Position') -> list['Token']:
+    bracket_levels = [0, 0, 0]
+    last_space = start
+    last_bracket = start
+    enumerator = enumerate(string)
+    tokens = []
+    for i, char in enumerator:
+        if char in "([{":
+            if bracket_levels == [0, 0, 0]:
+                last_bracket = Position(start.line, start.col + i)
+            bracket_levels["([{".index(char)] += 1
+        elif char in ")]}":
+            bracket_levels[")]}".index(char)] -= 1
+            if bracket_levels == [0, 0, 0]:
+                if last_space.col != last_bracket.col:
+                    tokens.append(walk_get_token(string[last_space.col - start.col:last_bracket.col - start.col],
+                                                 Range.fromPositions(last_space, last_bracket)))
+
+                tokens.append(walk_get_token(string[last_bracket.col - start.col:i + 1],
+                                             Range.fromPositions(last_bracket,
+                                                                 Position(start.line, start.col + i + 1))))
+                last_space = Position(start.line, start.col + i + 1)
+                continue
+
+        if char == "\"":
+            for j, char2 in enumerator:
+                if char2 == "\"":
+                    break
+            else:
+                break
+
+        if bracket_levels != [0, 0, 0]:
+            continue
+
+        if any(string[i:i + 2] == t for t in NO_SPACE_TOKENS_LEN2):
+            tokens.append(
+                walk_get_token(string[last_space.col - start.col:i],
+                               Range.fromPositions(last_space, Position(start.line, start.col + i))))
+            last_space = Position(start.line, start.col + i)
+
+            tokens.append(walk_get_token(string[i:i + 2], Range.fromPositions(last_space, last_space.add_col(2))))
+            next(enumerator)
+            last_space = last_space.add_col(2)
+
+        elif char == " " or any(char == t for t in NO_SPACE_TOKENS_LEN1):
+            tokens.append(walk_get_token(string[last_space.col - start.col:i],
+                                         Range.fromPositions(last_space, Position(start.line, start.col + i))))
+            last_space = Position(start.line, start.col + i)
+
+            if char == " ":
+                continue
+
+            tokens.append(walk_get_token(char, Range.fromPositions(last_space, last_space.add_col(1))))
+            last_space = last_space.add_col(1)
+
+    tokens.append(walk_get_token(string[last_space.col - start.col:],
+                                 Range.fromPositions(last_space, Position(start.line, start.col + len(string)))))
+
+    return [t for t in tokens if t is not None]
+
+
+def walk_get_token(string: str, range: 'Range') -> 'Token':
+
+    range = Range.fromPositions(range.start.add_col(len(string) - len(string.lstrip())),
+                                range.end.add_col(-len(string) + len(string.rstrip())))
+    string = string.strip()
+    if string == "":
+        return None
+
+    if string in TOKENS.keys():
+        t, cls = TOKENS[string]
+        return cls(t, range, string)
+
+    if string[0] in "([":
+        type = Brackets.ROUND if string[0] == "(" else Brackets.SQUARE
+        return Brackets(type, range, walk_tokenize(string[1:-1], range.start.add_col(1)), string[-1] == string[0])
+
+    if string[0] == "@":
+        return Decorator(Decorator.UNKNOWN, range, string[1:])
+
+    if StringUtils.is_identifier(string):
+        return Word(Word.IDENTIFIER, range, string)
+
+    return Word(Word.VALUE, range, string)
+
+
+def dump(tokens: list[Token]) -> list[tuple]:
+    return [(type(t).__name__, t.type.name, t.value, str(t.location), getattr(t, "closed", None),
+             dump(t.inside) if isinstance(t, Brackets) else None) for t in tokens]
+
+
+LINES = [
+    "int x = (42 + 2) * 3",
+    "int[][] x = [[1, 2, 3], [4, 5, 6]]",
+    'print("Hello (World)", x[0][1], y // 2)',
+    "if x >= 3 and not y != 4:",
+    "    for i in range(0, 10, 2):",
+    "@main",
+    "int add(int a, int b):",
+    '    lcd_print("a" + str(x))  # comment',
+    "x = f(a)(b) + {1: 2}",
+    'str s = "not closed',
+    "(x",
+    ")(",
+]
+
+
+class TestTokenizer(unittest.TestCase):
+    def test_same_as_walker(self):
+        for line in LINES:
+            self.assertEqual(dump(Token.tokenize(line, Position(3, 0))), dump(walk_tokenize(line, Position(3, 0))))
+
+    def test_random_lines(self):
+        alphabet = list('ab1_ ()[]{}"=<>!/+-*%,:;@#.\t') + ["==", "and", "int", "@main", "  "]
+        random.seed(0)
+        for _ in range(5000):
+            line = "".join(random.choice(alphabet) for _ in range(random.randint(0, 14)))
+            start = Position(random.randint(0, 5), random.choice([0, 4]))
+            self.assertEqual(dump(Token.tokenize(line, start)), dump(walk_tokenize(line, start)), line)
+
+    def test_compact_tokens(self):
+        indent = Token.tokenize_range(LINES[:5], Position(0, 0))
+        tokens = [indent, indent.location.start] + [t for line in indent.inside for t in line]
+        tokens += [t for t in tokens if isinstance(t, Brackets) for t in t.inside]
+        for token in tokens:
+            self.assertFalse(hasattr(token, "__dict__"), type(token).__name__)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+import server.transpiler.transpiler as transpiler_module
+from server.transpiler.transpiler import Transpiler
+
+CODE = """@board
+int add(int a, int b):
+    return a + b
+
+#main
+int x = add(1, 2)
+for i in range(0, 10, 2):
+    x = x + i
+print(x)
+int y = "a"
+
+#board
+int k = 0
+while k < 10:
+    k = k + 1
+print(k)
+undefined()
+""".splitlines()
+
+
+class TestParallel(unittest.TestCase):
+    def test_same_diagnostics(self):
+        serial = Transpiler.get_diagnostics(CODE)
+        with mock.patch.object(transpiler_module, "PARALLEL_MIN_LINES", 0):
+            parallel = Transpiler.get_diagnostics(CODE)
+        self.assertEqual(serial, parallel)
+        self.assertEqual(len(parallel), 2)
+
+    def test_same_code(self):
+        code = [line for line in CODE if line not in ['int y = "a"', "undefined()"]]
+        serial = Transpiler.get_code(code)
+        with mock.patch.object(transpiler_module, "PARALLEL_MIN_LINES", 0):
+            parallel = Transpiler.get_code(code)
+        self.assertEqual(serial, parallel)
+        self.assertIn("add(Arduino &arduino, ", parallel[0])
+
+    def test_pool_shutdown_at_exit(self):
+        with mock.patch.object(Transpiler, "process_pool", None), \
+                mock.patch("server.transpiler.transpiler.atexit.register") as register:
+            pool = Transpiler.get_process_pool()
+            self.assertIs(Transpiler.get_process_pool(), pool)
+        register.assert_called_once_with(pool.shutdown, cancel_futures=True)
+        pool.shutdown()
+
+
+class TestPhases(unittest.TestCase):
+    def test_each_phase_once_per_section(self):
+        code = [line for line in CODE if line not in ['int y = "a"', "undefined()"]]
+        calls = {}
+
+        def count(phase, function):
+            def wrapper(*args):
+                calls.setdefault(phase, []).append(args)
+                return function(*args)
+            return wrapper
+
+        with mock.patch.object(Transpiler, "tokenize", count("tokenize", Transpiler.tokenize)), \
+                mock.patch.object(Transpiler, "analyze", count("analyze", Transpiler.analyze)), \
+                mock.patch.object(Transpiler, "fold", count("fold", Transpiler.fold)), \
+                mock.patch.object(Transpiler, "link", staticmethod(count("link", Transpiler.link))), \
+                mock.patch.object(Transpiler, "emit", count("emit", Transpiler.emit)):
+            Transpiler.get_code(code)
+
+        # definition part in main mode, #main, definition part in board mode, #board
+        self.assertEqual(len(calls["tokenize"]), 4)
+        self.assertEqual(len({id(args[0]) for args in calls["tokenize"]}), 4)
+        self.assertEqual([args[0] for args in calls["analyze"]], [args[0] for args in calls["tokenize"]])
+        self.assertEqual([args[0].mode for args in calls["fold"]], ["main", "board"])
+        self.assertEqual(len(calls["link"]), 1)
+        self.assertEqual([args[0].mode for args in calls["emit"]], ["main", "board"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,3 +1,5 @@
+import re
+
 from server.transpiler.pyduino_utils import *
 
 
@@ -9,6 +11,8 @@ class TokenType:
 
 
 class Token:
+    __slots__ = ("type", "value", "location")
+
     def __init__(self, type: TokenType, location: Range, value=None):
         self.type = type
         self.value = value
@@ -25,6 +29,7 @@ class Token:
     def tokenize_range(string: list[str], start: 'Position') -> 'Indent':
         indent = Indent(Range.fromPosition(start), [], None, 0)
         pos = start
+        last = start  # the end of the last line that is not empty, an indented block ends there
         for i, line in enumerate(string):
             if line.strip() == "":
                 continue
@@ -34,14 +39,15 @@ class Token:
                 indent = Indent(Range.fromPosition(pos), [], indent, level)
             elif level < indent.level:
                 while indent.level > level:
-                    indent.location.end = Position(pos.line - 1, len(string[i - 1]) - 1)
+                    indent.location.end = last
                     indent.parent.inside.append([indent])
                     indent.finish()
                     indent = indent.parent
             indent.inside.append(Token.tokenize(line, pos))
+            last = Position(pos.line, len(line) - 1)
 
         while indent.level > 0:
-            indent.location.end = Position(pos.line - 1, len(string[i - 1]) - 1)
+            indent.location.end = last
             indent.parent.inside.append([indent])
             indent.finish()
             indent = indent.parent
@@ -50,63 +56,75 @@ class Token:
         return indent
 
     @staticmethod
-    def tokenize(string: str, start: 'Position') -> list['Token']:
-        bracket_levels = [0, 0, 0]
-        last_space = start
-        last_bracket = start
-        enumerator = enumerate(string)
+    def tokenize(string: str, start: 'Position', pairs: dict[int, int] = None) -> list['Token']:
+        if pairs is None:
+            pairs = StringUtils.get_bracket_pairs(string)
+        return Token.tokenize_part(string, start.line, start.col, 0, len(string), pairs)
+
+    @staticmethod
+    def tokenize_part(string: str, line: int, col: int, begin: int, end: int, pairs: dict[int, int]) -> list['Token']:
+        """
+        Tokenizes string[begin:end] in one pass, the regex jumps from one separator (operator, space, bracket or
+        quotation mark) to the next, the characters in between are never looked at in python
+        :param line: The line of the string in the document
+        :param col: The column of string[0] in the document
+        :param pairs: The bracket pairs of the string (StringUtils.get_bracket_pairs), brackets and strings
+         are skipped with them
+        """
         tokens = []
-        for i, char in enumerator:
-            if char in "([{":
-                if bracket_levels == [0, 0, 0]:
-                    last_bracket = Position(start.line, start.col + i)
-                bracket_levels["([{".index(char)] += 1
-            elif char in ")]}":
-                bracket_levels[")]}".index(char)] -= 1
+        bracket_levels = [0, 0, 0]
+        last_space = begin  # the start of the current token
+        last_bracket = begin  # the outermost opening bracket
+        search = TOKEN_SEPARATORS.search
+        pos = begin
+        while True:
+            match = search(string, pos, end)
+            if match is None:
+                break
+            i = match.start()
+            pos = match.end()
+            separator = match.group()
+
+            if separator in OPENING_BRACKETS:
                 if bracket_levels == [0, 0, 0]:
-                    if last_space.col != last_bracket.col:
-                        tokens.append(Token.get_token(string[last_space.col - start.col:last_bracket.col - start.col],
-                                                      Range.fromPositions(last_space, last_bracket)))
-
-                    tokens.append(Token.get_token(string[last_bracket.col - start.col:i + 1],
-                                                  Range.fromPositions(last_bracket,
-                                                                      Position(start.line, start.col + i + 1))))
-                    last_space = Position(start.line, start.col + i + 1)
-                    continue
-
-            if char == "\"":
-                for j, char2 in enumerator:
-                    if char2 == "\"":
-                        break
-                else:
-                    break
-
-            if bracket_levels != [0, 0, 0]:
+                    last_bracket = i
+                    closing = pairs.get(i, end)
+                    if closing < end:
+                        # the brackets in between can't change anything, they are skipped
+                        if last_space != i:
+                            tokens.append(Token.get_token_at(string, line, col, last_space, i, pairs))
+                        tokens.append(Token.get_token_at(string, line, col, i, closing + 1, pairs))
+                        last_space = pos = closing + 1
+                        continue
+                bracket_levels[OPENING_BRACKETS[separator]] += 1
                 continue
 
-            if any(string[i:i + 2] == t for t in NO_SPACE_TOKENS_LEN2):
-                tokens.append(
-                    Token.get_token(string[last_space.col - start.col:i],
-                                    Range.fromPositions(last_space, Position(start.line, start.col + i))))
-                last_space = Position(start.line, start.col + i)
-
-                tokens.append(Token.get_token(string[i:i + 2], Range.fromPositions(last_space, last_space.add_col(2))))
-                next(enumerator)
-                last_space = last_space.add_col(2)
+            if separator in CLOSING_BRACKETS:
+                bracket_levels[CLOSING_BRACKETS[separator]] -= 1
+                if bracket_levels == [0, 0, 0]:
+                    if last_space != last_bracket:
+                        tokens.append(Token.get_token_at(string, line, col, last_space, last_bracket, pairs))
+                    tokens.append(Token.get_token_at(string, line, col, last_bracket, i + 1, pairs))
+                    last_space = i + 1
+                continue
 
-            elif char == " " or any(char == t for t in NO_SPACE_TOKENS_LEN1):
-                tokens.append(Token.get_token(string[last_space.col - start.col:i],
-                                              Range.fromPositions(last_space, Position(start.line, start.col + i))))
-                last_space = Position(start.line, start.col + i)
+            if separator == "\"":
+                pos = pairs.get(i, end) + 1
+                if pos > end:
+                    break  # the string is not closed, the rest of the line is one token
+                continue
 
-                if char == " ":
-                    continue
+            if bracket_levels != [0, 0, 0]:
+                continue
 
-                tokens.append(Token.get_token(char, Range.fromPositions(last_space, last_space.add_col(1))))
-                last_space = last_space.add_col(1)
+            tokens.append(Token.get_token_at(string, line, col, last_space, i, pairs))
+            if separator == " ":
+                last_space = i
+            else:
+                tokens.append(Token.get_token_at(string, line, col, i, pos, pairs))
+                last_space = pos
 
-        tokens.append(Token.get_token(string[last_space.col - start.col:],
-                                      Range.fromPositions(last_space, Position(start.line, start.col + len(string)))))
+        tokens.append(Token.get_token_at(string, line, col, last_space, end, pairs))
 
         return [t for t in tokens if t is not None]
 
@@ -116,28 +134,42 @@ class Token:
 
     @staticmethod
     def get_token(string: str, range: 'Range') -> 'Token':
+        return Token.get_token_at(string, range.start.line, range.start.col, 0, len(string))
 
-        range = Range.fromPositions(range.start.add_col(len(string) - len(string.lstrip())),
-                                    range.end.add_col(-len(string) + len(string.rstrip())))
-        string = string.strip()
-        if string == "":
+    @staticmethod
+    def get_token_at(string: str, line: int, col: int, begin: int, end: int, pairs: dict[int, int] = None) -> 'Token':
+        """
+        Creates the token for string[begin:end] without the surrounding whitespace
+        :param col: The column of string[0] in the document
+        :param pairs: The bracket pairs of the string, they are only needed for brackets
+        """
+        value = string[begin:end]
+        stripped = value.strip()
+        if stripped == "":
             return None
 
-        if string in TOKENS.keys():
-            t, cls = TOKENS[string]
-            return cls(t, range, string)
+        begin += len(value) - len(value.lstrip())
+        end -= len(value) - len(value.rstrip())
+        range = Range(line, col + begin, line, col + end)
+
+        if stripped in TOKENS:
+            t, cls = TOKENS[stripped]
+            return cls(t, range, stripped)
 
-        if string[0] in "([":
-            type = Brackets.ROUND if string[0] == "(" else Brackets.SQUARE
-            return Brackets(type, range, Token.tokenize(string[1:-1], range.start.add_col(1)), string[-1] == string[0])
+        if stripped[0] in "([":
+            type = Brackets.ROUND if stripped[0] == "(" else Brackets.SQUARE
+            if pairs is None:
+                pairs = StringUtils.get_bracket_pairs(string)
+            return Brackets(type, range, Token.tokenize_part(string, line, col, begin + 1, max(end - 1, begin + 1), pairs),
+                            stripped[-1] == stripped[0])
 
-        if string[0] == "@":
-            return Decorator(Decorator.UNKNOWN, range, string[1:])
+        if stripped[0] == "@":
+            return Decorator(Decorator.UNKNOWN, range, stripped[1:])
 
-        if StringUtils.is_identifier(string):
-            return Word(Word.IDENTIFIER, range, string)
+        if StringUtils.is_identifier(stripped):
+            return Word(Word.IDENTIFIER, range, stripped)
 
-        return Word(Word.VALUE, range, string)
+        return Word(Word.VALUE, range, stripped)
 
     def __repr__(self):
         if self.type is Brackets.ROUND or self.type is Brackets.SQUARE:
@@ -147,6 +179,7 @@ class Token:
 
 
 class Indent(Token):
+    __slots__ = ("inside", "parent", "level", "enumerator", "index", "variables")
     INDENT = TokenType("INDENT", "INDENT")
 
     def __init__(self, location: Range, inside: list[list['Token']], parent: 'Indent', level=0):
@@ -155,17 +188,30 @@ class Indent(Token):
         self.level = level
         self.enumerator = None
         self.index = 0
-        self.variables = []
+        self.variables: dict[str, 'Variable'] = {}
         super().__init__(self.INDENT, location, None)
 
     def finish(self):
         self.enumerator = enumerate(self.inside)
 
+    def reset(self):
+        """
+        Rewinds this indent and all nested indents, so the tokens can be transpiled again
+        """
+        self.finish()
+        self.index = 0
+        self.variables = {}
+        for line in self.inside:
+            if line and line[0].type == Indent.INDENT:
+                line[0].reset()
+
     def __repr__(self):
         return f"INDENT {self.level} {self.inside}"
 
 
 class Operator(Token):
+    __slots__ = ("left", "right")
+
     def __init__(self, type: TokenType, location: Range, _, left=None, right=None):
         self.left = left
         self.right = right
@@ -173,6 +219,7 @@ class Operator(Token):
 
 
 class Math_Operator(Operator):
+    __slots__ = ()
     PLUS = TokenType("+", "MATH_OPERATOR.PLUS")
     MINUS = TokenType("-", "MATH_OPERATOR.MINUS")
     MULTIPLY = TokenType("*", "MATH_OPERATOR.MULTIPLY")
@@ -182,6 +229,7 @@ class Math_Operator(Operator):
 
 
 class Compare_Operator(Operator):
+    __slots__ = ()
     EQUAL = TokenType("==", "Compare_Operator.EQUAL")
     NOT_EQUAL = TokenType("!=", "Compare_Operator.NOT_EQUAL")
     GREATER = TokenType(">", "Compare_Operator.GREATER")
@@ -191,12 +239,14 @@ class Compare_Operator(Operator):
 
 
 class Bool_Operator(Operator):
+    __slots__ = ()
     AND = TokenType("and", "Bool_Operator.AND")
     OR = TokenType("or", "Bool_Operator.OR")
     NOT = TokenType("not", "Bool_Operator.NOT")
 
 
 class Word(Token):
+    __slots__ = ()
     IDENTIFIER = TokenType("identifier", "Word.IDENTIFIER")
     VALUE = TokenType("value", "Word.VALUE")
 
@@ -205,6 +255,7 @@ class Word(Token):
 
 
 class Brackets(Token):
+    __slots__ = ("closed", "inside")
     ROUND = TokenType("()", "Brackets.ROUND")
     SQUARE = TokenType("[]", "Brackets.SQUARE")
 
@@ -215,6 +266,7 @@ class Brackets(Token):
 
 
 class Separator(Token):
+    __slots__ = ()
     COMMA = TokenType(",", "Separator.COMMA")
     COLON = TokenType(":", "Separator.COLON")
     SEMICOLON = TokenType(";", "Separator.SEMICOLON")
@@ -223,6 +275,7 @@ class Separator(Token):
 
 
 class Keyword(Token):
+    __slots__ = ()
     IF = TokenType("if", "Keyword.IF")
     ELSE = TokenType("else", "Keyword.ELSE")
     ELIF = TokenType("elif", "Keyword.ELIF")
@@ -235,6 +288,7 @@ class Keyword(Token):
 
 
 class Datatype(Token):
+    __slots__ = ()
     INT = TokenType("int", "Datatype.INT")
     FLOAT = TokenType("float", "Datatype.FLOAT")
     STRING = TokenType("str", "Datatype.STRING")
@@ -243,6 +297,7 @@ class Datatype(Token):
 
 
 class Decorator(Token):
+    __slots__ = ()
     MAIN = TokenType("@main", "Decorator.MAIN")
     BOARD = TokenType("@board", "Decorator.BOARD")
     UNKNOWN = TokenType("@unknown", "Decorator.UNKNOWN")
@@ -251,6 +306,11 @@ class Decorator(Token):
 
 NO_SPACE_TOKENS_LEN1 = ["+", "-", "*", "/", "%", ",", ":", "<", ">", "=", ";"]
 NO_SPACE_TOKENS_LEN2 = ["==", ">=", "<=", "!=", "//"]
+OPENING_BRACKETS = {"(": 0, "[": 1, "{": 2}
+CLOSING_BRACKETS = {")": 0, "]": 1, "}": 2}
+# the two character tokens come first, so they are preferred over their first character
+TOKEN_SEPARATORS = re.compile("|".join(re.escape(t) for t in NO_SPACE_TOKENS_LEN2 + NO_SPACE_TOKENS_LEN1 +
+                                       list(OPENING_BRACKETS) + list(CLOSING_BRACKETS) + [" ", "\""]))
 TOKENS = {
     "+": (Math_Operator.PLUS, Math_Operator),
     "-": (Math_Operator.MINUS, Math_Operator),
@@ -1,42 +1,78 @@
+import atexit
+from concurrent.futures import ProcessPoolExecutor
+
 from server.transpiler.control import Control
-from server.transpiler.function import Function, Builtin
+from server.transpiler.emitter import CppEmitter, ArduinoEmitter
+from server.transpiler.folding import ConstantFolding
+from server.transpiler.reachability import Reachability
+from server.transpiler.function import Function
 from server.transpiler.scope import Scope
 from server.transpiler.tokenizer import *
 from server.transpiler.variable import *
 
+PARALLEL_MIN_LINES = 1000  # smaller files are transpiled faster without sending them to the process pool
+# when the board answers the requests of the pc (#serial <mode> in the #board part):
+# after every statement, at the start of every loop iteration, or from a timer interrupt
+SERIAL_MODES = ["statements", "loops", "timer"]
+
 
 class Transpiler:
-    def __init__(self, code: list[str], mode="main", definition: bool = False, line_offset=0):
+    process_pool: ProcessPoolExecutor = None
+
+    def __init__(self, code: list[str], mode="main", definition: bool = False, line_offset=0,
+                 tokens: Indent = None):
         """
         :param code: The Code to transpile (including the #main or #board)
         :param mode: main or board
         :param line_offset: The line offset of the code segment
         :param definition: If the code is in the definition part at the top of the file
+        :param tokens: Already tokenized code, the code is not tokenized again if this is given
         """
         self.mode = mode
         self.definition = definition
         self.connection_needed = False
+        self.proxy_calls: set[str] = set()  # the builtins the pc calls on the board, set by link
+        self.serial_mode: str = SERIAL_MODES[0]
         self.data: Data = Data(code, 0)
+        self.data.first_line = line_offset
         self.location: CurrentLocation = CurrentLocation(code, self.data.indentations)
 
         self.utils: StringUtils = StringUtils(self.location, self.data, self)
 
-        self.parent_indent = Token.tokenize_range(code, Position(line_offset, 0))
-        self.current_indent = self.parent_indent
+        self.parent_indent = tokens
+        self.current_indent = tokens
+        if tokens is None:
+            self.tokenize()
 
         self.scope: Scope = Scope(self)
 
-        Builtin.add_builtins(self)
-
-        self.checks = [Variable.check_assignment, Variable.check_definition, Control.check_condition,Control.check_break_continue,
+        self.checks = [Transpiler.check_directive, Variable.check_assignment, Variable.check_definition, Control.check_condition,Control.check_break_continue,
                        Function.check_definition,
                        Function.check_return, Function.check_call,
                        Function.check_decorator]  # the functions to check for different instruction types
 
-    def copy(self):
-        return Transpiler(self.data.code, self.mode, self.definition, self.data.line_offset)
+    def __getstate__(self):
+        """
+        Only the results of the transpilation are sent back from the process pool, not the tokens
+        """
+        state = self.__dict__.copy()
+        for attribute in ["parent_indent", "current_indent", "location", "utils", "checks"]:
+            state[attribute] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.utils = StringUtils(self.location, self.data, self)
 
-    def transpile(self):
+    # The code of a file goes through these phases, every section exactly once:
+    # tokenize -> analyze (checks the code and generates the statements in code_done, see ir.py)
+    # -> fold (folding.py) -> link (between #main and #board) -> emit (emitter.py)
+
+    def tokenize(self):
+        self.parent_indent = Token.tokenize_range(self.data.code, Position(self.data.first_line, 0))
+        self.current_indent = self.parent_indent
+
+    def analyze(self):
         self.transpileRange(self.parent_indent)
 
     def transpileRange(self, indent: Indent):
@@ -96,122 +132,50 @@ class Transpiler:
                 return
         self.data.newError("Unknow instruction", Range.fromPositions(line[0].location.start, line[-1].location.end))
 
-    def finish(self) -> str:
+    @staticmethod
+    def check_directive(instruction: list[Token], transpiler: 'Transpiler') -> bool:
         """
-        TODO add String function here in the c++ version:
-        std::string String(int value) { return std::to_string(value); }
-        std::string String(float value) { return std::to_string(value); }
-        for all datatypes
-
-        :return:
+        #serial <mode> sets how the board answers the requests of the pc, see SERIAL_MODES
         """
-        # TODO DEFINE A VARIABLE '__tempstr__' TO STORE THE STRING CONVERSIONS
-        code = []
+        if instruction[0].type != Word.VALUE or instruction[0].value != "#serial":
+            return False
 
-        if self.mode == "main":
-            if self.connection_needed:
-                code.append('#include "../server/transpiler/SerialCommunication/Serial_PC.cpp"')
-            code.append("#include <iostream>")
-            code.append("#include <string>")
-            code.append("#include <stdlib.h>")
-            code.append("using namespace std;")
-            code.append(f"#include <chrono>")
-            code.append("#include <thread>")
-            code.append("typedef int py_int;")
-            code.append(
-                "std::string String(int value) { return std::to_string(value); }\nstd::string String(float value) { return std::to_string(value); }\nstd::string String(std::string value) { return \"\\\"\" + value  + \"\\\"\"; }")
-            code.append(
-                "std::string String(char value) { return \"'\" + std::to_string(value) + \"'\"; }\nstd::string String(bool value) { return std::to_string(value); }")
-
-            for f in self.scope.functions:
-                if f.called:
-                    code.extend(f.code)
-
-            if self.connection_needed and self.data.remote_functions:
-                code.append("void do_functions(Arduino arduino, char* data, char id, char request_id) {")
-                temp_var = self.utils.next_sysvar()
-                code.append(f"char {temp_var}[{max([i.return_type.SIZE_BYTES for i in self.data.remote_functions])}];")
-                for f in self.data.remote_functions:
-                    code.append(f"if (id == {f.remote_id}) {{")
-                    code.append(f"remote_{f.name}(data,{temp_var});")
-                    code.append(f"arduino.send_response({temp_var}, {f.return_type.SIZE_BYTES}, request_id);}}")
-                code.append("}")
-
-            code.append("int main() {")
-
-            if self.connection_needed:
-
-                code.append("Arduino arduino = Arduino();")
-                if self.data.remote_functions:
-                    code.append("arduino.do_function = do_functions;")
-
-            code.append("auto start_time = std::chrono::steady_clock::now();")
-
-            code.extend(self.data.code_done)
-
-            if self.connection_needed:
-                code.append("arduino.listenerThread->join();")
-            code.append("return 0;")
-            code.append("}")
-
-        elif self.mode == "board":
-            if self.connection_needed:
-                with open("server/transpiler/SerialCommunication/Serial_Arduino/Serial_Arduino.ino") as f:
-                    code.extend(f.readlines())
-            else:
-                with open("server/transpiler/SerialCommunication/Serial_Arduino/No_Connection_Arduino.ino") as f:
-                    code.extend(f.readlines())
-
-            if self.data.lcd_needed:
-                code.append("#include <Wire.h>")
-                code.append("#include <LiquidCrystal_I2C.h>")
-                code.append("LiquidCrystal_I2C lcd(0x27, 16, 2);")
-                code.append("""void createCustomChar(String input, int charIndex){
-                  if(input.length() != 40){
-                    // invalid Char
-                    return;
-                  }
-                  byte customChar[8];
-                
-                    for(int i = 0; i < 8; i++){
-                        String byteString = input.substring(i*5, i*5+5);
-                        byteString.replace("0", " ");
-                        byteString.replace("1", "0");
-                        byteString.replace(" ", "1");
-                        customChar[i] = strtol(byteString.c_str(), NULL, 2);
-                    }
-                    lcd.createChar(charIndex,customChar);
-                }""")
-
-            for f in self.scope.functions:
-                if f.called:
-                    code.extend(f.code)
-
-            if self.connection_needed:
-                code.append("void setup() {\n Serial.begin(256000); \nHandshake();\ndelay(10);")
-
-                if self.data.lcd_needed:
-                    code.append("lcd.init();lcd.backlight();")
-
-                for i, line in enumerate(self.data.code_done):
-                    code.append(line)
-                    if i + 1 < len(self.data.code_done):
-                        if not self.data.code_done[i+1].startswith("else"):
-                            code.append("checkSerial();")
-                code.append("} \n void loop() { checkSerial(); }")
+        location = Range.fromPositions(instruction[0].location.start, instruction[-1].location.end)
+        if transpiler.mode != "board":
+            transpiler.data.newError("The serial mode can only be set in the #board part", location)
+            return True
 
-            else:
-                code.append("void setup() {")
-                if self.data.lcd_needed:
-                    code.append("lcd.init();lcd.backlight();")
-                code.extend(self.data.code_done)
-                code.append("} \nvoid loop() { }")
+        if len(instruction) != 2 or instruction[1].value not in SERIAL_MODES:
+            transpiler.data.newError(f"Expected one serial mode: {', '.join(SERIAL_MODES)}", location)
+            return True
 
-        return "\n".join(code)
+        transpiler.serial_mode = instruction[1].value
+        return True
 
-    @staticmethod
-    def get_transpiler(code: list[str]) -> tuple['Transpiler', 'Transpiler', 'Transpiler']:
+    def fold(self):
+        """
+        Removes the code that is never executed (folding.py), the reachable functions are only known after this
+        """
+        self.data.code_done = ConstantFolding.fold(self.data.code_done)
+        for f in self.scope.functions:
+            f.code = ConstantFolding.fold(f.code)
+
+    def emit(self) -> str:
+        """
+        The code is already folded
+        :return: The complete c++ (main) or arduino (board) code of the section
+        """
+        if self.mode == "main":
+            return CppEmitter(self).emit()
+        return ArduinoEmitter(self).emit()
 
+    @staticmethod
+    def split_sections(code: list[str]) -> tuple[list[str], list[str], int, list[str], int, bool]:
+        """
+        Splits the code into the definition, #main and #board part
+        :return: definition code, main code, main line offset, board code, board line offset,
+        True if the #main and #board part are both missing
+        """
         error = False
         line_offset_main = 0
         line_offset_board = 0
@@ -249,112 +213,130 @@ class Transpiler:
             definition_code = code
             error = True
 
-        if main_code:
-            main_transpiler = Transpiler(main_code, mode="main", line_offset=line_offset_main)
-        else:
-            main_transpiler = None
+        return definition_code, main_code, line_offset_main, board_code, line_offset_board, error
+
+    @staticmethod
+    def transpile_section(definition_code: list[str], code: list[str], mode: str, line_offset: int) \
+            -> tuple['Transpiler', 'Transpiler', int]:
+        """
+        Transpiles the definition part and one of the sections (#main or #board) in the given mode,
+        the sections do not depend on each other, so this can run in the process pool
+        :return: The definition transpiler, the section transpiler (None if the part is empty)
+        and the last used system variable index
+        """
+        definition = None
+        section = None
+        # the numbering starts again for every section, so the same code always gives the same output
+        Data.sys_var_index = 0
+        if definition_code:
+            definition = Transpiler(definition_code, mode=mode, definition=True, line_offset=0)
+            definition.analyze()
+
+        if code:
+            section = Transpiler(code, mode=mode, line_offset=line_offset)
+            if definition:
+                section.scope.add_functions(definition.scope.functions)
+                section.data.remote_functions.extend(definition.data.remote_functions)
+                if definition.connection_needed:
+                    section.connection_needed = True
+            section.analyze()
+
+        return definition, section, Data.sys_var_index
 
+    @staticmethod
+    def get_process_pool() -> ProcessPoolExecutor:
+        if Transpiler.process_pool is None:
+            Transpiler.process_pool = ProcessPoolExecutor(max_workers=2)
+            # the workers are stopped when the server exits, not left waiting for work
+            atexit.register(Transpiler.process_pool.shutdown, cancel_futures=True)
+        return Transpiler.process_pool
+
+    @staticmethod
+    def transpile_sections(code: list[str]) -> tuple['Transpiler', 'Transpiler', 'Transpiler', 'Transpiler']:
+        """
+        Transpiles the #main and the #board section (each with its own copy of the definition part),
+        large files are transpiled in parallel in the process pool
+        :return: main, board, definition in main mode, definition in board mode (None if the part is empty)
+        """
+        definition_code, main_code, line_offset_main, board_code, line_offset_board, error = \
+            Transpiler.split_sections(code)
+
+        jobs = [(definition_code, main_code, "main", line_offset_main)]
         if board_code:
-            board_transpiler = Transpiler(board_code, mode="board", line_offset=line_offset_board)
-        else:
-            board_transpiler = None
+            jobs.append((definition_code, board_code, "board", line_offset_board))
 
-        if definition_code:
-            definition_transpiler = Transpiler(definition_code, definition=True, line_offset=0)
+        if len(code) >= PARALLEL_MIN_LINES and len(jobs) > 1:
+            pool = Transpiler.get_process_pool()
+            results = [f.result() for f in [pool.submit(Transpiler.transpile_section, *job) for job in jobs]]
         else:
-            definition_transpiler = None
+            results = [Transpiler.transpile_section(*job) for job in jobs]
 
-        if definition_transpiler and error:
-            definition_transpiler.data.newError("Missing #main or #board part in the code",
-                                                Range(0, 0, complete_line=True, data=definition_transpiler.data))
+        # the system variables of the parent process must not collide with the ones used in the results
+        Data.sys_var_index = max(Data.sys_var_index, *[r[2] for r in results])
+        definition_main, main, _ = results[0]
+        definition_board, board, _ = results[1] if len(results) > 1 else (None, None, 0)
 
-        return main_transpiler, board_transpiler, definition_transpiler
+        if definition_main and error:
+            definition_main.data.newError("Missing #main or #board part in the code",
+                                          Range(0, 0, complete_line=True, data=definition_main.data))
+
+        return main, board, definition_main, definition_board
+
+    @staticmethod
+    def link(main: 'Transpiler', board: 'Transpiler'):
+        """
+        If one side needs the serial connection, the other side has to open it too. The board only links the
+        parts of its runtime that answer the calls of the pc
+        """
+        if main and board and (main.connection_needed or board.connection_needed):
+            main.connection_needed = True
+            board.connection_needed = True
+        if main and board:
+            board.proxy_calls = {f.name for f in Reachability.functions(main)}
 
     @staticmethod
     def get_code(code: list[str]) -> tuple[str, str]:
-        main, board, definition_main = Transpiler.get_transpiler(code)
+        main, board, definition_main, definition_board = Transpiler.transpile_sections(code)
         code_main = ""
         code_board = ""
-        if definition_main:
-            definition_board = definition_main.copy()
-            definition_board.mode = "board"
-
-            definition_main.transpile()
-            definition_board.transpile()
-            if main:
-                main.scope.add_functions(definition_main.scope.functions)
-                main.data.remote_functions.extend(definition_main.data.remote_functions)
-                main.data.errors.extend(definition_main.data.errors)
-                if definition_main.connection_needed:
-                    main.connection_needed = True
-            if board:
-                board.scope.add_functions(definition_board.scope.functions)
-                board.data.remote_functions.extend(definition_board.data.remote_functions)
-                board.data.errors.extend(definition_board.data.errors)
-                if definition_board.connection_needed:
-                    board.connection_needed = True
-
-        if board:
-            board.transpile()
-        if main:
-            main.transpile()
 
-            if main.data.errors:
-                print("Errors in main:")
-                print(main.data.errors)
-                raise Exception("Errors in main")
+        for name, section, definition in [("main", main, definition_main), ("board", board, definition_board)]:
+            if section and definition:
+                section.data.errors[:0] = definition.data.errors
+            if section and section.data.errors:
+                print(f"Errors in {name}:")
+                print(section.data.errors)
+                raise Exception(f"Errors in {name}")
 
-            if board:
-                main.connection_needed = True if board.connection_needed else main.connection_needed
-            else:
-                if main.connection_needed:
-                    with open("server/transpiler/SerialCommunication/Serial_Arduino/Serial_Arduino.ino") as f:
-                        code_board = f.read()
-                    code_board += "void setup() {\n Serial.begin(256000); \nHandshake();} \n void loop() { checkSerial(); }"
+        for section in [main, board]:
+            if section:
+                section.fold()
+        Transpiler.link(main, board)
 
-            code_main = main.finish()
+        if main:
+            code_main = main.emit()
+            if not board and main.connection_needed:
+                proxy_calls = {f.name for f in Reachability.functions(main)}
+                code_board = "\n".join(ArduinoEmitter.runtime(set(), proxy_calls, True, False))
+                code_board += "void setup() {\n Serial.begin(256000); \nHandshake();} \n void loop() { checkSerial(); }"
 
         if board:
-            board.transpile()
-
-            if board.data.errors:
-                print("Errors in board:")
-                print(board.data.errors)
-                raise Exception("Errors in board")
-
-            if main:
-                board.connection_needed = True if main.connection_needed else board.connection_needed
-            else:
-                if board.connection_needed:
-                    code_main = '''#include "../server/transpiler/SerialCommunication/Serial_PC.cpp"\nint main(){\nArduino arduino = Arduino();
+            code_board = board.emit()
+            if not main and board.connection_needed:
+                code_main = '''#include "../server/transpiler/SerialCommunication/Serial_PC.h"\nint main(){\nArduino arduino;
                     arduino.listenerThread->join();return 0;}'''
 
-            code_board = board.finish()
-
         return code_main, code_board
 
     @staticmethod
     def get_diagnostics(code: list[str]) -> list[Error]:
-        main, board, definition_main = Transpiler.get_transpiler(code)
+        main, board, definition_main, _ = Transpiler.transpile_sections(code)
         diagnostics = []
         if definition_main:
-            definition_board = definition_main.copy()
-            definition_board.mode = "board"
-
-            definition_main.transpile()
-            definition_board.transpile()
             diagnostics.extend([e.get_Diagnostic(definition_main) for e in definition_main.data.errors])
-            if main:
-                main.scope.add_functions(definition_main.scope.functions)
-
-            if board:
-                board.scope.add_functions(definition_board.scope.functions)
-
         if main:
-            main.transpile()
             diagnostics.extend([e.get_Diagnostic(main) for e in main.data.errors])
         if board:
-            board.transpile()
             diagnostics.extend([e.get_Diagnostic(board) for e in board.data.errors])
         return diagnostics
 
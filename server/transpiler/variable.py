@@ -1,5 +1,6 @@
 from server.transpiler.pyduino_utils import *
 from server.transpiler.tokenizer import *
+from server.transpiler.ir import *
 
 if TYPE_CHECKING:
     from transpiler import Transpiler
@@ -87,6 +88,9 @@ class PyduinoType():
     def not_(self):
         return False, f"Cannot negate {self.name}"
 
+    def neg(self):
+        return False, f"Cannot use '-' on {self.name}"
+
     def to_int(self):
         return False, f"Cannot convert {self.name} to int"
 
@@ -290,6 +294,9 @@ class PyduinoInt(PyduinoType):
     def plus_plus(self):
         return True, PyduinoInt(f"{self.name}++")
 
+    def neg(self):
+        return True, PyduinoInt(f"(-{self.name})")
+
     def greater(self, other):
         if str(other) == "int":
             return True, PyduinoBool(f"({self.name} > {other.name})")
@@ -399,6 +406,9 @@ class PyduinoFloat(PyduinoType):
     def plus_plus(self):
         return True, PyduinoFloat(f"{self.name}++")
 
+    def neg(self):
+        return True, PyduinoFloat(f"(-{self.name})")
+
     def greater(self, other):
         if str(other) == "int":
             return True, PyduinoBool(f"({self.name} > (float){other.name})")
@@ -625,68 +635,11 @@ class Value:
 
     @staticmethod
     def do_value(values: list['Token'], transpiler: 'Transpiler') -> 'Constant | Variable':
-        # do negated values
-        if values[0].type == Math_Operator.MINUS and values[1].type == Word.VALUE:
-            var = Value.do_value_single([values[1]], transpiler)
-            if var.type.is_type(PyduinoInt()) or var.type.is_type(PyduinoFloat()):
-                var.type.name = f"(-{var.type.name})"
-                var.name = f"(-{var.name})"
-                del values[0]
-                values[0] = var
-
-        last_operator = 0
-        new_values = []
-        for i in range(len(values)):
-            if values[i].type in transpiler.data.OPERATORS:
-                if type(values[last_operator]) is Variable or type(values[last_operator]) is Constant:
-                    new_values.append(values[i])
-                else:
-                    new_values.append(Value.do_value_single(values[last_operator:i], transpiler))
-                new_values.append(values[i])
-                last_operator = i + 1
-
-        if last_operator == 0:
-            if type(values[0]) is Variable or type(values[0]) is Constant:
-                return values[0]
-            return Value.do_value_single(values, transpiler)
-
-        new_values.append(Value.do_value_single(values[last_operator:], transpiler))
-        values = new_values
-
-        for index, o in enumerate(transpiler.data.OPERATION_ORDER):
-            shift_left = 0
-            if index == 3:
-                # check for not
-                for i in range(1, len(values)):
-                    if values[i - 1].type == Bool_Operator.NOT:
-                        possible, t = values[i].type.not_()
-                        if possible:
-                            values[i] = Constant(t.name, t, Range.fromPositions(values[i - 1].location.start,
-                                                                                values[i].location.end))
-                            del values[i - 1]
-                            shift_left += 1
-                        else:
-                            transpiler.data.newError(t, transpiler.location.range)
-                            transpiler.data.invalid_line_fallback()
-            shift_left = 0
-
-            for i in range(1, len(values) - 1):
-                i -= shift_left
-                if values[i].type in o:
-                    possible, t = values[i - 1].type.operator(values[i].type.code, values[i + 1].type)
-                    if possible:
-                        values[i - 1] = Constant(t.name, t, Range.fromPositions(values[i - 1].location.start,
-                                                                                values[i + 1].location.end))
-                        del values[i]
-                        del values[i]
-                        shift_left += 2
-                    else:
-                        transpiler.data.newError(t, values[i + 1].location)
-                        transpiler.data.invalid_line_fallback()
-
-        if len(values) > 1:
-            raise Exception("Invalid value")
-        return values[0]
+        """
+        Parses the expression (server/transpiler/expression.py) and returns its value
+        """
+        from server.transpiler.expression import ExpressionParser
+        return ExpressionParser.parse(values, transpiler).to_value()
 
     @staticmethod
     def do_value_single(value: list[Token], transpiler: 'Transpiler') -> 'Constant | Variable':
@@ -708,7 +661,7 @@ class Value:
                 # check if it is a variable
                 var = transpiler.scope.get_Variable(v.value)
                 if var:
-                    return var
+                    return Variable(var.name, var.type, v.location)
 
             t = PyduinoType.check_type(v, transpiler)
             if t:
@@ -785,12 +738,11 @@ class Variable(Value):
             return True
 
         value = Value.do_value(value, transpiler)
-        c_value = value.type.name
 
         variable = Variable(name.value, value.type, value.location)
 
         if transpiler.scope.get_Variable(name.value):
-            transpiler.data.newError(f"Variable '{name}' is already defined", variable.location)
+            transpiler.data.newError(f"Variable '{name.value}' is already defined", variable.location)
             transpiler.data.invalid_line_fallback.fallback(transpiler)
             return True
 
@@ -799,15 +751,9 @@ class Variable(Value):
             transpiler.data.invalid_line_fallback.fallback(transpiler)
             return True
 
-        if value.type.is_iterable():
-            base_type = value.type.get_base_type()
-            c_code = f"{base_type.c_typename()} {name.value}{''.join(f'[]' for i in value.type.dimensions())} = {c_value};"
-
-        else:
-            c_code = f"{variable.type.c_typename()} {name.value} = {c_value};"
-
         transpiler.scope.add_Variable(variable)
-        transpiler.data.code_done.append(c_code)
+        transpiler.data.code_done.append(Declaration(variable, value, Range.fromPositions(
+            instruction[0].location.start, instruction[-1].location.end)))
         return True
 
     @staticmethod
@@ -827,7 +773,7 @@ class Variable(Value):
                 if not possible:
                     transpiler.data.newError(var, instruction[0].location)
                     return True
-                transpiler.data.code_done.append(f"{var.name};")
+                transpiler.data.code_done.append(ExpressionStatement(Constant(var.name, var, instruction[0].location)))
                 return True
             else:
                 transpiler.data.newError(f"Variable {instruction[0].value} not defined", instruction[0].location)
@@ -876,8 +822,8 @@ class Variable(Value):
                 transpiler.data.newError(f"Cannot assign to iterable", var.location)
                 return True
 
-            transpiler.data.code_done.append(
-                f"{var.name}{''.join(f'[{i.type.name}]' for i in indices)} = {value.type.name};")
+            transpiler.data.code_done.append(Assignment(var, indices, value, Range.fromPositions(
+                instruction[0].location.start, instruction[-1].location.end)))
             return True
 
         if left[0].type != Word.IDENTIFIER:
@@ -890,7 +836,6 @@ class Variable(Value):
             return True
 
         value = Value.do_value(value, transpiler)
-        c_value = value.type.name
 
         if not variable.type.is_type(value.type):
             transpiler.data.newError(f"Cannot convert {value.type} to {variable.type}", value.location)
@@ -901,7 +846,8 @@ class Variable(Value):
             transpiler.data.newError(f"Cannot assign to iterable", variable.location)
             return True
 
-        transpiler.data.code_done.append(f"{variable.name} = {c_value};")
+        transpiler.data.code_done.append(Assignment(variable, [], value, Range.fromPositions(
+            instruction[0].location.start, instruction[-1].location.end)))
         return True
 
     def __bool__(self):